@@ -2,11 +2,15 @@
 """
 NE-EDM-OSC.py – DNA 时间线 → Sonic Pi OSC 指挥
 """
-import json, time, argparse, math, shutil, sys
+import json, time, argparse, math, shutil, sys, heapq, itertools
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict
 from pythonosc import udp_client
 
+try: from osc_output import OscOutput
+except ImportError:  # 未设置 PYTHONPATH=Numus 时回退定位共用输出层
+    sys.path.append(str(Path(__file__).resolve().parents[2])); from osc_output import OscOutput
+
 CORE_PARAM_ADDR={"bpm":"/engine/bpm","energy":"/engine/param/energy","density":"/engine/param/density","chord_index":"/engine/param/chord_index","active_parts":"/engine/parts"}
 PATTERN_KEY="pattern_overrides"
 RESERVED={"start_time","duration","energy","density","active_parts","chord_index","track_id","bpm","key","scale","chord_progression","chapters","sweep_phase_start","sweep_phase_end","micro_energy"}
@@ -17,40 +21,129 @@ BASE_PAD_CUTOFF_MAX=132
 PAD_CUTOFF_MIN_HARD=40
 PAD_CUTOFF_MAX_HARD=130
 
-class Timeline:
-    def __init__(self,dna:Dict[str,Any]):
-        self.dna=dna
-        self.sections:List[Tuple[str,str,Dict[str,Any]]]=[]
-        for ch_k,ch_v in dna.get("chapters",{}).items():
-            for sec_k,sec_v in ch_v.get("sections",{}).items():
-                self.sections.append((ch_k,sec_k,sec_v))
-        # fill missing start_time
-        if any("start_time" not in s[2] for s in self.sections):
-            t=0.0
-            for _,_,d in self.sections:
-                d.setdefault("duration",60)
-                d["start_time"]=t
-                t+=d["duration"]
-        self.sections.sort(key=lambda x:x[2]["start_time"])
-        # backfill duration if absent (until next start / last=60)
-        for i,(c,s,d) in enumerate(self.sections):
-            if "duration" not in d:
-                if i<len(self.sections)-1:
-                    d["duration"]=self.sections[i+1][2]["start_time"]-d["start_time"]
+class DNAStream:
+    # incremental JSON reader: top-level fields one by one, "chapters" decoded one chapter at a time
+    def __init__(self,path,chunk=1<<16):
+        self.path=path; self.chunk=chunk
+        self.dec=json.JSONDecoder()
+    def items(self):
+        # yields ("header",key,value) / ("chapter",key,value) in file order
+        self.fh=open(self.path,"r",encoding="utf-8"); self.buf=""; self.pos=0; self.eof=False
+        try:
+            self._expect("{")
+            while self._peek()!="}":
+                key=self._value(); self._expect(":")
+                if key=="chapters" and self._peek()=="{":
+                    self.pos+=1
+                    while self._peek()!="}":
+                        ck=self._value(); self._expect(":")
+                        yield "chapter",ck,self._value()
+                        self._sep()
+                    self.pos+=1
                 else:
-                    d["duration"]=60.0
+                    yield "header",key,self._value()
+                self._sep()
+        finally:
+            self.fh.close()
+    def _fill(self):
+        # read at least as much as is buffered, so re-decoding a large value stays linear
+        data=self.fh.read(max(self.chunk,len(self.buf)-self.pos))
+        if not data: self.eof=True; return False
+        self.buf=self.buf[self.pos:]+data; self.pos=0
+        return True
+    def _peek(self):
+        while True:
+            while self.pos<len(self.buf) and self.buf[self.pos] in " \t\r\n": self.pos+=1
+            if self.pos<len(self.buf): return self.buf[self.pos]
+            if not self._fill(): raise ValueError(f"{self.path}: unexpected end of DNA")
+    def _expect(self,ch):
+        if self._peek()!=ch: raise ValueError(f"{self.path}: expected {ch!r}, got {self.buf[self.pos:self.pos+20]!r}")
+        self.pos+=1
+    def _sep(self):
+        if self._peek()==",": self.pos+=1
+    def _value(self):
+        self._peek()
+        while True:
+            try:
+                val,end=self.dec.raw_decode(self.buf,self.pos)
+                # a value touching the buffer end may be truncated (e.g. a number), read more first
+                if end<len(self.buf) or self.eof:
+                    self.pos=end; return val
+            except json.JSONDecodeError:
+                if self.eof: raise
+            self._fill()
+
+class Timeline:
+    # streaming timeline: chapters are parsed on demand, sections yielded lazily with a
+    # one-element lookahead to backfill start_time/duration; memory does not grow with set length
+    def __init__(self,source):
+        self.source=source  # DNA path, or an already loaded dict
+        self.dna:Dict[str,Any]={}
+        # header fields before "chapters" are available immediately; later ones only after a pass
+        for kind,k,v in self._items():
+            if kind!="header": break
+            self.dna[k]=v
+    def _items(self):
+        if isinstance(self.source,dict):
+            for k,v in self.source.items():
+                if k=="chapters":
+                    for ck,cv in v.items(): yield "chapter",ck,cv
+                else: yield "header",k,v
+        else:
+            yield from DNAStream(self.source).items()
+    def raw_sections(self):
+        in_chapters=False
+        for kind,k,v in self._items():
+            if kind=="header":
+                if in_chapters and k not in self.dna:
+                    self.dna[k]=v
+                    print(f"warning: DNA field '{k}' comes after \"chapters\" and is only known once the chapters are read; move header fields before chapters")
+                continue
+            in_chapters=True
+            for sec_k,sec_v in v.get("sections",{}).items():
+                yield k,sec_k,sec_v
+    def __iter__(self):
+        prev=None; warned=False
+        for cur in self.raw_sections():
+            d=cur[2]
+            if prev is None:
+                if "start_time" not in d: d.setdefault("duration",60); d["start_time"]=0.0
+            else:
+                p=prev[2]
+                # fill missing start_time: right after the previous section (default duration 60)
+                if "start_time" not in d:
+                    p.setdefault("duration",60)
+                    d["start_time"]=p["start_time"]+p["duration"]
+                # backfill duration if absent (until next start)
+                elif "duration" not in p:
+                    p["duration"]=d["start_time"]-p["start_time"]
+                if d["start_time"]<p["start_time"] and not warned:
+                    print(f"warning: {cur[0]}.{cur[1]} starts before {prev[0]}.{prev[1]}; sections are played in file order")
+                    warned=True
+                yield prev
+            prev=cur
+        if prev is not None:
+            prev[2].setdefault("duration",60.0)
+            yield prev
     def filtered(self,ch=None,sec=None):
         start=(ch is None and sec is None)
-        for C,S,D in self.sections:
+        for C,S,D in self:
             if not start:
                 if C==ch and (sec is None or S==sec):
                     start=True
             if start:
                 yield C,S,D
+    def scan(self,ch=None,sec=None):
+        # one streaming pass: (section count, end time)
+        count=0; end=0.0
+        for _,_,d in self.filtered(ch,sec):
+            count+=1; end=d["start_time"]+d["duration"]
+        return count,end
 
 def is_bool_like(v): return isinstance(v,bool) or (isinstance(v,(int,float)) and v in (0,1)) or (isinstance(v,str) and v.lower() in ("0","1","true","false","on","off"))
 def to_bool_int(v): return 1 if (isinstance(v,bool) and v) or (str(v).lower() in ("1","true","on")) else 0
 def send(client,addr,val): client.send_message(addr,val)
+def send_state(client,addr,val): client.send_state(addr,val)
 def dbg(client,msg):
     try: client.send_message("/engine/debug",msg)
     except: pass
@@ -88,7 +181,7 @@ def micro_energy_mod(sec,params):
 
 def pattern_override(client,po):
     for part,pid in po.items():
-        send(client,f"/engine/pattern/{part}",pid)
+        send_state(client,f"/engine/pattern/{part}",pid)
 
 def build_param_and_toggle_sets(sec):
     params={}; toggles={}
@@ -112,6 +205,32 @@ def fmt_table(rows,pad=1):
         out.append(" ".join(str(c).ljust(w+pad) for c,w in zip(r,widths)))
     return "\n".join(out)
 
+def sweep_points(sec,st,dur,interval):
+    # (deadline, pad_cutoff)：与逐段 sleep 版本一致，第 sidx 个目标值在该步起点发送
+    if "sweep_phase_start" not in sec or "sweep_phase_end" not in sec or dur<=0: return
+    steps=max(1,int(dur/interval))
+    for sidx in range(1,steps+1):
+        yield st+(sidx-1)/steps*dur,interpolate_sweep(sec,sidx/steps*dur,dur)
+
+class VirtualClock:
+    # 与 time 模块同接口的虚拟时钟：sleep 只推进时间，整条时间线以 CPU 速度跑完
+    def __init__(self): self.t=0.0
+    def monotonic(self): return self.t
+    def sleep(self,d):
+        if d>0: self.t+=d
+
+class OscLog:
+    # 逐条记录 OSC 消息及其调度时间戳（JSONL: [t,addr,value]）；inner 为 None 时只记录不发送
+    def __init__(self,path,inner,now):
+        self.fh=open(path,"w",encoding="utf-8") if path else None
+        self.inner=inner; self.now=now; self.count=0
+    def send_message(self,addr,val):
+        self.count+=1
+        if self.fh: self.fh.write(json.dumps([round(self.now(),6),addr,val],separators=(",",":"),ensure_ascii=False)+"\n")
+        if self.inner is not None: self.inner.send_message(addr,val)
+    def close(self):
+        if self.fh: self.fh.close()
+
 def clamp_pad(v):
     if v is None: return 100
     if v>PAD_CUTOFF_MAX_HARD: return PAD_CUTOFF_MAX_HARD
@@ -127,82 +246,98 @@ def main():
     ap.add_argument("--start-chapter")
     ap.add_argument("--start-section")
     ap.add_argument("--pad-sweep-interval",type=float,default=1.0)
+    ap.add_argument("--late-policy",choices=("coalesce","drop","send"),default="coalesce",help="迟到的 sweep 点：coalesce=只发最新值 drop=丢弃 send=照发")
+    ap.add_argument("--late-tolerance",type=float,default=0.05,help="超过该秒数视为迟到")
+    ap.add_argument("--param-epsilon",type=float,default=0.0,help="浮点参数变化不超过该值时不重发")
+    ap.add_argument("--rate-limit",type=float,default=0.0,help="同一地址最小发送间隔秒（0=不限）")
+    ap.add_argument("--keyframe-interval",type=float,default=0.0,help="状态超过该秒数未发送时重发（0=关闭）")
     ap.add_argument("--show-sections",action="store_true")
     ap.add_argument("--countdown",type=int,default=3,help="启动前倒计时秒")
     ap.add_argument("--progress",action="store_true",help="打印已播进度")
     ap.add_argument("--no-debug",action="store_true")
     ap.add_argument("--no-color",action="store_true")
     ap.add_argument("--dry-run",action="store_true")
+    ap.add_argument("--virtual-clock",action="store_true",help="虚拟时钟离线运行：不联网、不等待")
+    ap.add_argument("--log",help="把所有 /engine/* 消息及调度时间戳写入 JSONL")
     args=ap.parse_args()
 
     dna_path=Path(args.dna)
     if not dna_path.exists():
         print("DNA file missing")
         return
-    dna=json.loads(dna_path.read_text(encoding="utf-8"))
-    tl=Timeline(dna)
-    sections=list(tl.filtered(args.start_chapter,args.start_section))
-    if not sections:
+    tl=Timeline(dna_path)
+    dna=tl.dna
+    sections=tl.filtered(args.start_chapter,args.start_section)
+    first=next(sections,None)
+    if first is None:
         print("No sections after filter")
         return
+    sections=itertools.chain([first],sections)
 
+    # section count / total length need a full (streaming) pass; only paid when a total is
+    # shown (--show-sections / --progress), otherwise playback starts at once
+    section_count,total_duration=None,0.0
     if args.show_sections:
         rows=[("Idx","Chapter.Section","Start","Dur","E","D","µE","Flags")]
-        for i,(ch,sk,sec) in enumerate(sections):
+        for i,(ch,sk,sec) in enumerate(tl.filtered(args.start_chapter,args.start_section)):
             flags=[]
             for f in ("callback_theme","anti_drop","sub_fade","drop_gap"):
                 if sec.get(f): flags.append(f.replace("_",""))
             rows.append((i,f"{ch}.{sk}",round(sec["start_time"],1),round(sec.get("duration",0),1),
                          sec.get("energy","-"),sec.get("density","-"),
                          sec.get("micro_energy","-"),",".join(flags)))
+            section_count=i+1; total_duration=sec["start_time"]+sec.get("duration",0)
         print(fmt_table(rows))
-        if args.dry_run: return
+        if args.dry_run and not args.virtual_clock: return
 
-    client=udp_client.SimpleUDPClient(args.host,args.port)
+    elif args.progress:
+        section_count,total_duration=tl.scan(args.start_chapter,args.start_section)
+
+    clock=VirtualClock() if args.virtual_clock else time
+    start_wall=clock.monotonic()
+    def now(): return clock.monotonic()-start_wall
+    client=None if args.virtual_clock else udp_client.SimpleUDPClient(args.host,args.port)
+    osc_log=OscLog(args.log,client,now) if (args.log or args.virtual_clock) else None
+    if osc_log: client=osc_log
+    client=OscOutput(client,epsilon=args.param_epsilon,min_interval=args.rate_limit,keyframe_interval=args.keyframe_interval,clock=now)
+    if args.virtual_clock: args.dry_run=False  # 虚拟时钟下消息只进日志，不会发往网络
     w=shutil.get_terminal_size((100,20)).columns
-    banner=f"[NE-EDM-OSC] Track={dna.get('track_id')} BPM={dna.get('bpm',120)} Sections={len(sections)} Host={args.host}:{args.port} scale={args.time_scale}"
+    target="virtual" if args.virtual_clock else f"{args.host}:{args.port}"
+    banner=f"[NE-EDM-OSC] Track={dna.get('track_id')} BPM={dna.get('bpm',120)} Sections={section_count if section_count is not None else '-'} Host={target} scale={args.time_scale}"
     print(colorize(banner,"c",args.no_color))
 
-    if args.countdown>0:
+    if args.countdown>0 and not args.virtual_clock:
         for r in range(args.countdown,0,-1):
             print(colorize(f"Starting in {r}...","y",args.no_color)); time.sleep(1)
+        start_wall=clock.monotonic()
 
+    cpu_start=time.perf_counter()
     bpm=dna.get("bpm",120)
     chord_prog=dna.get("chord_progression",[])
     if not args.dry_run:
-        send(client,"/engine/bpm",bpm)
-        if chord_prog: send(client,"/engine/chord_prog",",".join(chord_prog))
-        if not args.no_debug: dbg(client,f"INIT track={dna.get('track_id')} sections={len(sections)}")
-
-    start_wall=time.time()
-    last_sent:Dict[str,float]={}
-    bool_state:Dict[str,int]={}
+        send_state(client,"/engine/bpm",bpm)
+        if chord_prog: send_state(client,"/engine/chord_prog",",".join(chord_prog))
+        if not args.no_debug:
+            dbg(client,f"INIT track={dna.get('track_id')}"+(f" sections={section_count}" if section_count is not None else ""))
 
+    # 参数/开关/核心状态统一经 OscOutput 去重（按地址缓存最后发送值）
     def send_param(name,val):
         if name=="pad_cutoff": val=clamp_pad(val)
-        addr=f"/engine/param/{name}"
-        if last_sent.get(name)!=val and not args.dry_run:
-            send(client,addr,val); last_sent[name]=val
+        if not args.dry_run: send_state(client,f"/engine/param/{name}",val)
 
     def send_toggle(name,val):
-        addr=f"/engine/toggle/{name}"
-        if bool_state.get(name)!=val and not args.dry_run:
-            send(client,addr,val); bool_state[name]=val
+        if not args.dry_run: send_state(client,f"/engine/toggle/{name}",val)
 
-    total_duration=sections[-1][2]["start_time"]+sections[-1][2].get("duration",0)
     scaled_total_duration = total_duration / args.time_scale
-    for idx,(ch,sk,sec) in enumerate(sections):
-        st=sec["start_time"]/args.time_scale
-        now=time.time()-start_wall
-        wait=st-now
-        if wait>0: time.sleep(wait)
+
+    def play_section(idx,ch,sk,sec):
         energy=sec.get("energy",0.0); density=sec.get("density",0.0)
         chord_index=sec.get("chord_index",0); parts=sec.get("active_parts",[])
         if not args.dry_run:
-            send(client,"/engine/param/chord_index",chord_index)
-            send(client,"/engine/param/energy",energy)
-            send(client,"/engine/param/density",density)
-            send(client,"/engine/parts",",".join(parts))
+            send_state(client,"/engine/param/chord_index",chord_index)
+            send_state(client,"/engine/param/energy",energy)
+            send_state(client,"/engine/param/density",density)
+            send_state(client,"/engine/parts",",".join(parts))
         po=sec.get(PATTERN_KEY)
         if po and not args.dry_run: pattern_override(client,po)
 
@@ -214,34 +349,70 @@ def main():
         if sec.get("sub_fade") and "sub_fade_level" not in params: params["sub_fade_level"]=0.5
 
         for tk,val in toggles.items(): send_toggle(tk,val)
-        for tk in TOGGLE_WHITELIST:
+        for tk in sorted(TOGGLE_WHITELIST):
             if tk not in toggles: send_toggle(tk,0)
         for nk,val in params.items(): send_param(nk,float(val))
 
         if not args.no_debug and not args.dry_run:
             dbg(client,f"SEC {idx} {ch}.{sk} E={energy} D={density} parts={len(parts)}")
         if args.progress:
-            elapsed=time.time()-start_wall
+            elapsed=now()
             pct=elapsed/scaled_total_duration if scaled_total_duration>0 else 0
             bar_len=min(40,max(10,int(w*0.25)))
             fill=int(bar_len*pct)
             bar="["+"#"*fill+"-"*(bar_len-fill)+"]"
             print(colorize(f"{idx:02d} {ch}.{sk} {bar} {pct*100:5.1f}% t={int(elapsed)}/{int(total_duration)}s","g",args.no_color))
 
-        dur=sec.get("duration",0)/args.time_scale
-        if "sweep_phase_start" in sec and "sweep_phase_end" in sec and dur>0:
-            steps=max(1,int(dur/args.pad_sweep_interval))
-            base=time.time()
-            for sidx in range(1,steps+1):
-                frac=sidx/steps
-                target=interpolate_sweep(sec,frac*dur,dur)
-                send_param("pad_cutoff",target)
-                remain=base+frac*dur-time.time()
-                if remain>0: time.sleep(remain)
+    # section 边界与 sweep 点合并在一个按绝对截止时间排序的堆上；
+    # 弹出第 i 个 section 时才展开第 i+1 个，堆里只保留约一个 section 的事件
+    heap=[]; seq=itertools.count()
+    pending=iter(enumerate(sections))
+    def feed():
+        nxt=next(pending,None)
+        if nxt is None: return
+        idx,(ch,sk,sec)=nxt
+        st=sec["start_time"]/args.time_scale
+        heapq.heappush(heap,(st,next(seq),"section",idx,(ch,sk,sec)))
+        for t,val in sweep_points(sec,st,sec.get("duration",0)/args.time_scale,args.pad_sweep_interval):
+            heapq.heappush(heap,(t,next(seq),"sweep",idx,val))
+
+    feed()
+    # 限速推迟的值与关键帧由周期性 flush 事件补发
+    flush_period=min([v for v in (args.rate_limit,args.keyframe_interval) if v>0],default=0)
+    if flush_period: heapq.heappush(heap,(flush_period,next(seq),"flush",-1,None))
+    late={"dropped":0,"coalesced":0,"late_sections":0}
+    played=0
+    while heap:
+        deadline,_,kind,idx,payload=heapq.heappop(heap)
+        if kind=="section": feed()
+        wait=deadline-now()
+        if wait>0: clock.sleep(wait)
+        if kind=="flush":
+            if not args.dry_run: client.flush()
+            if heap: heapq.heappush(heap,(deadline+flush_period,next(seq),"flush",-1,None))
+            continue
+        if -wait>args.late_tolerance:
+            if kind=="section":
+                late["late_sections"]+=1  # section 状态必须送达，迟到也照发
+            elif args.late_policy=="drop":
+                late["dropped"]+=1; continue
+            elif args.late_policy=="coalesce" and heap and heap[0][0]<=now() and heap[0][2]!="flush":
+                late["coalesced"]+=1; continue  # 后面还有已到期事件，只发最新值
+        if kind=="section": play_section(idx,*payload); played=idx+1
+        else: send_param("pad_cutoff",payload)
+
+    if any(late.values()):
+        print(colorize(f"Late events: sections={late['late_sections']} dropped={late['dropped']} coalesced={late['coalesced']}","y",args.no_color))
 
     if not args.dry_run:
+        client.flush(force=True)
         dbg(client,"DONE timeline"); send(client,"/engine/stop",1)
-    print(colorize("Playback complete.","m",args.no_color))
+    if osc_log:
+        osc_log.close()
+        cpu=time.perf_counter()-cpu_start
+        rate=osc_log.count/cpu if cpu>0 else 0
+        print(colorize(f"Events: {osc_log.count} in {cpu:.3f}s cpu ({rate:.0f} events/s), suppressed {client.suppressed_count}, timeline {now():.1f}s","c",args.no_color))
+    print(colorize(f"Playback complete. Sections={played}","m",args.no_color))
 
 if __name__=="__main__":
     try: main()
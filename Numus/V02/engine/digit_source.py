@@ -0,0 +1,180 @@
+import decimal
+import math
+import mmap
+import os
+from decimal import Decimal
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+
+# 二分拆分中间结果需要精确整数运算
+_EXACT = decimal.Context(prec=decimal.MAX_PREC, Emax=decimal.MAX_EMAX, Emin=decimal.MIN_EMIN)
+
+# 十进制字符 -> 0-9 字节值
+_ASCII_TO_DIGIT = bytes.maketrans(b"0123456789", bytes(range(10)))
+
+
+class DigitSource:
+    """
+    数学常数任意精度数字源
+    π (Chudnovsky二分拆分)、e (级数二分拆分)、φ (牛顿迭代开方) 的小数位只计算一次，
+    以每位一个字节 (0-9) 写入磁盘后内存映射，切片为零拷贝 memoryview
+    """
+
+    CONSTANTS = ("pi", "e", "phi")
+
+    def __init__(self, digits_dir: Optional[Union[str, Path]] = None, digit_count: int = 100000):
+        """
+        Args:
+            digits_dir: 数字文件目录，默认为 engine/digits
+            digit_count: 每个常数至少提供的小数位数
+        """
+        self.digits_dir = Path(digits_dir) if digits_dir else Path(__file__).parent / "digits"
+        self.digit_count = digit_count
+        self._maps: Dict[str, Tuple[object, mmap.mmap, memoryview]] = {}
+
+    # ==================== 访问 ====================
+
+    def digits(self, name: str) -> memoryview:
+        """整个常数的小数位 (只读 memoryview，每个元素为 0-9)"""
+        if name not in self._maps:
+            self._open(name)
+        return self._maps[name][2]
+
+    def slice(self, name: str, start: int, length: int) -> Union[memoryview, bytes]:
+        """
+        取 [start, start+length) 的小数位
+        在文件范围内返回零拷贝 memoryview；超出总位数时按总长度回绕 (返回拷贝)
+        """
+        view = self.digits(name)
+        total = len(view)
+        start %= total
+        if start + length <= total:
+            return view[start:start + length]
+
+        # 回绕：只有请求超过整个数字文件时才会发生
+        parts = [view[start:].tobytes()]
+        remaining = length - (total - start)
+        while remaining > 0:
+            chunk = min(remaining, total)
+            parts.append(view[:chunk].tobytes())
+            remaining -= chunk
+        return b"".join(parts)
+
+    def close(self):
+        """释放所有内存映射"""
+        for f, mm, view in self._maps.values():
+            view.release()
+            mm.close()
+            f.close()
+        self._maps.clear()
+
+    def _path(self, name: str) -> Path:
+        return self.digits_dir / f"{name}.digits"
+
+    def _open(self, name: str):
+        """映射数字文件，不存在或位数不足时先生成"""
+        if name not in self.CONSTANTS:
+            raise ValueError(f"未知序列源: {name}")
+
+        path = self._path(name)
+        if not path.exists() or path.stat().st_size < self.digit_count:
+            self._generate(name, path)
+
+        f = open(path, 'rb')
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps[name] = (f, mm, memoryview(mm))
+
+    def _generate(self, name: str, path: Path):
+        """计算并原子写入数字文件"""
+        print(f"生成 {name} 的 {self.digit_count} 位小数...")
+        text = getattr(self, f"compute_{name}")(self.digit_count)
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(text.encode("ascii").translate(_ASCII_TO_DIGIT))
+        os.replace(tmp_path, path)
+
+    # ==================== 任意精度计算 ====================
+
+    @staticmethod
+    def _fraction_digits(value: Decimal, n: int) -> str:
+        """取小数点后的前 n 位"""
+        text = str(value)
+        point = text.index(".")
+        return text[point + 1:point + 1 + n]
+
+    @staticmethod
+    def _sqrt(value: Decimal, prec: int) -> Decimal:
+        """牛顿迭代开方，每轮精度翻倍 (比 Decimal.sqrt 在大精度下快一个数量级)"""
+        precisions = []
+        p = prec
+        while p > 30:
+            precisions.append(p)
+            p = p // 2 + 1
+        precisions.append(30)
+
+        x = Decimal(math.sqrt(float(value)))
+        for p in reversed(precisions):
+            ctx = decimal.Context(prec=p + 10, Emax=decimal.MAX_EMAX, Emin=decimal.MIN_EMIN)
+            x = ctx.multiply(ctx.add(x, ctx.divide(value, x)), Decimal("0.5"))
+        return x
+
+    @classmethod
+    def compute_pi(cls, n: int) -> str:
+        """Chudnovsky 公式 + 二分拆分，每项约贡献 14.18 位"""
+        c3_over_24 = Decimal(10939058860032000)
+
+        def split(a: int, b: int):
+            if b - a == 1:
+                if a == 0:
+                    p = q = Decimal(1)
+                else:
+                    p = Decimal((6 * a - 5) * (2 * a - 1) * (6 * a - 1))
+                    q = Decimal(a * a * a) * c3_over_24
+                t = p * (13591409 + 545140134 * a)
+                return p, q, (-t if a & 1 else t)
+            m = (a + b) // 2
+            p1, q1, t1 = split(a, m)
+            p2, q2, t2 = split(m, b)
+            return p1 * p2, q1 * q2, q2 * t1 + p1 * t2
+
+        with decimal.localcontext(_EXACT):
+            _, q, t = split(0, n // 14 + 2)
+
+        prec = n + 20
+        ctx = decimal.Context(prec=prec, Emax=decimal.MAX_EMAX, Emin=decimal.MIN_EMIN)
+        numerator = ctx.multiply(ctx.multiply(q, Decimal(426880)), cls._sqrt(Decimal(10005), prec))
+        pi = ctx.divide(numerator, t)
+        return cls._fraction_digits(pi, n)
+
+    @classmethod
+    def compute_e(cls, n: int) -> str:
+        """e = Σ 1/k! ，二分拆分求和"""
+        # 项数：log10(N!) 超过目标位数
+        terms = 2
+        while math.lgamma(terms + 1) / math.log(10) < n + 20:
+            terms *= 2
+
+        def split(a: int, b: int):
+            if b - a == 1:
+                return Decimal(1), Decimal(b)
+            m = (a + b) // 2
+            p1, q1 = split(a, m)
+            p2, q2 = split(m, b)
+            return p1 * q2 + p2, q1 * q2
+
+        with decimal.localcontext(_EXACT):
+            p, q = split(0, terms)
+
+        ctx = decimal.Context(prec=n + 20, Emax=decimal.MAX_EMAX, Emin=decimal.MIN_EMIN)
+        e = ctx.add(Decimal(1), ctx.divide(p, q))
+        return cls._fraction_digits(e, n)
+
+    @classmethod
+    def compute_phi(cls, n: int) -> str:
+        """φ = (1 + √5) / 2"""
+        prec = n + 20
+        ctx = decimal.Context(prec=prec, Emax=decimal.MAX_EMAX, Emin=decimal.MIN_EMIN)
+        phi = ctx.divide(ctx.add(Decimal(1), cls._sqrt(Decimal(5), prec)), Decimal(2))
+        return cls._fraction_digits(phi, n)
@@ -1,12 +1,37 @@
+import sys
 import time
-from typing import Dict, List, Callable
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
 from pythonosc import udp_client
 
+try:
+    from osc_output import OscOutput
+except ImportError:  # 未设置 PYTHONPATH=Numus 时回退（V02 中只在此处定位共用输出层）
+    sys.path.append(str(Path(__file__).resolve().parents[2]))
+    from osc_output import OscOutput
+
+# 编译后的过渡：([(相对拍位置, OSC地址, 参数), ...], 过渡总拍数)
+CompiledTransition = Tuple[List[Tuple[float, str, List]], float]
+
 class NumusDJTransitions:
     """Numus DJ 过渡机制管理器"""
     
-    def __init__(self, osc_client: udp_client.SimpleUDPClient):
+    # 状态类地址 -> 参与缓存键的前几个参数个数；经输出层去重，其余地址为触发事件原样发送
+    STATE_KEYS = {
+        "/numus/energy": 0,
+        "/numus/filter": 0,
+        "/numus/section_element": 2
+    }
+    
+    # 接收端收到后会重置的状态（清除对应缓存，之后的同值状态照常发送）
+    STATE_RESETS = {
+        "/numus/chapter_start": ("/numus/energy",),
+        "/numus/emergency_stop": ("/numus/energy",)
+    }
+    
+    def __init__(self, osc_client: udp_client.SimpleUDPClient, output: Optional[OscOutput] = None):
         self.osc_client = osc_client
+        self.output = output or OscOutput(osc_client)
         self.transition_functions = {
             "energy_crossfade": self._energy_crossfade,
             "filter_sweep": self._filter_sweep,
@@ -14,114 +39,146 @@ class NumusDJTransitions:
             "impact_drop": self._impact_drop
         }
     
-    def execute_transition(self, transition_config: Dict, from_chapter: Dict, 
-                         to_chapter: Dict) -> None:
-        """执行章节过渡"""
+    def send_event(self, address: str, args: List) -> None:
+        """发送一条 OSC 事件（状态类消息同值不重发）"""
+        key_args = self.STATE_KEYS.get(address)
+        if key_args is None:
+            self.output.send_message(address, args)
+            if address in self.STATE_RESETS:
+                self.output.reset(self.STATE_RESETS[address])
+        else:
+            self.output.send_state(address, args, key=(address, *args[:key_args]))
+    
+    def compile_transition(self, transition_config: Dict, from_chapter: Dict,
+                           to_chapter: Dict, bpm: float = 125) -> CompiledTransition:
+        """将过渡展开为按拍定位的 OSC 事件（不发送、不等待）"""
         transition_type = transition_config.get("type", "energy_crossfade")
         duration_bars = transition_config.get("duration_bars", 8)
         
-        print(f"执行过渡: {transition_type} ({duration_bars} 小节)")
-        
-        # 计算过渡时长（秒）
-        bpm = 125  # 从全局配置获取
-        bar_duration = (60.0 / bpm) * 4
-        transition_duration = duration_bars * bar_duration
-        
-        # 执行对应的过渡函数
         transition_func = self.transition_functions.get(transition_type, self._energy_crossfade)
-        transition_func(transition_duration, from_chapter, to_chapter, transition_config)
+        return transition_func(duration_bars * 4, bpm, from_chapter, to_chapter, transition_config)
     
-    def _energy_crossfade(self, duration: float, from_chapter: Dict, 
-                         to_chapter: Dict, config: Dict) -> None:
-        """能量交叉淡化过渡"""
-        steps = int(duration / 0.5)  # 每0.5秒更新一次
+    def execute_transition(self, transition_config: Dict, from_chapter: Dict,
+                         to_chapter: Dict, bpm: float = 125) -> None:
+        """执行章节过渡（按绝对截止时间发送编译后的事件）"""
+        transition_type = transition_config.get("type", "energy_crossfade")
+        duration_bars = transition_config.get("duration_bars", 8)
+        
+        print(f"执行过渡: {transition_type} ({duration_bars} 小节)")
         
+        events, length_beats = self.compile_transition(transition_config, from_chapter, to_chapter, bpm)
+        beat_duration = 60.0 / bpm
+        
+        start_time = time.monotonic()
+        for beat, address, args in events:
+            delay = start_time + beat * beat_duration - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self.output.flush()
+            self.send_event(address, args)
+        
+        self.output.flush(force=True)
+        remaining = start_time + length_beats * beat_duration - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+    
+    def _energy_crossfade(self, duration_beats: float, bpm: float, from_chapter: Dict,
+                         to_chapter: Dict, config: Dict) -> CompiledTransition:
+        """能量交叉淡化过渡（每拍一个能量点）"""
         from_energy = from_chapter.get("energy_end", 0.5)
         to_energy = to_chapter.get("energy_start", 0.5)
         
+        # 车载优化：平滑系数越大，步进越快
+        car_smoothness = config.get("car_smoothness", 1.0)
+        step_beats = 1.0 / car_smoothness
+        steps = int(duration_beats)
+        
+        events = []
         for step in range(steps):
             progress = step / steps
             current_energy = from_energy + (to_energy - from_energy) * progress
-            
-            # 发送能量变化
-            self.osc_client.send_message("/numus/energy", [current_energy])
-            
-            # 车载优化：平滑过渡
-            car_smoothness = config.get("car_smoothness", 1.0)
-            time.sleep(0.5 / car_smoothness)
+            events.append((step * step_beats, "/numus/energy", [current_energy]))
+        
+        return events, steps * step_beats
     
-    def _filter_sweep(self, duration: float, from_chapter: Dict, 
-                     to_chapter: Dict, config: Dict) -> None:
-        """滤波器扫频过渡"""
-        steps = int(duration / 0.25)
+    def _filter_sweep(self, duration_beats: float, bpm: float, from_chapter: Dict,
+                     to_chapter: Dict, config: Dict) -> CompiledTransition:
+        """滤波器扫频过渡（每半拍一个点）"""
+        step_beats = 0.5
+        steps = int(duration_beats / step_beats)
+        half = steps // 2
         cutoff_range = config.get("cutoff_range", [20, 20000])
         resonance = config.get("resonance", 0.3)
         
+        events = []
+        
         # 第一阶段：高通滤波器扫频（移除低频）
-        for step in range(steps // 2):
-            progress = step / (steps // 2)
+        for step in range(half):
+            progress = step / half
             cutoff = cutoff_range[0] + (cutoff_range[1] - cutoff_range[0]) * progress
-            
-            self.osc_client.send_message("/numus/filter", ["hpf", cutoff, resonance])
-            time.sleep(0.25)
+            events.append((step * step_beats, "/numus/filter", ["hpf", cutoff, resonance]))
         
         # 切换章节元素
-        self.osc_client.send_message("/numus/chapter_switch", [to_chapter["id"]])
+        events.append((half * step_beats, "/numus/chapter_switch", [to_chapter["id"]]))
         
         # 第二阶段：恢复全频谱
-        for step in range(steps // 2):
-            progress = step / (steps // 2)
+        for step in range(half):
+            progress = step / half
             cutoff = cutoff_range[1] - (cutoff_range[1] - cutoff_range[0]) * progress
-            
-            self.osc_client.send_message("/numus/filter", ["hpf", cutoff, resonance])
-            time.sleep(0.25)
+            events.append(((half + step) * step_beats, "/numus/filter", ["hpf", cutoff, resonance]))
         
         # 移除滤波器
-        self.osc_client.send_message("/numus/filter", ["off"])
+        events.append((2 * half * step_beats, "/numus/filter", ["off"]))
+        
+        return events, 2 * half * step_beats
     
-    def _breakdown_build(self, duration: float, from_chapter: Dict, 
-                        to_chapter: Dict, config: Dict) -> None:
+    def _breakdown_build(self, duration_beats: float, bpm: float, from_chapter: Dict,
+                        to_chapter: Dict, config: Dict) -> CompiledTransition:
         """分解重建过渡"""
         fade_order = config.get("elements_fade_order", ["kick", "bass", "lead", "pad"])
         riser_intro = config.get("riser_introduction", 8)
+        beat_duration = 60.0 / bpm
+        
+        events = []
         
-        # 第一阶段：逐步移除元素
-        fade_duration = duration * 0.6
-        element_fade_time = fade_duration / len(fade_order)
+        # 第一阶段：逐步移除元素（淡出时长参数仍以秒为单位）
+        fade_beats = duration_beats * 0.6
+        element_fade_beats = fade_beats / len(fade_order)
         
-        for element in fade_order:
-            self.osc_client.send_message("/numus/element_fade", [element, 0, element_fade_time])
-            time.sleep(element_fade_time)
+        for i, element in enumerate(fade_order):
+            events.append((i * element_fade_beats, "/numus/element_fade",
+                           [element, 0, element_fade_beats * beat_duration]))
         
         # 第二阶段：引入 Riser
+        drop_beat = fade_beats
         if riser_intro > 0:
-            self.osc_client.send_message("/numus/riser", [1, riser_intro])
-            time.sleep(riser_intro * (60.0 / 125))  # 转换为秒
+            events.append((fade_beats, "/numus/riser", [1, riser_intro]))
+            drop_beat += riser_intro
         
         # 第三阶段：新章节爆发
-        self.osc_client.send_message("/numus/chapter_drop", [to_chapter["id"]])
+        events.append((drop_beat, "/numus/chapter_drop", [to_chapter["id"]]))
         
         # 车载优化：增强期待感
         car_anticipation = config.get("car_anticipation", 1.0)
         if car_anticipation > 1.0:
-            self.osc_client.send_message("/numus/car_excitement", [car_anticipation])
+            events.append((drop_beat, "/numus/car_excitement", [car_anticipation]))
+        
+        return events, drop_beat
     
-    def _impact_drop(self, duration: float, from_chapter: Dict, 
-                    to_chapter: Dict, config: Dict) -> None:
+    def _impact_drop(self, duration_beats: float, bpm: float, from_chapter: Dict,
+                    to_chapter: Dict, config: Dict) -> CompiledTransition:
         """冲击降落过渡"""
         silence_beats = config.get("silence_beats", 1)
         impact_sample = config.get("impact_sample", ":bd_boom")
-        
-        # 突然静音
-        self.osc_client.send_message("/numus/emergency_stop", [])
-        
-        # 短暂静音
-        silence_duration = silence_beats * (60.0 / 125)
-        time.sleep(silence_duration)
-        
-        # 冲击音效
         car_punch = config.get("car_punch", 1.0)
-        self.osc_client.send_message("/numus/impact", [impact_sample, car_punch])
         
-        # 立即启动新章节
-        self.osc_client.send_message("/numus/chapter_start", [to_chapter["id"]])
\ No newline at end of file
+        events = [
+            # 突然静音
+            (0.0, "/numus/emergency_stop", []),
+            # 短暂静音后冲击音效
+            (silence_beats, "/numus/impact", [impact_sample, car_punch]),
+            # 立即启动新章节
+            (silence_beats, "/numus/chapter_start", [to_chapter["id"]])
+        ]
+        
+        return events, silence_beats
@@ -1,41 +1,58 @@
-import math
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Union
+import numpy as np
+from digit_source import DigitSource
+
+# 结构化数组输出（与对应 list[dict] 版本的字段一致）
+ORNAMENT_TRIGGER_DTYPE = np.dtype([
+    ("bar", np.int32),
+    ("eighth", np.int8),
+    ("position", np.float64),
+    ("intensity", np.float64),
+    ("type", "U7"),
+    ("pi_value", np.float64),
+    ("e_value", np.float64)
+])
+
+# _select_ornament_type 的判定顺序对应的类型名
+ORNAMENT_TYPES = np.array(["bell", "lead", "pad", "texture"], dtype="U7")
+
+FILTER_AUTOMATION_DTYPE = np.dtype([
+    ("bar", np.int32),
+    ("beat", np.int8),
+    ("cutoff", np.float64),
+    ("resonance", np.float64),
+    ("position", np.float64)
+])
 
 class NumusGenerator:
     """Numus 数学序列生成器 - 确定性音乐参数生成"""
     
-    def __init__(self):
-        # 预计算数学常数的小数位
-        self.pi_digits = self._extract_digits(math.pi, 3000)
-        self.e_digits = self._extract_digits(math.e, 3000)
-        self.phi_digits = self._extract_digits((1 + math.sqrt(5)) / 2, 3000)
+    def __init__(self, digit_count: int = 100000, digits_dir: Optional[str] = None):
+        """
+        Args:
+            digit_count: 每个常数的小数位数（首次使用时计算并写入数字文件）
+            digits_dir: 数字文件目录，默认为 engine/digits
+        """
+        # 任意精度小数位（内存映射，切片零拷贝）
+        self.digit_source = DigitSource(digits_dir, digit_count)
+        self.pi_digits = self.digit_source.digits("pi")
+        self.e_digits = self.digit_source.digits("e")
+        self.phi_digits = self.digit_source.digits("phi")
         
         print("数学序列生成器初始化完成")
     
-    def _extract_digits(self, number: float, length: int) -> List[int]:
-        """提取数字小数位为整数列表"""
-        decimal_str = f"{number:.{length}f}".split('.')[1]
-        return [int(d) for d in decimal_str[:length]]
+    def get_digits(self, source: str, start: int, length: int) -> Union[memoryview, bytes]:
+        """获取原始小数位 (0-9)，超出数字文件长度时回绕"""
+        return self.digit_source.slice(source, start, length)
     
     def get_sequence(self, source: str, start: int, length: int) -> List[float]:
         """获取归一化序列 [0,1]"""
-        if source == "pi":
-            digits = self.pi_digits[start:start+length]
-        elif source == "e":
-            digits = self.e_digits[start:start+length]
-        elif source == "phi":
-            digits = self.phi_digits[start:start+length]
-        else:
-            raise ValueError(f"未知序列源: {source}")
-        
-        # 确保有足够的数字
-        if len(digits) < length:
-            # 如果不够，循环使用
-            cycles_needed = (length // len(digits)) + 1
-            extended_digits = (digits * cycles_needed)[:length]
-            return [d / 9.0 for d in extended_digits]
-        
-        return [d / 9.0 for d in digits]
+        return [d / 9.0 for d in self.get_digits(source, start, length)]
+    
+    def get_sequence_array(self, source: str, start: int, length: int) -> np.ndarray:
+        """获取归一化序列 [0,1]（float64数组）"""
+        digits = np.frombuffer(self.get_digits(source, start, length), dtype=np.uint8)
+        return digits / 9.0
     
     def generate_energy_curve(self, chapters: List[Dict], source: str = "pi") -> List[float]:
         """为章节列表生成能量曲线"""
@@ -188,4 +205,78 @@ class NumusGenerator:
                         "position": bar + beat / 4.0
                     })
         
-        return automation_points
\ No newline at end of file
+        return automation_points
+    
+    # ==================== 向量化版本 ====================
+    
+    def generate_energy_curve_array(self, chapters: List[Dict], source: str = "pi") -> np.ndarray:
+        """generate_energy_curve 的向量化版本，返回每小节能量 (float64数组)"""
+        lengths = np.array([ch["duration_bars"] for ch in chapters], dtype=np.int64)
+        starts = np.array([ch["energy_start"] for ch in chapters], dtype=np.float64)
+        ends = np.array([ch["energy_end"] for ch in chapters], dtype=np.float64)
+        total_bars = int(lengths.sum())
+        
+        # 每小节所属章节及其在章节内的序号
+        chapter_of_bar = np.repeat(np.arange(len(chapters)), lengths)
+        first_bar = np.repeat(np.cumsum(lengths) - lengths, lengths)
+        progress = (np.arange(total_bars) - first_bar) / lengths[chapter_of_bar]
+        
+        base_energy = starts[chapter_of_bar] + (ends - starts)[chapter_of_bar] * progress
+        
+        # 使用数学序列进行微调（±15%）
+        modulation = (self.get_sequence_array(source, 0, total_bars) - 0.5) * 0.3
+        return np.clip(base_energy + modulation, 0.0, 1.0)
+    
+    def generate_ornament_triggers_array(self, chapter_idx: int, bars: int) -> np.ndarray:
+        """generate_ornament_triggers 的向量化版本，返回 ORNAMENT_TRIGGER_DTYPE 结构化数组"""
+        offset = chapter_idx * 150
+        pi_seq = self.get_sequence_array("pi", offset, bars * 8)
+        e_seq = self.get_sequence_array("e", offset + 50, bars * 8)
+        
+        # 组合条件一次性筛出所有触发点
+        hits = np.flatnonzero((pi_seq > 0.85) & (e_seq > 0.6))
+        pi_val = pi_seq[hits]
+        e_val = e_seq[hits]
+        combined = (pi_val + e_val) / 2
+        
+        triggers = np.empty(len(hits), dtype=ORNAMENT_TRIGGER_DTYPE)
+        triggers["bar"] = hits // 8
+        triggers["eighth"] = hits % 8
+        triggers["position"] = hits // 8 + (hits % 8) / 8.0
+        triggers["intensity"] = combined
+        type_code = np.where(pi_val > e_val, 2, 3)
+        type_code[combined > 0.9] = 1
+        type_code[combined > 0.95] = 0
+        triggers["type"] = ORNAMENT_TYPES[type_code]
+        triggers["pi_value"] = pi_val
+        triggers["e_value"] = e_val
+        return triggers
+    
+    def generate_rhythm_variations_array(self, base_pattern: List[int],
+                                         chapter_idx: int, variation_count: int = 4) -> np.ndarray:
+        """generate_rhythm_variations 的向量化版本，返回 (variation_count, 步数) 的int8数组"""
+        offset = chapter_idx * 200
+        steps = len(base_pattern)
+        phi_seq = self.get_sequence_array("phi", offset, steps * variation_count)
+        phi_seq = phi_seq.reshape(variation_count, steps)
+        
+        # 根据黄金比例序列调整节奏（广播到每个变化）
+        base = np.broadcast_to(np.asarray(base_pattern, dtype=np.int8), phi_seq.shape)
+        variations = base.copy()
+        variations[(phi_seq > 0.8) & (base == 0)] = 1  # 添加重音
+        variations[(phi_seq < 0.2) & (base == 1)] = 0  # 移除重音
+        return variations
+    
+    def generate_filter_automation_array(self, chapter_idx: int, duration_bars: int) -> np.ndarray:
+        """generate_filter_automation 的向量化版本，返回 FILTER_AUTOMATION_DTYPE 结构化数组"""
+        offset = chapter_idx * 400
+        pi_seq = self.get_sequence_array("pi", offset, duration_bars * 4)
+        idx = np.arange(duration_bars * 4)
+        
+        automation = np.empty(len(idx), dtype=FILTER_AUTOMATION_DTYPE)
+        automation["bar"] = idx // 4
+        automation["beat"] = idx % 4
+        automation["cutoff"] = 30 + (pi_seq * 100)
+        automation["resonance"] = pi_seq * 0.8
+        automation["position"] = idx // 4 + (idx % 4) / 4.0
+        return automation
@@ -1,26 +1,49 @@
+import shutil
 import subprocess
 import pretty_midi
 import numpy as np
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
+from render_pool import NumusRenderPool, RenderJob
+from render_cache import NumusRenderCache
+from ornament_synth import NumusOrnamentSynth
 
 class NumusMIDIRenderer:
     """Numus MIDI 渲染器 - 装饰采样生成"""
     
-    def __init__(self, soundfont_path: str = "../SF/FluidR3_GM.sf2"):
+    def __init__(self, soundfont_path: str = "../SF/FluidR3_GM.sf2",
+                 render_cache: Optional[NumusRenderCache] = None,
+                 synth_backend: str = "fluidsynth"):
+        """
+        Args:
+            soundfont_path: SoundFont 路径（fluidsynth 后端使用）
+            render_cache: 渲染缓存，默认新建
+            synth_backend: "fluidsynth" / "numpy"（进程内合成）/ "auto"（缺少 fluidsynth 或 SoundFont 时用 numpy）
+        """
         self.soundfont_path = Path(soundfont_path)
         self.output_dir = Path("output/wav")
         self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.sample_rate = 44100
+        self.gain = 0.5
+        
+        # 内容寻址渲染缓存（相同音符/音色/SoundFont 只合成一次）
+        self.render_cache = render_cache or NumusRenderCache()
+        
+        if synth_backend == "auto":
+            has_fluidsynth = shutil.which("fluidsynth") and self.soundfont_path.exists()
+            synth_backend = "fluidsynth" if has_fluidsynth else "numpy"
+        self.synth_backend = synth_backend
+        self.synth = NumusOrnamentSynth(self.sample_rate, self.gain) if synth_backend == "numpy" else None
         
         # 确认 SoundFont 文件存在
-        if not self.soundfont_path.exists():
+        if self.synth is None and not self.soundfont_path.exists():
             print(f"警告: SoundFont 文件不存在 {self.soundfont_path}")
         
-        print("MIDI 渲染器初始化完成")
+        print(f"MIDI 渲染器初始化完成（后端: {self.synth_backend}）")
     
     def render_ornament(self, track_name: str, chapter_name: str, 
-                       ornament_data: Dict) -> Optional[str]:
-        """渲染装饰音为 WAV 文件"""
+                       ornament_data: Dict, timeout: float = 30.0) -> Optional[str]:
+        """渲染装饰音为 WAV 文件（timeout 为 fluidsynth 渲染超时秒数）"""
         try:
             # 创建 MIDI 数据
             midi_data = self._create_ornament_midi(ornament_data)
@@ -30,14 +53,27 @@ class NumusMIDIRenderer:
             midi_path = self.output_dir / f"{filename_base}.mid"
             wav_path = self.output_dir / f"{filename_base}.wav"
             
-            # 保存 MIDI 文件
-            midi_data.write(str(midi_path))
+            # 内容相同的装饰音直接复用缓存
+            cache_key = self._cache_key(midi_data)
+            if self.render_cache.get(cache_key, wav_path):
+                return str(wav_path.resolve().relative_to(Path.cwd().resolve()))
             
-            # 渲染为 WAV
-            if self._render_with_fluidsynth(midi_path, wav_path):
+            # 进程内合成：无需临时 MIDI 文件与子进程
+            if self.synth is not None:
+                rendered = self._render_with_synth(midi_data, wav_path)
+            else:
+                # 保存 MIDI 文件
+                midi_data.write(str(midi_path))
+                
+                # 渲染为 WAV
+                rendered = self._render_with_fluidsynth(midi_path, wav_path, timeout)
+                
                 # 删除临时 MIDI 文件
-                midi_path.unlink()
-                return str(wav_path.relative_to(Path.cwd()))
+                midi_path.unlink(missing_ok=True)
+            
+            if rendered:
+                self.render_cache.put(cache_key, wav_path)
+                return str(wav_path.resolve().relative_to(Path.cwd().resolve()))
             else:
                 print(f"渲染失败: {filename_base}")
                 return None
@@ -46,6 +82,22 @@ class NumusMIDIRenderer:
             print(f"渲染装饰音失败: {e}")
             return None
     
+    def _cache_key(self, midi: pretty_midi.PrettyMIDI) -> str:
+        """由生成的音符、音色、采样率、增益与 SoundFont 摘要计算缓存键"""
+        instrument = midi.instruments[0]
+        if self.synth is not None:
+            source_digest = self.synth.VERSION
+        else:
+            source_digest = self.render_cache.file_digest(self.soundfont_path)
+        return self.render_cache.make_key(
+            self._note_tuples(midi), instrument.program, self.sample_rate, self.gain, source_digest
+        )
+    
+    @staticmethod
+    def _note_tuples(midi: pretty_midi.PrettyMIDI) -> List[Tuple[int, int, float, float]]:
+        """[(pitch, velocity, start, end), ...]"""
+        return [(n.pitch, n.velocity, n.start, n.end) for n in midi.instruments[0].notes]
+    
     def _create_ornament_midi(self, ornament_data: Dict) -> pretty_midi.PrettyMIDI:
         """基于装饰数据创建 MIDI"""
         midi = pretty_midi.PrettyMIDI()
@@ -159,7 +211,12 @@ class NumusMIDIRenderer:
         
         return melody_notes
     
-    def _render_with_fluidsynth(self, midi_path: Path, wav_path: Path) -> bool:
+    def _render_with_synth(self, midi: pretty_midi.PrettyMIDI, wav_path: Path) -> bool:
+        """使用进程内 NumPy 合成器渲染为 WAV"""
+        return self.synth.render(self._note_tuples(midi), midi.instruments[0].program, wav_path)
+    
+    def _render_with_fluidsynth(self, midi_path: Path, wav_path: Path,
+                                timeout: float = 30.0) -> bool:
         """使用 FluidSynth 渲染 MIDI 为 WAV"""
         if not self.soundfont_path.exists():
             print(f"SoundFont 文件不存在: {self.soundfont_path}")
@@ -171,12 +228,12 @@ class NumusMIDIRenderer:
             str(self.soundfont_path),
             str(midi_path),
             "-F", str(wav_path),
-            "-r", "44100",  # 采样率
-            "-g", "0.5"     # 增益
+            "-r", str(self.sample_rate),  # 采样率
+            "-g", str(self.gain)          # 增益
         ]
         
         try:
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
             
             if result.returncode == 0 and wav_path.exists():
                 return True
@@ -192,23 +249,20 @@ class NumusMIDIRenderer:
             return False
     
     def batch_render_ornaments(self, ornaments_list: List[Dict], 
-                             track_name: str) -> Dict[str, str]:
-        """批量渲染装饰音"""
-        results = {}
+                             track_name: str, max_workers: Optional[int] = None,
+                             timeout: float = 30.0, retries: int = 1) -> Dict[str, str]:
+        """批量渲染装饰音（并行，相互独立的装饰音同时渲染）"""
+        jobs = []
+        for i, ornament in enumerate(ornaments_list):
+            chapter_name = ornament.get("chapter", f"ch_{i}")
+            ornament_key = f"{chapter_name}_{ornament['type']}_{ornament['bar']}"
+            jobs.append(RenderJob(ornament_key, track_name, chapter_name, ornament))
         
         print(f"批量渲染 {len(ornaments_list)} 个装饰音...")
         
-        for i, ornament in enumerate(ornaments_list):
-            chapter_name = ornament.get("chapter", f"ch_{i}")
-            
-            wav_path = self.render_ornament(track_name, chapter_name, ornament)
-            
-            if wav_path:
-                ornament_key = f"{chapter_name}_{ornament['type']}_{ornament['bar']}"
-                results[ornament_key] = wav_path
-                print(f"  ✓ {ornament_key}")
-            else:
-                print(f"  ✗ 渲染失败: {ornament}")
+        pool = NumusRenderPool(self, max_workers=max_workers, timeout=timeout, retries=retries)
+        rendered = pool.render_all(jobs)
+        results = {key: path for key, path in rendered.items() if path}
         
         print(f"批量渲染完成，成功 {len(results)} 个")
         return results
\ No newline at end of file
@@ -1,31 +1,56 @@
 import json
 import time
+from dataclasses import replace
 from pathlib import Path
 from pythonosc import udp_client
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, Tuple
 
 from section_library import NumusSectionLibrary
-from dj_transitions import NumusDJTransitions
+from dj_transitions import NumusDJTransitions, OscOutput
 from math_generator import NumusGenerator
 from midi_renderer import NumusMIDIRenderer
+from render_pool import NumusRenderPool, RenderJob
+from track_timeline import NumusTrackTimeline, TimelineEvent
 
 class NumusEngine:
     """Numus 核心引擎 V2.0 - 长篇车载 EDM 专用"""
     
-    def __init__(self, sonic_pi_host: str = "127.0.0.1", sonic_pi_port: int = 4560):
+    def __init__(self, sonic_pi_host: str = "127.0.0.1", sonic_pi_port: int = 4560,
+                 render_workers: Optional[int] = None, render_timeout: float = 30.0,
+                 render_retries: int = 1, render_backend: str = "fluidsynth",
+                 energy_resolution: str = "beat", energy_epsilon: float = 0.01,
+                 presend_energy_curve: bool = False, osc_epsilon: float = 0.0,
+                 osc_rate_limit: float = 0.0, osc_keyframe_interval: float = 0.0):
         # 初始化模块
         self.osc_client = udp_client.SimpleUDPClient(sonic_pi_host, sonic_pi_port)
+        # 状态类消息（能量、滤波、Section 元素）经输出层去重/限速/关键帧重发
+        self.osc_output = OscOutput(self.osc_client, epsilon=osc_epsilon,
+                                    min_interval=osc_rate_limit,
+                                    keyframe_interval=osc_keyframe_interval)
         self.section_library = NumusSectionLibrary()
-        self.dj_transitions = NumusDJTransitions(self.osc_client)
+        self.dj_transitions = NumusDJTransitions(self.osc_client, self.osc_output)
         self.math_generator = NumusGenerator()
-        self.midi_renderer = NumusMIDIRenderer()
+        self.midi_renderer = NumusMIDIRenderer(synth_backend=render_backend)
+        self.render_pool = NumusRenderPool(
+            self.midi_renderer, max_workers=render_workers,
+            timeout=render_timeout, retries=render_retries
+        )
         
         # 状态变量
         self.current_track = None
         self.current_chapter_idx = 0
         self.car_audio_profile = "sedan_standard"
         self.generated_sections = {}
+        self.section_templates = {}
+        self.profile_plans = {}
         self.ornament_cache = {}
+        self.timeline: Optional[NumusTrackTimeline] = None
+        
+        # 能量流配置：按拍/小节边界发送，变化小于 epsilon 的点不发送；
+        # presend_energy_curve 时章节开始一次性下发整条曲线，由播放器按拍推进
+        self.energy_resolution = energy_resolution
+        self.energy_epsilon = energy_epsilon
+        self.presend_energy_curve = presend_energy_curve
         
         print("Numus Engine V2.0 初始化完成")
     
@@ -34,6 +59,8 @@ class NumusEngine:
         try:
             with open(track_path, 'r', encoding='utf-8') as f:
                 self.current_track = json.load(f)
+            self.timeline = None
+            self.profile_plans = {}
             
             print(f"已加载作品: {self.current_track['name']}")
             print(f"专辑: {self.current_track.get('album', 'Unknown')}")
@@ -48,7 +75,10 @@ class NumusEngine:
         """设置车载音频配置"""
         available_profiles = list(self.section_library.car_profiles.keys())
         
-        if profile_name in available_profiles:
+        if profile_name in self.profile_plans:
+            # 已批量预处理过的配置直接切换播放计划
+            self.select_profile_plan(profile_name)
+        elif profile_name in available_profiles:
             self.car_audio_profile = profile_name
             print(f"车载音频配置: {profile_name}")
         else:
@@ -72,13 +102,23 @@ class NumusEngine:
         # 3. 生成 DJ 过渡计划
         self._plan_dj_transitions()
         
+        # 4. 编译播放时间线
+        timeline = self._compile_timeline()
+        print(f"时间线: {len(timeline)} 个事件, 总时长 {timeline.duration_minutes:.1f} 分钟")
+        
         print("预处理完成\n")
         return True
     
     def _assign_sections_to_chapters(self) -> None:
         """为章节分配 Section 模板"""
+        self._select_section_templates()
+        self.generated_sections = self._apply_profile_to_sections(self.car_audio_profile)
+    
+    def _select_section_templates(self) -> None:
+        """按章节能量选择 Section 模板（与车载配置无关）"""
         print("分配 Section 模板...")
         
+        self.section_templates = {}
         for i, chapter in enumerate(self.current_track["chapters"]):
             energy_mid = (chapter["energy_start"] + chapter["energy_end"]) / 2
             style_hint = chapter.get("style_hint", None)
@@ -87,25 +127,120 @@ class NumusEngine:
             section_template = self.section_library.get_section_by_energy(energy_mid, style_hint)
             
             if section_template:
-                # 应用车载优化
-                optimized_section = self.section_library.apply_car_profile(
-                    section_template, self.car_audio_profile
-                )
-                
-                self.generated_sections[chapter["id"]] = optimized_section
+                self.section_templates[chapter["id"]] = section_template
                 print(f"  章节 {i+1}: {section_template['name']} ({section_template['style']})")
             else:
                 print(f"  章节 {i+1}: 未找到合适的 Section 模板")
     
+    def _apply_profile_to_sections(self, profile_name: str) -> Dict[str, Dict]:
+        """对已选模板应用车载优化（按 (Section, 配置) 记忆化，多次调用开销很小）"""
+        return {
+            chapter_id: self.section_library.apply_car_profile(template, profile_name)
+            for chapter_id, template in self.section_templates.items()
+        }
+    
+    def prepare_track_for_profiles(self, profiles: List[str],
+                                   bundle_path: Optional[str] = None) -> Optional[Dict]:
+        """
+        一次预处理多个车载配置
+        Section 模板选择、装饰渲染与过渡规划只做一次，每个配置只生成自己的音量调整与时间线
+        
+        Args:
+            profiles: 车载配置名列表，未知配置会被跳过
+            bundle_path: 可选，将打包结果写出为 JSON
+        
+        Returns:
+            {"track", "bpm", "ornaments", "transitions", "profiles": {配置: 播放计划}}，失败返回None
+        """
+        if not self.current_track:
+            print("错误: 未加载作品")
+            return None
+        
+        available_profiles = self.section_library.car_profiles
+        valid_profiles = []
+        for profile_name in profiles:
+            if profile_name not in available_profiles:
+                print(f"未知配置 {profile_name}，已跳过")
+            elif profile_name not in valid_profiles:
+                valid_profiles.append(profile_name)
+        
+        if not valid_profiles:
+            print("错误: 没有可用的车载配置")
+            return None
+        
+        print(f"\n开始预处理 ({len(valid_profiles)} 个车载配置)...")
+        
+        # 1-3. 与配置无关的共享步骤
+        self._select_section_templates()
+        self._prerender_ornaments()
+        self._plan_dj_transitions()
+        
+        # 4. 每个配置：应用车载优化并编译时间线
+        print("编译各配置播放计划...")
+        self.profile_plans = {}
+        for profile_name in valid_profiles:
+            self.car_audio_profile = profile_name
+            self.generated_sections = self._apply_profile_to_sections(profile_name)
+            timeline = self._compile_timeline()
+            
+            self.profile_plans[profile_name] = {
+                "sections": self.generated_sections,
+                "timeline": timeline
+            }
+            print(f"  {profile_name}: {len(timeline)} 个事件, {timeline.duration_minutes:.1f} 分钟")
+        
+        # 默认选中第一个配置
+        self.select_profile_plan(valid_profiles[0])
+        
+        chapters = self.current_track["chapters"]
+        bundle = {
+            "track": self.current_track["name"],
+            "bpm": self.current_track["global_bpm"],
+            "ornaments": self.ornament_cache,
+            "transitions": [self.current_track[f"transition_{i}"] for i in range(len(chapters) - 1)
+                            if f"transition_{i}" in self.current_track],
+            "profiles": {
+                profile_name: {
+                    "sections": plan["sections"],
+                    "timeline": plan["timeline"].to_dict()
+                }
+                for profile_name, plan in self.profile_plans.items()
+            }
+        }
+        
+        if bundle_path:
+            try:
+                Path(bundle_path).parent.mkdir(parents=True, exist_ok=True)
+                with open(bundle_path, 'w', encoding='utf-8') as f:
+                    json.dump(bundle, f, ensure_ascii=False)
+                print(f"播放计划已保存: {bundle_path}")
+            except Exception as e:
+                print(f"保存播放计划失败: {e}")
+        
+        print("预处理完成\n")
+        return bundle
+    
+    def select_profile_plan(self, profile_name: str) -> bool:
+        """切换到已预处理的车载配置（无需重新预处理）"""
+        plan = self.profile_plans.get(profile_name)
+        if plan is None:
+            print(f"配置 {profile_name} 尚未预处理")
+            return False
+        
+        self.car_audio_profile = profile_name
+        self.generated_sections = plan["sections"]
+        self.timeline = plan["timeline"]
+        print(f"车载音频配置: {profile_name}")
+        return True
+    
     def _prerender_ornaments(self) -> None:
-        """预渲染装饰采样"""
+        """预渲染装饰采样（所有章节的装饰音一起提交到渲染池并行渲染）"""
         print("预渲染装饰采样...")
         
         track_name = self.current_track["name"].replace(" ", "_").lower()
         
+        chapter_jobs = []
         for i, chapter in enumerate(self.current_track["chapters"]):
-            chapter_ornaments = []
-            
             # 基于数学序列生成装饰触发点
             triggers = self.math_generator.generate_ornament_triggers(
                 i, chapter["duration_bars"]
@@ -115,17 +250,20 @@ class NumusEngine:
             max_ornaments = min(3, len(triggers))
             selected_triggers = triggers[:max_ornaments]
             
-            for trigger in selected_triggers:
-                ornament_path = self.midi_renderer.render_ornament(
-                    track_name, chapter["id"], trigger
-                )
-                
-                if ornament_path:
-                    chapter_ornaments.append({
-                        "path": ornament_path,
-                        "trigger": trigger
-                    })
-            
+            chapter_jobs.append([
+                RenderJob(f"{chapter['id']}_{trigger['type']}_{trigger['bar']}",
+                          track_name, chapter["id"], trigger)
+                for trigger in selected_triggers
+            ])
+        
+        rendered = self.render_pool.render_all([job for jobs in chapter_jobs for job in jobs])
+        self.midi_renderer.render_cache.flush()
+        
+        for i, (chapter, jobs) in enumerate(zip(self.current_track["chapters"], chapter_jobs)):
+            chapter_ornaments = [
+                {"path": rendered[job.key], "trigger": job.ornament}
+                for job in jobs if rendered.get(job.key)
+            ]
             self.ornament_cache[chapter["id"]] = chapter_ornaments
             print(f"  章节 {i+1}: {len(chapter_ornaments)} 个装饰采样")
     
@@ -155,12 +293,21 @@ class NumusEngine:
             
             print(f"  {i+1}→{i+2}: {transition_config.get('type', 'energy_crossfade')}")
     
-    def play_track(self) -> None:
-        """播放完整作品"""
+    def play_track(self, start_beat: float = 0.0) -> None:
+        """
+        播放完整作品（沿编译后的时间线按绝对截止时间发送事件）
+        
+        Args:
+            start_beat: 起始拍位置，非零时从该位置定位播放
+        """
         if not self.current_track:
             print("错误: 未加载或预处理作品")
             return
         
+        if self.timeline is None:
+            self._compile_timeline()
+        timeline = self.timeline
+        
         print("=" * 60)
         print(f"🎵 开始播放: {self.current_track['name']}")
         print(f"🚗 车载配置: {self.car_audio_profile}")
@@ -170,135 +317,179 @@ class NumusEngine:
         # 初始化 Sonic Pi
         self._initialize_sonic_pi()
         
-        # 播放各章节
-        start_time = time.time()
+        # 沿时间线播放（定位时起点之前的状态事件会立即补发）
+        start_time = time.monotonic() - timeline.beat_to_seconds(start_beat)
+        wall_start = time.time()
         
-        for i, chapter in enumerate(self.current_track["chapters"]):
-            self._play_chapter(i, chapter)
+        for event in timeline.events_from(start_beat):
+            delay = start_time + timeline.beat_to_seconds(event.beat) - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self.osc_output.flush()
+            
+            if event.kind == "chapter_start":
+                self.current_chapter_idx = event.chapter
+            if event.label:
+                print(event.label)
             
-            # 执行章节间过渡（除了最后一个章节）
-            if i < len(self.current_track["chapters"]) - 1:
-                transition_key = f"transition_{i}"
-                if transition_key in self.current_track:
-                    next_chapter = self.current_track["chapters"][i + 1]
-                    self.dj_transitions.execute_transition(
-                        self.current_track[transition_key],
-                        chapter,
-                        next_chapter
-                    )
+            self.dj_transitions.send_event(event.address, list(event.args))
+        
+        self.osc_output.flush(force=True)
+        remaining = start_time + timeline.duration_seconds - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
         
         # 结束处理
-        total_duration = time.time() - start_time
+        total_duration = time.time() - wall_start
         print(f"\n🎉 播放完成！实际时长: {total_duration/60:.1f} 分钟")
         self._finalize_sonic_pi()
     
     def _calculate_total_duration(self) -> float:
-        """计算总时长（分钟）"""
-        bpm = self.current_track.get("global_bpm", 125)
-        total_bars = sum(ch["duration_bars"] for ch in self.current_track["chapters"])
-        
-        # 加上过渡时间
-        transition_bars = (len(self.current_track["chapters"]) - 1) * 8  # 平均每个过渡8小节
-        
-        total_bars += transition_bars
-        total_minutes = (total_bars * 4 * 60) / (bpm * 60)  # 4拍每小节
-        
-        return total_minutes
+        """计算总时长（分钟，含各过渡的实际拍数）"""
+        if self.timeline is None:
+            self._compile_timeline()
+        return self.timeline.duration_minutes
     
     def _initialize_sonic_pi(self) -> None:
-        """初始化 Sonic Pi 播放器"""
+        """初始化 Sonic Pi 播放器（接收端状态重置，输出缓存随之清空）"""
+        self.osc_output.reset()
         self.osc_client.send_message("/numus/init", [
             self.current_track["global_bpm"],
             self.car_audio_profile
         ])
         time.sleep(2)  # 等待初始化完成
     
-    def _play_chapter(self, chapter_idx: int, chapter: Dict) -> None:
-        """播放单个章节"""
-        self.current_chapter_idx = chapter_idx
-        
-        print(f"\n🎪 章节 {chapter_idx + 1}: {chapter['name']}")
-        
-        # 发送章节配置到 Sonic Pi
-        if chapter["id"] in self.generated_sections:
-            section_data = self.generated_sections[chapter["id"]]
-            self._send_section_to_sonic_pi(chapter["id"], section_data)
-        
-        # 激活章节
-        self.osc_client.send_message("/numus/chapter_start", [
-            chapter_idx,
-            chapter["energy_start"],
-            chapter["energy_end"],
-            chapter["duration_bars"]
-        ])
-        
-        # 章节播放循环
-        self._execute_chapter_playback(chapter)
-        
-        # 停用章节
-        self.osc_client.send_message("/numus/chapter_stop", [chapter_idx])
+    # ==================== 时间线编译 ====================
     
-    def _send_section_to_sonic_pi(self, chapter_id: str, section_data: Dict) -> None:
-        """发送 Section 数据到 Sonic Pi"""
-        # 发送 Section 的各元素配置
-        for element_name, element_config in section_data.get("elements", {}).items():
-            self.osc_client.send_message("/numus/section_element", [
-                chapter_id,
-                element_name,
-                json.dumps(element_config)
-            ])
+    ORNAMENT_CHECK_INTERVAL = 10.0  # 装饰采样检查间隔（秒）
     
-    def _execute_chapter_playback(self, chapter: Dict) -> None:
-        """执行章节播放"""
+    def _compile_timeline(self) -> NumusTrackTimeline:
+        """将作品编译为扁平事件时间线：章节启停、Section 元素、能量、装饰与过渡自动化"""
         bpm = self.current_track["global_bpm"]
+        chapters = self.current_track["chapters"]
+        
+        events = []
+        chapter_starts = []
+        beat = 0.0
+        
+        for i, chapter in enumerate(chapters):
+            chapter_starts.append(beat)
+            events.extend(self._compile_chapter(i, chapter, beat, bpm))
+            
+            beat += chapter["duration_bars"] * 4
+            events.append(TimelineEvent(beat, i, "chapter_stop", "/numus/chapter_stop", (i,)))
+            
+            # 章节间过渡（按真实 BPM 展开，占用实际拍数）
+            transition = self.current_track.get(f"transition_{i}") if i < len(chapters) - 1 else None
+            if transition:
+                transition_events, length_beats = self.dj_transitions.compile_transition(
+                    transition, chapter, chapters[i + 1], bpm
+                )
+                label = (f"执行过渡: {transition.get('type', 'energy_crossfade')} "
+                         f"({transition.get('duration_bars', 8)} 小节)")
+                for j, (offset, address, args) in enumerate(transition_events):
+                    events.append(TimelineEvent(beat + offset, i, "transition", address,
+                                                tuple(args), label if j == 0 else ""))
+                beat += length_beats
+        
+        self.timeline = NumusTrackTimeline(events, bpm, chapter_starts, beat)
+        return self.timeline
+    
+    def _compile_chapter(self, chapter_idx: int, chapter: Dict, start_beat: float,
+                         bpm: float) -> List[TimelineEvent]:
+        """单个章节的事件：Section 元素、章节开始、能量点与装饰触发"""
         bar_duration = (60.0 / bpm) * 4
         chapter_duration = chapter["duration_bars"] * bar_duration
+        label = f"\n🎪 章节 {chapter_idx + 1}: {chapter['name']}\n   ⏳ 播放时长: {chapter_duration:.1f} 秒"
         
-        start_time = time.time()
-        last_ornament_time = 0
+        events = []
         
-        print(f"   ⏳ 播放时长: {chapter_duration:.1f} 秒")
+        # 发送章节配置到 Sonic Pi
+        for element_name, element_config in self.generated_sections.get(chapter["id"], {}).get("elements", {}).items():
+            events.append(TimelineEvent(start_beat, chapter_idx, "section_element", "/numus/section_element",
+                                        (chapter["id"], element_name, json.dumps(element_config))))
         
-        while time.time() - start_time < chapter_duration:
-            elapsed = time.time() - start_time
-            progress = elapsed / chapter_duration
-            
-            # 更新能量等级
-            current_energy = chapter["energy_start"] + \
-                           (chapter["energy_end"] - chapter["energy_start"]) * progress
-            
-            self.osc_client.send_message("/numus/energy", [current_energy])
-            
-            # 触发装饰采样（稀疏）
-            if elapsed - last_ornament_time > 10 and chapter["id"] in self.ornament_cache:
-                self._maybe_trigger_ornament(chapter["id"], progress)
-                last_ornament_time = elapsed
+        # 激活章节
+        events.append(TimelineEvent(start_beat, chapter_idx, "chapter_start", "/numus/chapter_start",
+                                    (chapter_idx, chapter["energy_start"], chapter["energy_end"],
+                                     chapter["duration_bars"])))
+        
+        # 标签挂在章节的第一个事件上
+        events[0] = replace(events[0], label=label)
+        
+        # 能量：逐点发送，或一次性下发整条曲线
+        if self.presend_energy_curve:
+            step_beats = 4 if self.energy_resolution == "bar" else 1
+            curve = [energy for _, energy in self._build_energy_timeline(chapter, epsilon=0.0)]
+            events.append(TimelineEvent(start_beat, chapter_idx, "energy_curve", "/numus/energy_curve",
+                                        (chapter_idx, step_beats, *curve)))
+        else:
+            for offset, energy in self._build_energy_timeline(chapter):
+                events.append(TimelineEvent(start_beat + offset, chapter_idx, "energy",
+                                            "/numus/energy", (energy,)))
+        
+        # 装饰检查点：每个检查间隔之后的第一个拍点，触发与否在编译时确定
+        if self.ornament_cache.get(chapter["id"]):
+            beat_duration = 60.0 / bpm
+            total_beats = chapter["duration_bars"] * 4
+            check_beats = self.ORNAMENT_CHECK_INTERVAL / beat_duration
             
-            # 每秒更新一次
-            time.sleep(1.0)
+            check = check_beats
+            while True:
+                offset = int(check) + 1
+                if offset >= total_beats:
+                    break
+                ornament = self._select_ornament(chapter["id"], offset / total_beats)
+                if ornament:
+                    events.append(TimelineEvent(
+                        start_beat + offset, chapter_idx, "ornament", "/numus/ornament",
+                        (ornament["path"], ornament["trigger"]["intensity"] * 0.6),
+                        f"   🎨 装饰: {ornament['trigger']['type']}"
+                    ))
+                check = offset + check_beats
+        
+        return events
+    
+    def _build_energy_timeline(self, chapter: Dict,
+                               epsilon: Optional[float] = None) -> List[Tuple[float, float]]:
+        """
+        章节能量时间线 [(章节内拍数, 能量), ...]
+        按拍（或小节）边界取线性插值，与上一个发送值相差小于 epsilon 的点被省略
+        """
+        if epsilon is None:
+            epsilon = self.energy_epsilon
+        
+        step_beats = 4 if self.energy_resolution == "bar" else 1
+        total_beats = chapter["duration_bars"] * 4
+        energy_start = chapter["energy_start"]
+        energy_span = chapter["energy_end"] - energy_start
+        
+        timeline = []
+        last_sent = None
+        for beat in range(0, total_beats, step_beats):
+            energy = energy_start + energy_span * (beat / total_beats)
+            if last_sent is None or abs(energy - last_sent) >= epsilon:
+                timeline.append((beat, energy))
+                last_sent = energy
+        return timeline
     
-    def _maybe_trigger_ornament(self, chapter_id: str, progress: float) -> None:
-        """可能触发装饰采样"""
+    def _select_ornament(self, chapter_id: str, progress: float) -> Optional[Dict]:
+        """按进度选择装饰采样，由数学序列决定是否触发（未触发返回None）"""
         ornaments = self.ornament_cache.get(chapter_id, [])
         
         if not ornaments:
-            return
+            return None
         
         # 基于进度选择装饰
         ornament_idx = int(progress * len(ornaments))
         
         if ornament_idx < len(ornaments):
-            ornament = ornaments[ornament_idx]
-            
             # 使用数学序列决定是否真的触发
             pi_value = self.math_generator.get_sequence("pi", int(progress * 100), 1)[0]
             
             if pi_value > 0.8:  # 20% 概率触发
-                self.osc_client.send_message("/numus/ornament", [
-                    ornament["path"],
-                    ornament["trigger"]["intensity"] * 0.6
-                ])
-                print(f"   🎨 装饰: {ornament['trigger']['type']}")
+                return ornaments[ornament_idx]
+        return None
     
     def _finalize_sonic_pi(self) -> None:
         """结束 Sonic Pi 播放"""
@@ -329,10 +520,10 @@ def main():
         
     except KeyboardInterrupt:
         print("\n⏹️  用户中断播放")
-        engine.osc_client.send_message("/numus/emergency_stop", [])
+        engine.dj_transitions.send_event("/numus/emergency_stop", [])
     except Exception as e:
         print(f"\n❌ 播放错误: {e}")
-        engine.osc_client.send_message("/numus/emergency_stop", [])
+        engine.dj_transitions.send_event("/numus/emergency_stop", [])
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
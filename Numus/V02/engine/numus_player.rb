@@ -10,6 +10,9 @@ set :numus_active, false
 set :current_chapter, -1
 set :current_bpm, 125
 set :energy_level, 0.1
+set :energy_curve, []
+set :energy_curve_step, 1
+set :energy_curve_pos, 0
 set :car_profile, "sedan_standard"
 
 # 章节元素状态
@@ -74,6 +77,7 @@ live_loop :numus_osc_handler do
     set :chapter_pad_active, false
     set :chapter_lead_active, false
     set :chapter_perc_active, false
+    set :energy_curve, []
     
     puts "⏹️  章节 #{chapter_idx + 1} 结束"
     
@@ -89,6 +93,12 @@ live_loop :numus_osc_handler do
     energy = [msg[1], 1.0].min
     set :energy_level, energy
     
+  when "/numus/energy_curve"
+    # 整条章节能量曲线（每 step 拍一个值），由 :numus_energy_follow 按拍推进
+    set :energy_curve_step, msg[2]
+    set :energy_curve, msg[3..-1]
+    set :energy_curve_pos, 0
+    
   when "/numus/ornament"
     sample_path = msg[1]
     amplitude = msg[2] || 0.5
@@ -108,6 +118,7 @@ live_loop :numus_osc_handler do
     
   when "/numus/emergency_stop"
     set :numus_active, false
+    set :energy_curve, []
     puts "🛑 紧急停止"
     
   when "/numus/finalize"
@@ -163,6 +174,21 @@ end
 
 #  核心播放循环 
 
+# 能量曲线跟随 - 按拍推进预发送的能量曲线
+live_loop :numus_energy_follow, sync: :met do
+  # 步长以拍为单位（章节 BPM），sleep 需按当前 BPM 换算
+  use_bpm get(:current_bpm)
+  curve = get(:energy_curve)
+  pos = get(:energy_curve_pos)
+  
+  if get(:numus_active) && pos < curve.length
+    set :energy_level, [curve[pos], 1.0].min
+    set :energy_curve_pos, pos + 1
+  end
+  
+  sleep get(:energy_curve_step)
+end
+
 # Kick 循环 - 车载低频优化
 live_loop :numus_kick, sync: :met do
   stop unless get(:numus_active)
@@ -0,0 +1,183 @@
+import wave
+import numpy as np
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+
+class NumusOrnamentSynth:
+    """
+    进程内装饰音合成器（无需 fluidsynth）
+    针对 _create_ornament_midi 的四种音色：bell / lead / pad / texture，
+    以单周期波表 + 包络表合成，直接用标准库 wave 写出 16bit 立体声 WAV
+    """
+
+    VERSION = "numpy-synth-v1"  # 参与渲染缓存键，合成算法变化时更新
+
+    TABLE_SIZE = 4096
+
+    # GM 音色号 -> 音色
+    PROGRAM_VOICES = {14: "bell", 81: "lead", 88: "pad", 95: "texture"}
+
+    # 音色参数：谐波 [(倍频, 幅度)]、ADSR (秒/电平)、释放时长、失谐 (音分)
+    VOICES = {
+        "bell": {
+            "partials": [(1.0, 1.0), (2.76, 0.5), (5.40, 0.25), (8.93, 0.12)],
+            "attack": 0.002, "decay": 1.2, "sustain": 0.0, "release": 0.8,
+            "detune": [0.0]
+        },
+        "lead": {
+            # 奇次谐波近似方波
+            "partials": [(k, 1.0 / k) for k in range(1, 16, 2)],
+            "attack": 0.01, "decay": 0.15, "sustain": 0.7, "release": 0.12,
+            "detune": [-6.0, 6.0]
+        },
+        "pad": {
+            # 锯齿波谐波，慢起音
+            "partials": [(k, 1.0 / k) for k in range(1, 13)],
+            "attack": 0.6, "decay": 0.5, "sustain": 0.8, "release": 1.0,
+            "detune": [-9.0, 0.0, 9.0]
+        },
+        "texture": {
+            "partials": [(1.0, 1.0), (1.5, 0.4), (3.0, 0.2)],
+            "attack": 0.05, "decay": 0.4, "sustain": 0.5, "release": 0.5,
+            "detune": [-15.0, 15.0],
+            "noise": 0.35
+        }
+    }
+
+    def __init__(self, sample_rate: int = 44100, gain: float = 0.5, seed: int = 314159):
+        """
+        Args:
+            sample_rate: 采样率
+            gain: 输出增益（与 fluidsynth -g 含义相同）
+            seed: 噪声种子，保证同一输入渲染结果一致
+        """
+        self.sample_rate = sample_rate
+        self.gain = gain
+        self.seed = seed
+
+        # 整数倍泛音的音色各一张单周期波表（末尾多一个采样便于线性插值）
+        phase = np.arange(self.TABLE_SIZE + 1) / self.TABLE_SIZE
+        self.tables: Dict[str, np.ndarray] = {}
+        for name, voice in self.VOICES.items():
+            if name == "bell":
+                continue
+            table = np.zeros(self.TABLE_SIZE + 1)
+            for ratio, amp in voice["partials"]:
+                table += amp * np.sin(2 * np.pi * ratio * phase)
+            self.tables[name] = table / np.max(np.abs(table))
+
+    # ==================== 合成 ====================
+
+    def render(self, notes: List[Tuple[int, int, float, float]], program: int,
+               wav_path: Path) -> bool:
+        """
+        合成音符列表并写出 WAV
+
+        Args:
+            notes: [(pitch, velocity, start, end), ...]，时间单位为秒
+            program: GM 音色号
+            wav_path: 输出路径
+        """
+        voice_name = self.PROGRAM_VOICES.get(program, "texture")
+        voice = self.VOICES[voice_name]
+
+        if not notes:
+            return False
+
+        total = max(end for _, _, _, end in notes) + voice["release"]
+        buffer = np.zeros(int(total * self.sample_rate) + 1)
+
+        for pitch, velocity, start, end in notes:
+            tone = self._render_note(voice_name, voice, pitch, velocity, end - start)
+            offset = int(start * self.sample_rate)
+            buffer[offset:offset + len(tone)] += tone
+
+        self._write_wav(buffer * self.gain, wav_path)
+        return True
+
+    def _render_note(self, voice_name: str, voice: Dict, pitch: int,
+                     velocity: int, duration: float) -> np.ndarray:
+        """单个音符：波表振荡器（含失谐叠加）× ADSR 包络"""
+        sr = self.sample_rate
+        length = int((duration + voice["release"]) * sr)
+        t = np.arange(length) / sr
+        freq = 440.0 * 2.0 ** ((pitch - 69) / 12.0)
+
+        tone = np.zeros(length)
+        for cents in voice["detune"]:
+            f = freq * 2.0 ** (cents / 1200.0)
+            if voice_name == "bell":
+                # 钟声为非整数倍泛音，直接按频率叠加正弦并让高泛音衰减更快
+                for ratio, amp in voice["partials"]:
+                    tone += amp * np.sin(2 * np.pi * f * ratio * t) * np.exp(-t * ratio * 1.5)
+            else:
+                tone += self._wavetable(self.tables[voice_name], f, length)
+        tone /= len(voice["detune"])
+
+        if voice.get("noise"):
+            rng = np.random.default_rng(self.seed + pitch)
+            noise = rng.standard_normal(length)
+            # 一阶低通，截止随音高变化
+            alpha = min(1.0, 2 * np.pi * freq * 4 / sr)
+            noise = self._one_pole(noise, alpha)
+            tone = tone * (1 - voice["noise"]) + noise * voice["noise"]
+
+        return tone * self._envelope(voice, duration, length) * (velocity / 127.0) * 0.3
+
+    def _wavetable(self, table: np.ndarray, freq: float, length: int) -> np.ndarray:
+        """线性插值读取波表"""
+        position = (np.arange(length) * (freq * self.TABLE_SIZE / self.sample_rate)) % self.TABLE_SIZE
+        index = position.astype(np.int64)
+        frac = position - index
+        return table[index] + (table[index + 1] - table[index]) * frac
+
+    def _envelope(self, voice: Dict, duration: float, length: int) -> np.ndarray:
+        """ADSR 包络（释放段从音符结束时的电平开始）"""
+        sr = self.sample_rate
+        attack = max(1, int(voice["attack"] * sr))
+        decay = max(1, int(voice["decay"] * sr))
+        hold = int(duration * sr)
+        sustain = voice["sustain"]
+
+        env = np.full(hold, sustain)
+        a_end = min(attack, hold)
+        env[:a_end] = np.linspace(0.0, 1.0, attack, endpoint=False)[:a_end]
+        d_end = min(attack + decay, hold)
+        if d_end > attack:
+            env[attack:d_end] = np.linspace(1.0, sustain, decay, endpoint=False)[:d_end - attack]
+
+        release_level = env[-1] if hold else 0.0
+        release = np.linspace(release_level, 0.0, length - hold)
+        return np.concatenate([env, release])
+
+    @staticmethod
+    def _one_pole(signal: np.ndarray, alpha: float) -> np.ndarray:
+        """一阶低通 y[n] = y[n-1] + α(x[n] - y[n-1])，按块以指数核向量化"""
+        out = np.empty_like(signal)
+        decay = 1.0 - alpha
+        block = 256
+        powers = decay ** np.arange(1, block + 1)
+        kernel = alpha * decay ** np.arange(block)
+        y = 0.0
+        for i in range(0, len(signal), block):
+            x = signal[i:i + block]
+            n = len(x)
+            # 块内卷积 + 上一块末值的衰减延续
+            conv = np.convolve(x, kernel[:n])[:n]
+            out[i:i + n] = conv + y * powers[:n]
+            y = out[i + n - 1]
+        return out
+
+    # ==================== 输出 ====================
+
+    def _write_wav(self, signal: np.ndarray, wav_path: Path):
+        """写出 16bit 立体声 WAV（与 fluidsynth 默认输出格式一致）"""
+        pcm = (np.clip(signal, -1.0, 1.0) * 32767).astype("<i2")
+        stereo = np.repeat(pcm, 2)
+
+        with wave.open(str(wav_path), 'wb') as f:
+            f.setnchannels(2)
+            f.setsampwidth(2)
+            f.setframerate(self.sample_rate)
+            f.writeframes(stereo.tobytes())
@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+
+class NumusRenderCache:
+    """
+    内容寻址的装饰音渲染缓存
+    以 (音符列表, 音色, 采样率, 增益, SoundFont摘要) 的哈希为键保存 WAV，
+    输出文件通过硬链接（不支持时退回拷贝）指向缓存对象，淘汰缓存对象不影响已输出的文件；
+    索引文件记录大小与最近使用时间，超过容量时按LRU淘汰。
+    命中只更新内存中的使用时间，索引在 put/淘汰 或 flush() 时写回
+    """
+
+    INDEX_NAME = "index.json"
+
+    def __init__(self, cache_dir: str = "output/cache", max_bytes: int = 512 * 1024 * 1024):
+        """
+        Args:
+            cache_dir: 缓存目录
+            max_bytes: 缓存总容量上限（字节）
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.index_path = self.cache_dir / self.INDEX_NAME
+
+        self._lock = threading.Lock()
+        self._index: Dict[str, Dict] = self._load_index()
+        self._digests: Dict[Tuple[str, int, int], str] = {}
+        self._dirty = False
+
+        self.hits = 0
+        self.misses = 0
+
+    # ==================== 键 ====================
+
+    @staticmethod
+    def make_key(notes: List[Tuple[int, int, float, float]], program: int,
+                 sample_rate: int, gain: float, soundfont_digest: str) -> str:
+        """
+        计算渲染结果的内容键
+
+        Args:
+            notes: [(pitch, velocity, start, end), ...]
+            program: MIDI 音色号
+            sample_rate: 渲染采样率
+            gain: 渲染增益
+            soundfont_digest: SoundFont 文件摘要
+        """
+        payload = json.dumps({
+            "notes": [[p, v, round(s, 6), round(e, 6)] for p, v, s, e in notes],
+            "program": program,
+            "sample_rate": sample_rate,
+            "gain": gain,
+            "soundfont": soundfont_digest
+        }, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def file_digest(self, path: Path) -> str:
+        """文件内容摘要（按路径、大小、mtime记忆，SoundFont只需读取一次）"""
+        try:
+            st = path.stat()
+        except OSError:
+            return "missing"
+
+        stamp = (str(path.resolve()), st.st_size, st.st_mtime_ns)
+        digest = self._digests.get(stamp)
+        if digest is None:
+            h = hashlib.sha1()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    h.update(chunk)
+            digest = self._digests[stamp] = h.hexdigest()
+        return digest
+
+    # ==================== 读写 ====================
+
+    def _object_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.wav"
+
+    def get(self, key: str, dest: Path) -> bool:
+        """命中时把缓存对象链接到 dest 并返回True"""
+        with self._lock:
+            obj = self._object_path(key)
+            if key not in self._index or not obj.exists():
+                if self._index.pop(key, None) is not None:
+                    self._dirty = True
+                self.misses += 1
+                return False
+
+            self._link(obj, dest)
+            self._index[key]["last_used"] = time.time()
+            self._dirty = True
+            self.hits += 1
+            return True
+
+    def put(self, key: str, rendered: Path):
+        """将刚渲染的文件收入缓存，原路径改为指向缓存对象的链接"""
+        with self._lock:
+            obj = self._object_path(key)
+            if obj.exists():
+                # 并发渲染了相同内容：保留已有对象
+                rendered.unlink()
+            else:
+                os.replace(rendered, obj)
+            self._link(obj, rendered)
+
+            self._index[key] = {"size": obj.stat().st_size, "last_used": time.time()}
+            self._evict(keep=key)
+            self._save_index()
+
+    def flush(self):
+        """把命中更新的使用时间写回索引文件（一批渲染结束后调用）"""
+        with self._lock:
+            if self._dirty:
+                self._save_index()
+
+    def _link(self, obj: Path, dest: Path):
+        """
+        dest -> obj：优先硬链接，不支持时拷贝
+        不使用符号链接：缓存对象被淘汰后符号链接会悬空
+        """
+        if dest.exists() or dest.is_symlink():
+            try:
+                if dest.samefile(obj):
+                    return
+            except OSError:
+                pass
+            dest.unlink()
+
+        try:
+            os.link(obj, dest)
+        except OSError:
+            shutil.copyfile(obj, dest)
+
+    # ==================== 淘汰 ====================
+
+    def total_bytes(self) -> int:
+        return sum(entry["size"] for entry in self._index.values())
+
+    def _evict(self, keep: Optional[str] = None):
+        """按最近使用时间淘汰，直到总大小不超过上限"""
+        total = self.total_bytes()
+        if total <= self.max_bytes:
+            return
+
+        for key, entry in sorted(self._index.items(), key=lambda item: item[1]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            # 输出文件是硬链接或拷贝，仍保有数据，这里只删除缓存对象
+            self._object_path(key).unlink(missing_ok=True)
+            del self._index[key]
+            total -= entry["size"]
+
+    # ==================== 索引文件 ====================
+
+    def _load_index(self) -> Dict[str, Dict]:
+        if not self.index_path.exists():
+            return {}
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"读取渲染缓存索引失败: {e}")
+            return {}
+
+    def _save_index(self):
+        tmp_path = self.index_path.with_name(self.INDEX_NAME + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, self.index_path)
+        self._dirty = False
+
+    def get_statistics(self) -> Dict:
+        """缓存统计"""
+        return {
+            "entries": len(self._index),
+            "total_bytes": self.total_bytes(),
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses
+        }
@@ -0,0 +1,96 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+
+@dataclass
+class RenderJob:
+    """单个装饰音渲染任务"""
+    key: str
+    track_name: str
+    chapter_name: str
+    ornament: Dict
+
+
+class NumusRenderPool:
+    """
+    装饰音并行渲染池
+    每个任务的耗时主要在 fluidsynth 子进程中，线程池即可让多个子进程同时占满所有核心，
+    且无需序列化渲染器；支持单任务超时、失败重试与进度回调
+    """
+
+    def __init__(self, renderer, max_workers: Optional[int] = None,
+                 timeout: float = 30.0, retries: int = 1,
+                 progress_callback: Optional[Callable[[int, int, str, Optional[str]], None]] = None):
+        """
+        Args:
+            renderer: NumusMIDIRenderer 实例（需提供 render_ornament）
+            max_workers: 并发数，默认 CPU 核心数
+            timeout: 单次渲染超时（秒），传给 fluidsynth 子进程
+            retries: 失败后的重试次数
+            progress_callback: 进度回调 (已完成数, 总数, 任务key, wav路径或None)
+        """
+        self.renderer = renderer
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.retries = retries
+        self.progress_callback = progress_callback or self._print_progress
+        self._lock = threading.Lock()
+
+    def render_all(self, jobs: List[RenderJob]) -> Dict[str, Optional[str]]:
+        """
+        并行渲染一批任务（相同key只渲染一次）
+
+        Returns:
+            {任务key: wav路径，失败为None}
+        """
+        unique: Dict[str, RenderJob] = {}
+        for job in jobs:
+            unique.setdefault(job.key, job)
+
+        results: Dict[str, Optional[str]] = {}
+        if not unique:
+            return results
+
+        total = len(unique)
+        done = 0
+        workers = min(self.max_workers, total)
+        print(f"并行渲染 {total} 个装饰音（{workers} 个 worker）...")
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(self._render_with_retry, job): job for job in unique.values()}
+
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    path = future.result()
+                except Exception as e:
+                    print(f"渲染任务异常 {job.key}: {e}")
+                    path = None
+
+                results[job.key] = path
+                done += 1
+                with self._lock:
+                    self.progress_callback(done, total, job.key, path)
+
+        print(f"并行渲染完成，成功 {sum(1 for p in results.values() if p)}/{total} 个")
+        return results
+
+    def _render_with_retry(self, job: RenderJob) -> Optional[str]:
+        """渲染单个任务，失败时重试"""
+        for attempt in range(self.retries + 1):
+            path = self.renderer.render_ornament(
+                job.track_name, job.chapter_name, job.ornament, timeout=self.timeout
+            )
+            if path:
+                return path
+            if attempt < self.retries:
+                print(f"  重试 {job.key} ({attempt + 1}/{self.retries})")
+        return None
+
+    @staticmethod
+    def _print_progress(done: int, total: int, key: str, path: Optional[str]):
+        mark = "✓" if path else "✗"
+        print(f"  [{done}/{total}] {mark} {key}")
@@ -1,6 +1,7 @@
 import json
+from bisect import bisect_left
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 
 class NumusSectionLibrary:
     """Numus Section 素材库管理器"""
@@ -10,6 +11,14 @@ class NumusSectionLibrary:
         self.sections = {}
         self.transitions = {}
         self.car_profiles = {}
+        
+        # 能量区间索引：端点排序后切分的基本区间 -> 覆盖该区间的 Section
+        self._energy_points: List[float] = []
+        self._energy_slots: List[List[Tuple[str, Dict]]] = [[]]
+        
+        # (Section名, 车载配置) -> 应用配置后的 Section（写时复制层，只读共享）
+        self._profiled_sections: Dict[Tuple[str, str], Dict] = {}
+        
         self.load_library()
     
     def load_library(self) -> bool:
@@ -22,6 +31,9 @@ class NumusSectionLibrary:
             self.transitions = config.get("dj_transitions", {})
             self.car_profiles = config.get("car_audio_profiles", {})
             
+            self._build_energy_index()
+            self._profiled_sections.clear()
+            
             print(f"已加载 {len(self.sections)} 个 Section 模板")
             return True
             
@@ -29,18 +41,50 @@ class NumusSectionLibrary:
             print(f"加载 Section 库失败: {e}")
             return False
     
+    def _build_energy_index(self) -> None:
+        """
+        构建能量区间索引
+        所有区间端点排序去重后，把数轴切成交替的「开区间 / 端点」基本区间，
+        每个基本区间预先记录覆盖它的 Section（保持配置中的顺序），查询只需一次二分
+        """
+        points = set()
+        for section_data in self.sections.values():
+            low, high = section_data.get("energy_range", [0, 1])
+            points.update((low, high))
+        self._energy_points = sorted(points)
+        
+        # 槽位 2i 为 points[i] 之前的开区间，2i+1 为端点 points[i] 本身，最后一个槽位在所有端点之后
+        representatives = []
+        for i, point in enumerate(self._energy_points):
+            previous = self._energy_points[i - 1] if i > 0 else point - 1
+            representatives.extend(((previous + point) / 2, point))
+        representatives.append(self._energy_points[-1] + 1 if self._energy_points else 0)
+        
+        self._energy_slots = []
+        for value in representatives:
+            slot = []
+            for section_name, section_data in self.sections.items():
+                low, high = section_data.get("energy_range", [0, 1])
+                if low <= value <= high:
+                    slot.append((section_name, section_data))
+            self._energy_slots.append(slot)
+    
+    def _sections_covering(self, energy_level: float) -> List[Tuple[str, Dict]]:
+        """能量区间包含 energy_level 的 Section（按配置顺序）"""
+        i = bisect_left(self._energy_points, energy_level)
+        if i < len(self._energy_points) and self._energy_points[i] == energy_level:
+            return self._energy_slots[2 * i + 1]
+        return self._energy_slots[2 * i]
+    
     def get_section_by_energy(self, energy_level: float, style_preference: str = None) -> Optional[Dict]:
-        """根据能量等级获取合适的 Section"""
+        """根据能量等级获取合适的 Section（能量区间索引查询）"""
         suitable_sections = []
         
-        for section_name, section_data in self.sections.items():
-            energy_range = section_data.get("energy_range", [0, 1])
-            
-            if energy_range[0] <= energy_level <= energy_range[1]:
-                # 如果有风格偏好，优先匹配
-                if style_preference and section_data.get("style") == style_preference:
-                    return {**section_data, "name": section_name}
-                suitable_sections.append({**section_data, "name": section_name})
+        for section_name, section_data in self._sections_covering(energy_level):
+            # 如果有风格偏好，优先匹配
+            if style_preference and section_data.get("style") == style_preference:
+                return {**section_data, "name": section_name}
+            suitable_sections.append({**section_data, "name": section_name})
         
         # 返回最匹配的 Section
         if suitable_sections:
@@ -66,31 +110,65 @@ class NumusSectionLibrary:
         return self.transitions.get(transition_type, self.transitions["energy_crossfade"])
     
     def apply_car_profile(self, section_data: Dict, profile_name: str = "sedan_standard") -> Dict:
-        """应用车载音频配置"""
-        car_profile = self.car_profiles.get(profile_name, self.car_profiles["sedan_standard"])
+        """
+        应用车载音频配置
+        返回写时复制的覆盖层：只有 amp 被调整的元素是新字典，其余嵌套数据与模板共享，调用方应视为只读。
+        库中的 Section 按 (Section名, 配置) 记忆，多个章节/多个配置不会重复复制同一模板
+        """
+        if profile_name not in self.car_profiles:
+            profile_name = "sedan_standard"
+        
+        section_name = section_data.get("name")
+        template = self.sections.get(section_name)
+        cacheable = template is not None and template.get("elements") is section_data.get("elements")
+        
+        if cacheable:
+            cached = self._profiled_sections.get((section_name, profile_name))
+            if cached is not None:
+                return cached
+        
+        modified_section = self._profile_layer(section_data, self.car_profiles[profile_name])
+        
+        if cacheable:
+            self._profiled_sections[(section_name, profile_name)] = modified_section
+        return modified_section
+    
+    @staticmethod
+    def _profile_layer(section_data: Dict, car_profile: Dict) -> Dict:
+        """为 Section 构建车载配置覆盖层（不修改原始数据）"""
+        if "elements" not in section_data:
+            return {**section_data}
         
-        # 深拷贝避免修改原始数据
-        import copy
-        modified_section = copy.deepcopy(section_data)
+        elements = {}
         
         # 应用车载优化到各元素
-        for element_name, element_data in modified_section.get("elements", {}).items():
+        for element_name, element_data in section_data.get("elements", {}).items():
+            if "amp" not in element_data:
+                elements[element_name] = element_data
+                continue
+            
+            amp = element_data["amp"]
+            scaled = False
+            
             # 应用全局车载参数
-            if "amp" in element_data:
-                if "car_boost" in element_data:
-                    element_data["amp"] *= element_data["car_boost"]
-                elif "car_emphasis" in element_data:
-                    element_data["amp"] *= element_data["car_emphasis"]
+            if "car_boost" in element_data:
+                amp *= element_data["car_boost"]
+                scaled = True
+            elif "car_emphasis" in element_data:
+                amp *= element_data["car_emphasis"]
+                scaled = True
             
             # 应用频率调整
             if "bass" in element_name.lower():
-                if "amp" in element_data:
-                    element_data["amp"] *= car_profile["bass_boost"]
+                amp *= car_profile["bass_boost"]
+                scaled = True
             elif "lead" in element_name.lower() or "pad" in element_name.lower():
-                if "amp" in element_data:
-                    element_data["amp"] *= car_profile["midrange_clarity"]
+                amp *= car_profile["midrange_clarity"]
+                scaled = True
+            
+            elements[element_name] = {**element_data, "amp": amp} if scaled else element_data
         
-        return modified_section
+        return {**section_data, "elements": elements}
     
     def generate_section_ruby_code(self, section_data: Dict, chapter_id: str) -> str:
         """将 Section 配置转换为 Ruby 代码"""
@@ -0,0 +1,64 @@
+"""
+NumusRenderCache 测试
+命中不写索引文件；不支持硬链接时输出为拷贝，淘汰缓存对象后已输出的文件仍可读
+"""
+
+import tempfile
+from pathlib import Path
+
+import render_cache
+from render_cache import NumusRenderCache
+
+
+def _render(directory: Path, name: str, data: bytes) -> Path:
+    path = directory / name
+    path.write_bytes(data)
+    return path
+
+
+def test_hit_does_not_rewrite_index():
+    """命中只更新内存，flush 时写回"""
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        cache = NumusRenderCache(str(tmp / "cache"))
+        cache.put("a", _render(tmp, "a.wav", b"a" * 10))
+
+        index_stat = cache.index_path.stat()
+        assert cache.get("a", tmp / "a_copy.wav")
+        assert cache.index_path.stat().st_mtime_ns == index_stat.st_mtime_ns
+
+        cache.flush()
+        reloaded = NumusRenderCache(str(tmp / "cache"))
+        assert reloaded._index["a"]["last_used"] == cache._index["a"]["last_used"]
+    print("✅ 命中不写索引")
+
+
+def test_eviction_keeps_outputs_without_hardlinks():
+    """硬链接不可用时退回拷贝，淘汰后旧输出仍完整"""
+    original_link = render_cache.os.link
+
+    def no_link(src, dst):
+        raise OSError("hardlinks unsupported")
+
+    render_cache.os.link = no_link
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            cache = NumusRenderCache(str(tmp / "cache"), max_bytes=15)
+            first = _render(tmp, "first.wav", b"1" * 10)
+            cache.put("first", first)
+            cache.put("second", _render(tmp, "second.wav", b"2" * 10))
+
+            assert "first" not in cache._index
+            assert not first.is_symlink()
+            assert first.read_bytes() == b"1" * 10
+    finally:
+        render_cache.os.link = original_link
+    print("✅ 淘汰后输出仍可读")
+
+
+if __name__ == "__main__":
+    test_hit_does_not_rewrite_index()
+    test_eviction_keeps_outputs_without_hardlinks()
+
+    print("\n所有测试完成！")
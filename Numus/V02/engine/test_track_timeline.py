@@ -0,0 +1,88 @@
+"""
+NumusTrackTimeline 定位与序列化测试
+两个章节（0-16拍、24-40拍），中间为8拍过渡
+"""
+
+from track_timeline import NumusTrackTimeline, TimelineEvent
+
+
+def _timeline(presend_curve: bool = False) -> NumusTrackTimeline:
+    events = []
+    for chapter, start in ((0, 0.0), (1, 24.0)):
+        events.append(TimelineEvent(start, chapter, "chapter_start", "/numus/chapter_start", (chapter,)))
+        events.append(TimelineEvent(start, chapter, "section_element", "/numus/section_element",
+                                    (chapter, "kick", "on")))
+        if presend_curve:
+            events.append(TimelineEvent(start, chapter, "energy_curve", "/numus/energy_curve",
+                                        (chapter, 4, 0.1, 0.2, 0.3, 0.4)))
+        else:
+            for offset, energy in ((0, 0.1), (4, 0.2), (8, 0.3), (12, 0.4)):
+                events.append(TimelineEvent(start + offset, chapter, "energy", "/numus/energy", (energy,)))
+        events.append(TimelineEvent(start + 16, chapter, "chapter_stop", "/numus/chapter_stop", (chapter,)))
+
+    # 过渡事件记为来源章节
+    events.append(TimelineEvent(18.0, 0, "transition", "/numus/filter", (0.5,)))
+    return NumusTrackTimeline(events, bpm=120, chapter_starts=[0.0, 24.0], total_beats=40.0)
+
+
+def _kinds(events):
+    return [(e.chapter, e.kind) for e in events]
+
+
+def test_seek_mid_chapter_restores_state():
+    """章节中途定位：补发章节状态与最近能量点"""
+    timeline = _timeline()
+    events = timeline.events_from(30.0)
+
+    assert _kinds(events[:3]) == [(1, "chapter_start"), (1, "section_element"), (1, "energy")]
+    assert events[2].args == (0.2,)
+    assert events[3].beat == 32.0
+    print("✅ 章节中途定位")
+
+
+def test_seek_in_transition_skips_finished_chapter():
+    """过渡中定位：已停止的章节不再补发 chapter_start / section_element"""
+    timeline = _timeline()
+    events = timeline.events_from(17.0)
+
+    assert all(e.beat >= 17.0 for e in events)
+    assert _kinds(events)[0] == (0, "transition")
+    assert (1, "chapter_start") in _kinds(events)
+    print("✅ 过渡中定位")
+
+
+def test_seek_rebases_energy_curve():
+    """预发能量曲线时，定位补发截去已播部分的曲线"""
+    timeline = _timeline(presend_curve=True)
+
+    restore = [e for e in timeline.events_from(30.0) if e.kind == "energy_curve"]
+    assert len(restore) == 1
+    assert restore[0].args == (1, 4, 0.2, 0.3, 0.4)
+
+    # 曲线末端之后定位只保留最后一个值
+    assert timeline.events_from(39.0)[2].args == (1, 4, 0.4)
+    # 从头开始不做任何改写
+    assert timeline.events_from(0.0) == list(timeline.events)
+    print("✅ 能量曲线截取")
+
+
+def test_round_trip_and_duration():
+    """to_dict / from_dict 往返一致，时长按BPM换算"""
+    timeline = _timeline(presend_curve=True)
+    restored = NumusTrackTimeline.from_dict(timeline.to_dict())
+
+    assert restored.events == timeline.events
+    assert restored.chapter_starts == timeline.chapter_starts
+    assert restored.duration_seconds == 20.0
+    assert timeline.progress(20.0) == 0.5
+    assert timeline.chapter_at(20.0) == 0 and timeline.chapter_at(24.0) == 1
+    print("✅ 序列化往返")
+
+
+if __name__ == "__main__":
+    test_seek_mid_chapter_restores_state()
+    test_seek_in_transition_skips_finished_chapter()
+    test_seek_rebases_energy_curve()
+    test_round_trip_and_duration()
+
+    print("\n所有测试完成！")
@@ -0,0 +1,133 @@
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, replace
+from typing import Dict, Iterable, List, Tuple
+
+
+@dataclass(frozen=True)
+class TimelineEvent:
+    """时间线上的一条 OSC 事件（beat 为全曲绝对拍位置）"""
+    beat: float
+    chapter: int     # 所属章节序号，过渡事件记为来源章节
+    kind: str        # chapter_start / chapter_stop / section_element / energy / ornament / transition
+    address: str
+    args: Tuple
+    label: str = ""  # 播放时打印的说明
+
+
+class NumusTrackTimeline:
+    """
+    编译后的作品时间线（不可变）
+    章节启停、Section 元素、能量点、装饰触发与过渡自动化全部展开为按拍排序的扁平事件列表，
+    时长、进度与定位只需查表或二分查找
+    """
+
+    # 定位时需要在起点之前补发的状态类事件（energy_curve 会截去起点之前已播过的部分）
+    STATE_KINDS = ("chapter_start", "section_element", "energy_curve")
+
+    def __init__(self, events: Iterable[TimelineEvent], bpm: float,
+                 chapter_starts: List[float], total_beats: float):
+        """
+        Args:
+            events: 事件（任意顺序，按 beat 稳定排序）
+            bpm: 全曲 BPM
+            chapter_starts: 各章节起始拍
+            total_beats: 全曲总拍数（含过渡）
+        """
+        self.events: Tuple[TimelineEvent, ...] = tuple(sorted(events, key=lambda e: e.beat))
+        self.bpm = bpm
+        self.seconds_per_beat = 60.0 / bpm
+        self.chapter_starts: Tuple[float, ...] = tuple(chapter_starts)
+        self.total_beats = total_beats
+
+        self._beats = [event.beat for event in self.events]
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    # ==================== 时间换算 ====================
+
+    def beat_to_seconds(self, beat: float) -> float:
+        return beat * self.seconds_per_beat
+
+    def seconds_to_beat(self, seconds: float) -> float:
+        return seconds / self.seconds_per_beat
+
+    @property
+    def duration_seconds(self) -> float:
+        return self.beat_to_seconds(self.total_beats)
+
+    @property
+    def duration_minutes(self) -> float:
+        return self.duration_seconds / 60.0
+
+    def progress(self, beat: float) -> float:
+        """全曲进度 0-1"""
+        if self.total_beats <= 0:
+            return 1.0
+        return min(1.0, max(0.0, beat / self.total_beats))
+
+    # ==================== 定位 ====================
+
+    def index_at(self, beat: float) -> int:
+        """第一个 beat >= 给定位置的事件下标"""
+        return bisect_left(self._beats, beat)
+
+    def chapter_at(self, beat: float) -> int:
+        """给定位置所在（或刚结束、正在过渡）的章节序号"""
+        return max(0, bisect_right(self.chapter_starts, beat) - 1)
+
+    def events_from(self, beat: float) -> List[TimelineEvent]:
+        """
+        从给定位置开始的事件
+        位置不在开头时，先补发所在章节此前的状态事件与最近一个能量点（beat 保持原值，播放时立即发送）；
+        位置在章节结束之后的过渡中时，该章节已停止，不再补发
+        """
+        index = self.index_at(beat)
+        if index == 0:
+            return list(self.events)
+
+        chapter = self.chapter_at(beat)
+        chapter_index = self.index_at(self.chapter_starts[chapter]) if self.chapter_starts else 0
+
+        restore = []
+        last_energy = None
+        for event in self.events[chapter_index:index]:
+            if event.chapter != chapter:
+                continue
+            if event.kind == "chapter_stop":
+                return list(self.events[index:])
+            if event.kind == "energy_curve":
+                restore.append(self._rebase_curve(event, beat))
+            elif event.kind in self.STATE_KINDS:
+                restore.append(event)
+            elif event.kind == "energy":
+                last_energy = event
+
+        if last_energy is not None:
+            restore.append(last_energy)
+        return restore + list(self.events[index:])
+
+    @staticmethod
+    def _rebase_curve(event: TimelineEvent, beat: float) -> TimelineEvent:
+        """能量曲线 (章节, 步长拍数, 值...) 截去定位点之前已走过的步"""
+        chapter_idx, step_beats, *curve = event.args
+        skip = min(len(curve) - 1, int((beat - event.beat) // step_beats))
+        return replace(event, args=(chapter_idx, step_beats, *curve[max(0, skip):]))
+
+    # ==================== 序列化 ====================
+
+    def to_dict(self) -> Dict:
+        """可写入 JSON 的播放计划"""
+        return {
+            "bpm": self.bpm,
+            "chapter_starts": list(self.chapter_starts),
+            "total_beats": self.total_beats,
+            "events": [[e.beat, e.chapter, e.kind, e.address, list(e.args), e.label] for e in self.events]
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "NumusTrackTimeline":
+        """从 to_dict 的结果恢复时间线"""
+        events = [TimelineEvent(beat, chapter, kind, address, tuple(args), label)
+                  for beat, chapter, kind, address, args, label in data["events"]]
+        return cls(events, data["bpm"], data["chapter_starts"], data["total_beats"])
@@ -0,0 +1,436 @@
+"""
+异步Track指挥器
+在单个asyncio事件循环上以协程运行 Track → Chapter → Section → Segment 整棵播放树
+"""
+
+import asyncio
+from typing import Dict, List, Optional, Set
+from pythonosc import osc_message_builder
+from CoreDataStructure import Track, Chapter, Section, ChapterTransition, TransitionType
+from SegmentPlayer import SegmentPlayer
+from SegmentLibraryManager import SegmentLibrary
+from PlaybackScheduler import PlaybackScheduler
+
+
+class AsyncOscClient:
+    """
+    基于asyncio数据报传输的OSC客户端
+    send_message接口与pythonosc的SimpleUDPClient一致，可直接交给SegmentPlayer使用
+    """
+
+    def __init__(self, osc_ip: str = "127.0.0.1", osc_port: int = 4560):
+        self.remote_addr = (osc_ip, osc_port)
+        self.transport: Optional[asyncio.DatagramTransport] = None
+
+    async def connect(self):
+        """在当前事件循环上建立数据报传输"""
+        if self.transport is not None:
+            return
+        loop = asyncio.get_running_loop()
+        self.transport, _ = await loop.create_datagram_endpoint(
+            asyncio.DatagramProtocol, remote_addr=self.remote_addr
+        )
+
+    def send_message(self, address: str, value):
+        """构造并发送一条OSC消息（非阻塞）"""
+        builder = osc_message_builder.OscMessageBuilder(address=address)
+        values = value if isinstance(value, (list, tuple)) else [value]
+        for v in values:
+            builder.add_arg(v)
+        self.send(builder.build())
+
+    def send(self, content):
+        """发送已构造的OSC消息或Bundle"""
+        if self.transport is None:
+            raise RuntimeError("AsyncOscClient尚未连接，请先await connect()")
+        self.transport.sendto(content.dgram)
+
+    def close(self):
+        """关闭传输"""
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+
+
+class AsyncTrackConductor:
+    """
+    Track级别的异步总指挥
+    每一层都是协程，所有等待都以绝对时刻为目标；取消根任务即可沿树向下传播，
+    已启动的Segment会在取消时统一停止。多个实例可在同一事件循环中并发播放。
+    """
+
+    # 过渡期间检查新启动track的步长（每小节步数，1/16音符）
+    STEPS_PER_BAR = 16
+
+    def __init__(self,
+                 segment_library: SegmentLibrary,
+                 osc_ip: str = "127.0.0.1",
+                 osc_port: int = 4560,
+                 lookahead: float = 0.05,
+                 lead_in: float = 0.1):
+        """
+        初始化异步Track指挥器
+
+        Args:
+            segment_library: Segment素材库实例
+            osc_ip: Sonic Pi OSC服务器地址
+            osc_port: Sonic Pi OSC端口
+            lookahead: 事件提前发送的固定时长（秒）
+            lead_in: 播放前预留的启动缓冲（秒）
+        """
+        self.segment_library = segment_library
+        self.osc_client = AsyncOscClient(osc_ip, osc_port)
+        self.segment_player = SegmentPlayer(osc_ip, osc_port, client=self.osc_client)
+        self.lookahead = lookahead
+        self.lead_in = lead_in
+
+        self.current_track: Optional[Track] = None
+        self.is_playing = False
+        self._origin: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._active_tracks: Set[str] = set()
+
+    # ==================== 入口 ====================
+
+    def run(self, track: Track):
+        """同步入口：在新的事件循环中播放整个Track"""
+        asyncio.run(self.play_track(track))
+
+    async def play_track(self, track: Track):
+        """播放一个Track，直到结束或被取消"""
+        await self.osc_client.connect()
+
+        self.current_track = track
+        self.is_playing = True
+        self._task = asyncio.current_task()
+        self._origin = asyncio.get_running_loop().time() + self.lookahead + self.lead_in
+
+        print(f"\n{'#'*80}")
+        print(f"# 开始播放Track(async): {track.name}")
+        print(f"# 场景: {track.theme_scene} | BPM: {track.core_dna.tempo}")
+        print(f"# 时长: {track.duration_minutes:.1f}分钟 | Chapters: {len(track.chapters)}")
+        print(f"{'#'*80}\n")
+
+        try:
+            await self._play_track_tree(track)
+            print(f"\n{'#'*80}")
+            print(f"# Track播放完成: {track.name}")
+            print(f"{'#'*80}\n")
+        except asyncio.CancelledError:
+            print(f"Track播放已取消: {track.name}")
+            raise
+        finally:
+            # 取消或结束时统一停止本指挥器启动的所有Segment
+            for track_name in list(self._active_tracks):
+                self._stop_track(track_name)
+            self.is_playing = False
+            self._task = None
+
+    def stop_track(self):
+        """取消当前Track（取消沿协程树向下传播）"""
+        if self._task is not None:
+            self._task.cancel()
+
+    # ==================== 时间 ====================
+
+    def _bar_time(self, bar: float, bpm: int) -> float:
+        """绝对小节位置 → 事件循环时刻"""
+        return self._origin + bar * PlaybackScheduler.bar_duration(bpm)
+
+    async def _sleep_until(self, when: float):
+        """等待到指定时刻前lookahead秒"""
+        delay = when - self.lookahead - asyncio.get_running_loop().time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    # ==================== 播放树 ====================
+
+    async def _play_track_tree(self, track: Track):
+        """按绝对小节排布所有Chapter并并发等待"""
+        bpm = track.core_dna.tempo
+        bar = 0.0
+        prev_last_tracks: List[str] = []
+        chapter_coros = []
+
+        for i, chapter in enumerate(track.chapters):
+            transition = None
+            if i > 0:
+                transition = self._find_transition(track, track.chapters[i-1].id, chapter.id)
+            next_transition = None
+            if i + 1 < len(track.chapters):
+                next_transition = self._find_transition(track, chapter.id, track.chapters[i+1].id)
+
+            coro, bar, prev_last_tracks = self._layout_chapter(
+                track, i, chapter, bpm, bar, transition, prev_last_tracks,
+                keep_last_section=next_transition is not None
+            )
+            chapter_coros.append(coro)
+
+        await asyncio.gather(*chapter_coros)
+        await self._sleep_until(self._bar_time(bar, bpm))
+
+    def _layout_chapter(self, track: Track, index: int, chapter: Chapter, bpm: int,
+                        start_bar: float, transition: Optional[ChapterTransition],
+                        prev_last_tracks: List[str], keep_last_section: bool):
+        """
+        计算Chapter内各Section的绝对位置
+
+        Returns:
+            (Chapter协程, Chapter结束位置, 最后一个Section的track列表)
+        """
+        params = dict(chapter.pattern_dna_variant or {})
+        children = []
+        last_tracks: List[str] = []
+        bar = start_bar
+        sections = list(chapter.sections)
+
+        if transition and sections:
+            # 第一个Section以0音量启动，与前一个Chapter重叠过渡
+            new_tracks: List[str] = []
+            end_bar = bar + transition.duration_bars
+            children.append(self._play_section(
+                track, chapter, sections[0], bpm, bar, end_bar, {"volume": 0.0}, new_tracks
+            ))
+            children.append(self._run_transition(
+                transition, prev_last_tracks, new_tracks, bpm, bar
+            ))
+            last_tracks = new_tracks
+            bar = end_bar
+            sections = sections[1:]
+
+        for i, section in enumerate(sections):
+            is_last = i == len(sections) - 1
+            end_bar = bar + section.duration_bars
+            tracks: List[str] = []
+            if is_last:
+                last_tracks = tracks
+            children.append(self._play_section(
+                track, chapter, section, bpm, bar,
+                None if (is_last and keep_last_section) else end_bar,
+                params, tracks
+            ))
+            bar = end_bar
+
+        coro = self._play_chapter(track, index, chapter, bpm, start_bar, children)
+        return coro, bar, last_tracks
+
+    async def _play_chapter(self, track: Track, index: int, chapter: Chapter, bpm: int,
+                            start_bar: float, children: List):
+        """Chapter协程：等待起点后并发运行其Section与过渡"""
+        try:
+            await self._sleep_until(self._bar_time(start_bar, bpm))
+        except asyncio.CancelledError:
+            # 起点前被取消：子协程尚未启动，直接关闭避免未等待警告
+            for child in children:
+                child.close()
+            raise
+        
+        print(f"\n{'='*80}")
+        print(f"Chapter {index+1}/{len(track.chapters)}: {chapter.name}")
+        print(f"{'='*80}")
+        await asyncio.gather(*children)
+
+    async def _play_section(self, track: Track, chapter: Chapter, section: Section,
+                            bpm: int, start_bar: float, end_bar: Optional[float],
+                            override_params: Dict, track_names: List[str]):
+        """
+        Section协程
+        end_bar为None时不在Section结束处停止（交给后续过渡淡出）
+        """
+        await self._sleep_until(self._bar_time(start_bar, bpm))
+        print(f"\n  Section: {section.name} ({section.section_type.value}, {section.duration_bars} bars)")
+
+        bar_duration = PlaybackScheduler.bar_duration(bpm)
+        start_time = self._bar_time(start_bar, bpm)
+        segments = []
+        current_bar = 0
+
+        for seq_item in section.segment_sequence:
+            segment = self.segment_library.get_segment(seq_item.get("segment_id"))
+            if not segment:
+                print(f"警告: Segment {seq_item.get('segment_id')} 未找到，跳过")
+                continue
+
+            seg_start = seq_item.get("start_bar", current_bar)
+            duration_bars = seq_item.get("duration_bars")
+            stop_time = None
+            if duration_bars:
+                stop_time = start_time + (seg_start + duration_bars) * bar_duration
+                current_bar = seg_start + duration_bars
+            else:
+                current_bar = seg_start + segment.playback_params.duration_bars
+
+            merged_params = {
+                "bpm": bpm,
+                **override_params,
+                **seq_item.get("params", {})
+            }
+            segments.append(self._play_segment(
+                segment, track.id, chapter.id, section.id, merged_params,
+                start_time + seg_start * bar_duration, stop_time, track_names
+            ))
+
+        await asyncio.gather(*segments)
+
+        if end_bar is not None:
+            await self._sleep_until(self._bar_time(end_bar, bpm))
+            for track_name in list(track_names):
+                self._stop_track(track_name)
+
+    async def _play_segment(self, segment, track_id: str, chapter_id: str, section_id: str,
+                            params: Dict, start_time: float, stop_time: Optional[float],
+                            track_names: List[str]):
+        """Segment协程：按时启动，指定了时长则按时停止"""
+        await self._sleep_until(start_time)
+        track_name = self.segment_player.play_segment(
+            segment=segment,
+            track_id=track_id,
+            chapter_id=chapter_id,
+            section_id=section_id,
+            override_params=params
+        )
+        track_names.append(track_name)
+        self._active_tracks.add(track_name)
+
+        if stop_time is not None:
+            await self._sleep_until(stop_time)
+            self._stop_track(track_name)
+
+    def _stop_track(self, track_name: str):
+        """停止一个由本指挥器启动的track（重复停止会被忽略）"""
+        if track_name in self._active_tracks:
+            self._active_tracks.discard(track_name)
+            self.segment_player.stop_segment(track_name)
+
+    # ==================== DJ过渡 ====================
+
+    async def _ramp_tracks(self, ramps: List[tuple], duration_bars: float, bpm: int,
+                           at: float) -> float:
+        """
+        参数渐变协程：每个track每个参数只发送一次ramp，由Sonic Pi端插值
+        track列表随Segment协程启动逐步填充，渐变期间按步长检查：新启动的track从当前插值
+        发送剩余时长的ramp，渐变结束时才启动的（或起止值相同的）直接设置参数
+
+        Returns:
+            渐变结束时刻
+        """
+        duration = duration_bars * PlaybackScheduler.bar_duration(bpm)
+        steps = max(1, int(duration_bars * self.STEPS_PER_BAR))
+        sent = set()
+
+        for i in range(steps + 1):
+            progress = i / steps
+            step_time = at + progress * duration
+            await self._sleep_until(step_time)
+            # 让同一时刻到期的Segment协程先登记track名
+            await asyncio.sleep(0)
+
+            track_ramps = []
+            track_sets = []
+            for tracks, param_name, start_value, end_value in ramps:
+                for track in list(tracks):
+                    if (track, param_name) in sent:
+                        continue
+                    sent.add((track, param_name))
+                    value = start_value + (end_value - start_value) * progress
+                    if progress >= 1.0 or start_value == end_value:
+                        track_sets.append((track, param_name, value))
+                    else:
+                        track_ramps.append((track, param_name, value, end_value))
+
+            if track_ramps:
+                self.segment_player.ramp_segments_batch(
+                    track_ramps, duration_bars * (1.0 - progress), bpm, at=step_time
+                )
+            if track_sets:
+                self.segment_player.set_segments_batch(track_sets, at=step_time)
+
+        return at + duration
+
+    def _stop_tracks(self, tracks: List[str], at: float):
+        """在同一时刻停止一组由本指挥器启动的track（单个Bundle）"""
+        names = [name for name in tracks if name in self._active_tracks]
+        self._active_tracks.difference_update(names)
+        self.segment_player.stop_segments_batch(names, at=at)
+
+    async def _run_transition(self, transition: ChapterTransition, from_tracks: List[str],
+                              to_tracks: List[str], bpm: int, start_bar: float):
+        """Chapter间DJ过渡协程（与DJTransitionManager的四种技法一致）"""
+        start_time = self._bar_time(start_bar, bpm)
+        bar_duration = PlaybackScheduler.bar_duration(bpm)
+        total_duration = transition.duration_bars * bar_duration
+        kind = transition.transition_type
+
+        await self._sleep_until(start_time)
+        print(f"\n执行DJ过渡(async): {kind.value} ({transition.duration_bars} bars)")
+
+        if kind == TransitionType.FILTER_SWEEP:
+            end_time = await self._ramp_tracks(
+                [(from_tracks, "cutoff", 130.0, 40.0), (to_tracks, "cutoff", 40.0, 130.0)],
+                transition.duration_bars, bpm, start_time
+            )
+            self._stop_tracks(from_tracks, end_time)
+
+        elif kind == TransitionType.BREAKDOWN_BUILD:
+            half_bars = transition.duration_bars / 2
+            breakdown_end = await self._ramp_tracks(
+                [(from_tracks, "volume", 1.0, 0.0)], half_bars, bpm, start_time
+            )
+            self._stop_tracks(from_tracks, breakdown_end)
+
+            build_start = breakdown_end + bar_duration * 0.5
+            await self._ramp_tracks([(to_tracks, "volume", 0.0, 1.0)], half_bars, bpm, build_start)
+
+        elif kind == TransitionType.IMPACT_DROP:
+            self._stop_tracks(from_tracks, start_time)
+            drop_time = start_time + min(total_duration, bar_duration)
+            # 落点起新tracks满音量，之后直到过渡结束才启动的track同样补设
+            await self._ramp_tracks(
+                [(to_tracks, "volume", 1.0, 1.0)],
+                (start_time + total_duration - drop_time) / bar_duration, bpm, drop_time
+            )
+
+        else:
+            end_time = await self._ramp_tracks(
+                [(from_tracks, "volume", 1.0, 0.0), (to_tracks, "volume", 0.0, 1.0)],
+                transition.duration_bars, bpm, start_time
+            )
+            self._stop_tracks(from_tracks, end_time)
+
+        print(f"{kind.value} 完成")
+
+    def _find_transition(self, track: Track, from_id: str, to_id: str) -> Optional[ChapterTransition]:
+        """查找Chapter间的过渡配置"""
+        for trans in track.chapter_transitions:
+            if trans.from_chapter_id == from_id and trans.to_chapter_id == to_id:
+                return trans
+        return None
+
+    def get_track_progress(self) -> Dict:
+        """获取播放进度"""
+        if not self.current_track or self._task is None:
+            return {"progress": 0.0}
+
+        bpm = self.current_track.core_dna.tempo
+        elapsed = max(0.0, self._task.get_loop().time() - self._origin)
+        return {
+            "track_id": self.current_track.id,
+            "track_name": self.current_track.name,
+            "elapsed_bars": elapsed / PlaybackScheduler.bar_duration(bpm),
+            "active_tracks": len(self._active_tracks)
+        }
+
+
+async def play_tracks_concurrently(conductors_and_tracks: List[tuple]):
+    """
+    在同一事件循环中并发播放多个Track（如多音区车载、预览渲染）
+
+    Args:
+        conductors_and_tracks: [(AsyncTrackConductor, Track), ...]
+    
+    Returns:
+        各Track的结果；单个Track被取消或出错不影响其他Track继续播放
+    """
+    return await asyncio.gather(*(conductor.play_track(track)
+                                  for conductor, track in conductors_and_tracks),
+                                return_exceptions=True)
@@ -4,30 +4,30 @@ Chapter播放器
 """
 
 from typing import Optional, Dict, List
-import time
-import threading
 from CoreDataStructure import Chapter, PatternDNA
 from SectionPlayer import SectionPlayer
 from SegmentPlayer import SegmentPlayer
 from SegmentLibraryManager import SegmentLibrary
+from PlaybackScheduler import PlaybackScheduler
 
 
 class ChapterPlayer:
     """Chapter级别的播放控制器"""
     
-    def __init__(self, segment_player: SegmentPlayer, segment_library: SegmentLibrary):
+    def __init__(self, segment_player: SegmentPlayer, segment_library: SegmentLibrary,
+                 scheduler: Optional[PlaybackScheduler] = None):
         """
         初始化Chapter播放器
         
         Args:
             segment_player: SegmentPlayer实例
             segment_library: Segment素材库实例
+            scheduler: 共享的播放调度器（None则自建）
         """
-        self.section_player = SectionPlayer(segment_player, segment_library)
+        self.scheduler = scheduler or PlaybackScheduler()
+        self.section_player = SectionPlayer(segment_player, segment_library, self.scheduler)
         self.segment_library = segment_library
         self.current_chapter: Optional[Chapter] = None
-        self.is_playing = False
-        self.playback_thread: Optional[threading.Thread] = None
         self.current_section_tracks: List[str] = []
     
     def play_chapter(self,
@@ -35,9 +35,13 @@ class ChapterPlayer:
                      track_id: str,
                      core_bpm: int,
                      pattern_dna: PatternDNA,
-                     override_params: Optional[Dict] = None) -> List[str]:
+                     override_params: Optional[Dict] = None,
+                     start_bar: float = 0.0,
+                     first_section: int = 0,
+                     keep_last_section: bool = False,
+                     seek_bar: Optional[float] = None) -> float:
         """
-        播放一个Chapter
+        播放一个Chapter（按绝对小节位置把所有Section提交到调度器）
         
         Args:
             chapter: Chapter对象
@@ -45,72 +49,75 @@ class ChapterPlayer:
             core_bpm: 核心BPM
             pattern_dna: 模式DNA
             override_params: 全局覆盖参数
+            start_bar: Chapter起始位置（相对调度器origin的绝对小节）
+            first_section: 从第几个Section开始（用于过渡overlap后续播）
+            keep_last_section: 最后一个Section结束时不停止（交给后续DJ过渡淡出）
+            seek_bar: 定位播放位置（绝对小节），落在第一个排布的Section内时从该处带相位开始
         
         Returns:
-            最后一个Section的活跃track列表（用于Chapter间过渡）
+            Chapter结束位置（绝对小节）
         """
-        self.current_chapter = chapter
-        self.is_playing = True
-        self.current_section_tracks.clear()
-        
-        print(f"\n{'='*70}")
-        print(f"播放Chapter: {chapter.name}")
-        print(f"风格: {chapter.style}")
-        print(f"时长: {chapter.duration_bars} bars")
-        print(f"包含 {len(chapter.sections)} 个Section")
-        print(f"{'='*70}")
-        
-        # 启动播放线程
-        self.playback_thread = threading.Thread(
-            target=self._playback_worker,
-            args=(chapter, track_id, core_bpm, pattern_dna, override_params),
-            daemon=True
-        )
-        self.playback_thread.start()
-        
-        # 等待播放完成
-        self.playback_thread.join()
-        
-        return self.current_section_tracks
-    
-    def _playback_worker(self,
-                        chapter: Chapter,
-                        track_id: str,
-                        core_bpm: int,
-                        pattern_dna: PatternDNA,
-                        override_params: Optional[Dict]):
-        """Chapter播放工作线程"""
+        self.scheduler.start()
         
         # 应用Chapter级别的Pattern DNA变体
-        chapter_params = override_params or {}
+        chapter_params = dict(override_params or {})
         if chapter.pattern_dna_variant:
             chapter_params.update(chapter.pattern_dna_variant)
         
-        # 依次播放每个Section
-        for i, section in enumerate(chapter.sections):
-            if not self.is_playing:
-                break
-            
-            print(f"\n  Section {i+1}/{len(chapter.sections)}: {section.name}")
-            
-            # 播放Section
+        seek_bar = seek_bar if seek_bar is not None and seek_bar > start_bar else None
+        self.scheduler.schedule_bar(seek_bar or start_bar, core_bpm, self._on_chapter_start, chapter)
+        
+        sections = chapter.sections[first_section:]
+        bar = start_bar
+        
+        # 依次排布每个Section，时刻由start_bar直接推算
+        for i, section in enumerate(sections, start=first_section):
+            offset_bars = seek_bar - bar if seek_bar is not None and i == first_section else 0.0
             section_tracks = self.section_player.play_section(
                 section=section,
                 track_id=track_id,
                 chapter_id=chapter.id,
                 bpm=core_bpm,
-                override_params=chapter_params
+                override_params=chapter_params,
+                start_time=self.scheduler.bar_time(bar, core_bpm),
+                offset_bars=offset_bars
+            )
+            self.scheduler.schedule_bar(
+                bar + offset_bars, core_bpm, self._on_section_start,
+                chapter, i, section_tracks
             )
             
-            self.current_section_tracks = section_tracks
-            
-            # 等待Section完成
-            section_duration = self._calculate_section_duration(section, core_bpm)
-            time.sleep(section_duration)
+            bar += section.duration_bars
             
-            # 停止当前Section
-            self.section_player.stop_section()
+            # Section结束时停止（最后一个Section可保留给过渡）
+            is_last = i == len(chapter.sections) - 1
+            if not (is_last and keep_last_section):
+                self.scheduler.schedule_bar(
+                    bar, core_bpm, self.section_player.stop_section, section_tracks,
+                    self.scheduler.bar_time(bar, core_bpm)
+                )
         
+        self.scheduler.schedule_bar(bar, core_bpm, self._on_chapter_end, chapter)
+        return bar
+    
+    def _on_chapter_start(self, chapter: Chapter):
+        """Chapter起始事件"""
+        self.current_chapter = chapter
+        
+        print(f"\n{'='*70}")
+        print(f"播放Chapter: {chapter.name}")
+        print(f"风格: {chapter.style}")
+        print(f"时长: {chapter.duration_bars} bars")
+        print(f"包含 {len(chapter.sections)} 个Section")
+        print(f"{'='*70}")
+    
+    def _on_section_start(self, chapter: Chapter, index: int, section_tracks: List[str]):
+        """Section起始事件"""
+        print(f"\n  Section {index+1}/{len(chapter.sections)}: {chapter.sections[index].name}")
+        self.current_section_tracks = section_tracks
+    
+    def _on_chapter_end(self, chapter: Chapter):
+        """Chapter结束事件"""
         print(f"\nChapter播放完成: {chapter.name}")
     
     def _calculate_section_duration(self, section, bpm: int) -> float:
@@ -120,7 +127,8 @@ class ChapterPlayer:
     
     def stop_chapter(self):
         """停止Chapter播放"""
-        self.is_playing = False
+        self.scheduler.clear()
+        self.section_player.timer_wheel.clear()
         self.section_player.stop_section()
         self.current_chapter = None
         self.current_section_tracks.clear()
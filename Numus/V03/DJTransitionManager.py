@@ -3,12 +3,10 @@ DJ过渡管理器
 实现专业的Chapter间DJ衔接技术
 """
 
-import time
-import threading
-from typing import List, Callable, Dict
-from enum import Enum
+from typing import List, Callable, Dict, Optional, Tuple
 from CoreDataStructure import ChapterTransition, TransitionType
 from SegmentPlayer import SegmentPlayer
+from PlaybackScheduler import PlaybackScheduler
 
 
 class DJTransitionManager:
@@ -17,14 +15,24 @@ class DJTransitionManager:
     实现各种专业DJ技法
     """
     
-    def __init__(self, segment_player: SegmentPlayer):
+    # Python端逐步渐变的精度（每小节步数，1/16音符）
+    STEPS_PER_BAR = 16
+    
+    def __init__(self, segment_player: SegmentPlayer,
+                 scheduler: Optional[PlaybackScheduler] = None,
+                 receiver_ramps: bool = True):
         """
         初始化DJ过渡管理器
         
         Args:
             segment_player: SegmentPlayer实例
+            scheduler: 共享的播放调度器（None则自建）
+            receiver_ramps: True时每条渐变只发送一次ramp命令由Sonic Pi端插值；
+                            False时在Python端逐步发送（每步一个覆盖所有track的Bundle）
         """
         self.segment_player = segment_player
+        self.scheduler = scheduler or PlaybackScheduler()
+        self.receiver_ramps = receiver_ramps
         
         # 注册过渡处理函数
         self.transition_handlers: Dict[TransitionType, Callable] = {
@@ -38,7 +46,8 @@ class DJTransitionManager:
                           transition: ChapterTransition,
                           from_chapter_tracks: List[str],
                           to_chapter_tracks: List[str],
-                          bpm: int):
+                          bpm: int,
+                          start_time: Optional[float] = None):
         """
         执行Chapter间的DJ过渡
         
@@ -47,6 +56,7 @@ class DJTransitionManager:
             from_chapter_tracks: 前一个Chapter的活跃track名称列表
             to_chapter_tracks: 后一个Chapter要启动的track名称列表
             bpm: 当前BPM
+            start_time: 过渡起始时刻（单调时钟），None表示立即开始
         """
         print(f"\n{'='*60}")
         print(f"执行DJ过渡: {transition.transition_type.value}")
@@ -55,165 +65,221 @@ class DJTransitionManager:
         print(f"To tracks: {len(to_chapter_tracks)}")
         print(f"{'='*60}\n")
         
+        self.scheduler.start()
+        if start_time is None:
+            start_time = self.scheduler.now() + self.scheduler.lookahead
+        
         handler = self.transition_handlers.get(transition.transition_type)
         
         if handler:
-            handler(transition, from_chapter_tracks, to_chapter_tracks, bpm)
+            handler(transition, from_chapter_tracks, to_chapter_tracks, bpm, start_time)
         else:
             print(f"警告: 未找到过渡类型 {transition.transition_type}, 使用默认crossfade")
-            self.energy_crossfade(transition, from_chapter_tracks, to_chapter_tracks, bpm)
+            self.energy_crossfade(transition, from_chapter_tracks, to_chapter_tracks, bpm, start_time)
+    
+    def _schedule_ramp(self, start_time: float, duration: float, steps: int,
+                       step_fn: Callable[[float, float], None], include_end: bool = True) -> float:
+        """
+        将渐变的每一步提交到调度器
+        
+        Args:
+            start_time: 渐变起始时刻
+            duration: 渐变时长（秒）
+            steps: 步数
+            step_fn: 每一步的回调，参数为进度（0.0-1.0）和该步的目标时刻
+            include_end: 是否包含progress=1.0的最后一步
+        
+        Returns:
+            渐变结束时刻
+        """
+        step_duration = duration / steps
+        last = steps + 1 if include_end else steps
+        for i in range(last):
+            step_time = start_time + i * step_duration
+            self.scheduler.schedule_at(step_time, step_fn, i / steps, step_time)
+        return start_time + duration
+    
+    def _ramp_tracks(self,
+                     ramps: List[Tuple[List[str], str, float, float]],
+                     start_time: float,
+                     duration_bars: float,
+                     bpm: int,
+                     curve: str = "linear") -> float:
+        """
+        对多组track同时做参数渐变
+        
+        Args:
+            ramps: [(track列表, 参数名, 起始值, 终点值), ...]
+            start_time: 渐变起始时刻
+            duration_bars: 渐变时长（小节数）
+            bpm: 当前BPM
+            curve: 插值曲线
+        
+        Returns:
+            渐变结束时刻
+        """
+        duration = duration_bars * PlaybackScheduler.bar_duration(bpm)
+        shape = SegmentPlayer.RAMP_CURVES.get(curve, SegmentPlayer.RAMP_CURVES["linear"])
+        steps = max(1, int(duration_bars * self.STEPS_PER_BAR))
+        
+        if self.receiver_ramps:
+            # 每个track每个参数只发送一条ramp，同一步的ramp合并为一个Bundle；
+            # track列表随Segment启动逐步填充，渐变期间才启动的track在下一步
+            # 从当前插值发送剩余时长的ramp，渐变结束时才启动的直接设为终点值
+            sent = set()
+            
+            def ramp_new_tracks(progress: float, step_time: float):
+                y = shape(progress)
+                track_ramps = []
+                for tracks, param_name, start_value, end_value in ramps:
+                    for track in list(tracks):
+                        if (track, param_name) in sent:
+                            continue
+                        sent.add((track, param_name))
+                        track_ramps.append(
+                            (track, param_name, start_value + (end_value - start_value) * y, end_value)
+                        )
+                if not track_ramps:
+                    return
+                if progress >= 1.0:
+                    self.segment_player.set_segments_batch(
+                        [(track, param_name, end) for track, param_name, _, end in track_ramps],
+                        at=step_time
+                    )
+                else:
+                    self._send_ramps(track_ramps, duration_bars * (1.0 - progress), bpm, curve, step_time)
+            
+            return self._schedule_ramp(start_time, duration, steps, ramp_new_tracks)
+        
+        def ramp_step(progress: float, step_time: float):
+            # 同一步所有track的参数变化合并为一个Bundle
+            y = shape(progress)
+            sets = [
+                (track, param_name, start_value + (end_value - start_value) * y)
+                for tracks, param_name, start_value, end_value in ramps
+                for track in list(tracks)
+            ]
+            self.segment_player.set_segments_batch(sets, at=step_time)
+        
+        return self._schedule_ramp(start_time, duration, steps, ramp_step)
+    
+    def _send_ramps(self, track_ramps: List[Tuple[str, str, float, float]],
+                    duration_bars: float, bpm: int, curve: str, start_time: float):
+        """发送一组ramp命令（以起始时刻为Bundle时间戳）"""
+        self.segment_player.ramp_segments_batch(
+            track_ramps, duration_bars, bpm, curve=curve, at=start_time
+        )
+    
+    def _stop_tracks(self, tracks: List[str], at: Optional[float] = None):
+        """在同一时刻停止一组track（单个Bundle）"""
+        self.segment_player.stop_segments_batch(list(tracks), at=at)
+    
+    def _set_tracks_param(self, tracks: List[str], param_name: str, value: float,
+                          at: Optional[float] = None):
+        """为一组track设置同一参数（单个Bundle）"""
+        self.segment_player.set_segments_batch(
+            [(track, param_name, value) for track in list(tracks)], at=at
+        )
     
     def energy_crossfade(self, 
                         transition: ChapterTransition,
                         from_tracks: List[str],
                         to_tracks: List[str],
-                        bpm: int):
+                        bpm: int,
+                        start_time: float):
         """
         能量平滑过渡：音量淡入淡出
         经典DJ混音技法
         """
-        bar_duration = (60.0 / bpm) * 4  # 一个小节的时长（秒）
-        total_duration = transition.duration_bars * bar_duration
-        steps = int(transition.duration_bars * 16)  # 1/16音符精度
-        step_duration = total_duration / steps
-        
-        def crossfade_worker():
-            for i in range(steps + 1):
-                progress = i / steps
-                
-                # 淡出旧tracks（音量从1.0降到0.0）
-                volume_out = 1.0 - progress
-                for track in from_tracks:
-                    self.segment_player.set_segment_param(track, "volume", volume_out)
-                
-                # 淡入新tracks（音量从0.0升到1.0）
-                volume_in = progress
-                for track in to_tracks:
-                    self.segment_player.set_segment_param(track, "volume", volume_in)
-                
-                time.sleep(step_duration)
-            
+        def crossfade_done(end_time: float):
             # 过渡完成，停止旧tracks
-            for track in from_tracks:
-                self.segment_player.stop_segment(track)
-            
+            self._stop_tracks(from_tracks, at=end_time)
             print("Energy Crossfade 完成")
         
-        # 启动过渡线程
-        threading.Thread(target=crossfade_worker, daemon=True).start()
+        # 淡出旧tracks（音量从1.0降到0.0），淡入新tracks（音量从0.0升到1.0）
+        end_time = self._ramp_tracks(
+            [(from_tracks, "volume", 1.0, 0.0), (to_tracks, "volume", 0.0, 1.0)],
+            start_time, transition.duration_bars, bpm
+        )
+        self.scheduler.schedule_at(end_time, crossfade_done, end_time)
     
     def filter_sweep(self,
                     transition: ChapterTransition,
                     from_tracks: List[str],
                     to_tracks: List[str],
-                    bpm: int):
+                    bpm: int,
+                    start_time: float):
         """
         滤波器扫频过渡
         通过低通滤波器cutoff变化实现音色明暗变化
         """
-        bar_duration = (60.0 / bpm) * 4
-        total_duration = transition.duration_bars * bar_duration
-        steps = int(transition.duration_bars * 16)
-        step_duration = total_duration / steps
-        
-        def sweep_worker():
-            for i in range(steps + 1):
-                progress = i / steps
-                
-                # 旧tracks：cutoff从130降到40（变暗、变闷）
-                cutoff_out = 130 - (90 * progress)
-                for track in from_tracks:
-                    self.segment_player.set_segment_param(track, "cutoff", cutoff_out)
-                
-                # 新tracks：cutoff从40升到130（变亮、变清晰）
-                cutoff_in = 40 + (90 * progress)
-                for track in to_tracks:
-                    self.segment_player.set_segment_param(track, "cutoff", cutoff_in)
-                
-                time.sleep(step_duration)
-            
+        def sweep_done(end_time: float):
             # 停止旧tracks
-            for track in from_tracks:
-                self.segment_player.stop_segment(track)
-            
+            self._stop_tracks(from_tracks, at=end_time)
             print("Filter Sweep 完成")
         
-        threading.Thread(target=sweep_worker, daemon=True).start()
+        # 旧tracks：cutoff从130降到40（变暗、变闷）
+        # 新tracks：cutoff从40升到130（变亮、变清晰）
+        end_time = self._ramp_tracks(
+            [(from_tracks, "cutoff", 130.0, 40.0), (to_tracks, "cutoff", 40.0, 130.0)],
+            start_time, transition.duration_bars, bpm
+        )
+        self.scheduler.schedule_at(end_time, sweep_done, end_time)
     
     def breakdown_build(self,
                        transition: ChapterTransition,
                        from_tracks: List[str],
                        to_tracks: List[str],
-                       bpm: int):
+                       bpm: int,
+                       start_time: float):
         """
         分解重建过渡
         先减少元素（breakdown），再逐步引入新元素（build）
         """
-        bar_duration = (60.0 / bpm) * 4
-        half_duration = (transition.duration_bars / 2) * bar_duration
-        
-        def breakdown_build_worker():
-            # 阶段1：Breakdown - 快速减少旧元素
-            breakdown_steps = int(transition.duration_bars * 8)
-            for i in range(breakdown_steps):
-                progress = i / breakdown_steps
-                volume = 1.0 - progress
-                
-                for track in from_tracks:
-                    self.segment_player.set_segment_param(track, "volume", volume)
-                
-                time.sleep(half_duration / breakdown_steps)
-            
-            # 停止所有旧tracks
-            for track in from_tracks:
-                self.segment_player.stop_segment(track)
-            
-            # 短暂静默（增强对比感）
-            time.sleep(bar_duration * 0.5)
-            
-            # 阶段2：Build - 逐步引入新元素
-            build_steps = int(transition.duration_bars * 8)
-            for i in range(build_steps):
-                progress = i / build_steps
-                volume = progress
-                
-                for track in to_tracks:
-                    self.segment_player.set_segment_param(track, "volume", volume)
-                
-                time.sleep(half_duration / build_steps)
-            
-            print("Breakdown-Build 完成")
+        bar_duration = PlaybackScheduler.bar_duration(bpm)
+        half_bars = transition.duration_bars / 2
+        
+        # 阶段1：Breakdown - 快速减少旧元素
+        breakdown_end = self._ramp_tracks(
+            [(from_tracks, "volume", 1.0, 0.0)], start_time, half_bars, bpm
+        )
+        
+        # 停止所有旧tracks
+        self.scheduler.schedule_at(breakdown_end, self._stop_tracks, from_tracks, breakdown_end)
         
-        threading.Thread(target=breakdown_build_worker, daemon=True).start()
+        # 短暂静默（增强对比感）后进入阶段2：Build - 逐步引入新元素
+        build_start = breakdown_end + bar_duration * 0.5
+        build_end = self._ramp_tracks(
+            [(to_tracks, "volume", 0.0, 1.0)], build_start, half_bars, bpm
+        )
+        
+        self.scheduler.schedule_at(build_end, print, "Breakdown-Build 完成")
     
     def impact_drop(self,
                    transition: ChapterTransition,
                    from_tracks: List[str],
                    to_tracks: List[str],
-                   bpm: int):
+                   bpm: int,
+                   start_time: float):
         """
         冲击降落过渡
         突然停止 + 短暂静默 + 强力启动
         常用于Drop前的紧张感营造
         """
-        bar_duration = (60.0 / bpm) * 4
+        bar_duration = PlaybackScheduler.bar_duration(bpm)
         
-        def impact_drop_worker():
-            # 立即停止所有旧tracks
-            for track in from_tracks:
-                self.segment_player.stop_segment(track)
-            
-            # 静默期（通常0.5-1个小节）
-            silence_duration = min(transition.duration_bars * bar_duration, bar_duration)
-            time.sleep(silence_duration)
-            
+        def impact_done(drop_time: float):
             # 新tracks已经在外部启动，这里只确保音量为最大
-            for track in to_tracks:
-                self.segment_player.set_segment_param(track, "volume", 1.0)
-            
+            self._set_tracks_param(to_tracks, "volume", 1.0, at=drop_time)
             print("Impact Drop 完成")
         
-        threading.Thread(target=impact_drop_worker, daemon=True).start()
+        # 立即停止所有旧tracks
+        self.scheduler.schedule_at(start_time, self._stop_tracks, from_tracks, start_time)
+        
+        # 静默期（通常0.5-1个小节）
+        silence_duration = min(transition.duration_bars * bar_duration, bar_duration)
+        drop_time = start_time + silence_duration
+        self.scheduler.schedule_at(drop_time, impact_done, drop_time)
     
     def get_transition_duration(self, transition: ChapterTransition, bpm: int) -> float:
         """
@@ -226,5 +292,5 @@ class DJTransitionManager:
         Returns:
             过渡时长（秒）
         """
-        bar_duration = (60.0 / bpm) * 4
-        return transition.duration_bars * bar_duration
\ No newline at end of file
+        bar_duration = PlaybackScheduler.bar_duration(bpm)
+        return transition.duration_bars * bar_duration
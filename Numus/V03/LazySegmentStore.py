@@ -0,0 +1,153 @@
+"""
+惰性Segment存储
+只常驻 id → (文件, 字节区间) 的偏移索引，首次访问时经mmap解码，解码结果放入有界LRU
+"""
+
+import json
+import mmap
+import re
+from collections import OrderedDict
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from StandardSegment import StandardSegment
+
+
+# JSON中会影响括号层级的记号：字符串（整体跳过）与四种括号
+_TOKEN_RE = re.compile(rb'"(?:[^"\\]|\\.)*"|[{}\[\]]', re.DOTALL)
+
+
+class LazySegmentStore(Mapping):
+    """
+    按需解码的Segment映射（接口与 Dict[str, StandardSegment] 一致）
+    遍历键不触发解码；通过 [] / get / values() 访问时才解码对应Segment。
+    """
+
+    def __init__(self,
+                 segments_dir: Path,
+                 decode: Callable[[dict], StandardSegment],
+                 offsets: Optional[Dict[str, Tuple[str, int, int]]] = None,
+                 capacity: int = 256):
+        """
+        初始化惰性存储
+
+        Args:
+            segments_dir: segments目录路径
+            decode: 原始JSON字典 -> StandardSegment 的解码函数
+            offsets: 偏移索引 {segment_id: (文件名, 起始字节, 结束字节)}
+            capacity: LRU缓存容量（已解码Segment数量上限）
+        """
+        self.segments_dir = Path(segments_dir)
+        self.decode = decode
+        self.offsets: Dict[str, Tuple[str, int, int]] = dict(offsets or {})
+        self.capacity = max(1, capacity)
+
+        self._cache: "OrderedDict[str, StandardSegment]" = OrderedDict()
+        self._maps: Dict[str, Tuple[object, mmap.mmap]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    # ==================== 偏移索引 ====================
+
+    @staticmethod
+    def scan_objects(data: bytes, key: bytes = b"segments") -> List[Tuple[int, int]]:
+        """
+        扫描顶层对象中 key 数组的每个元素对象，返回其字节区间 [start, end)
+        UTF-8多字节字符不会包含ASCII括号与引号，可直接在字节上扫描
+        """
+        ranges = []
+        target = b'"' + key + b'"'
+        depth = 0
+        in_array = False
+        array_depth = 0
+        start = 0
+        pending_key = False
+
+        for m in _TOKEN_RE.finditer(data):
+            token = m.group()
+
+            if token[0] == 0x22:  # 字符串
+                # 顶层对象中的键名，下一个 [ 即为目标数组
+                pending_key = depth == 1 and not in_array and token == target
+                continue
+
+            if token in (b"{", b"["):
+                if pending_key and token == b"[":
+                    in_array = True
+                    array_depth = depth + 1
+                elif in_array and depth == array_depth and token == b"{":
+                    start = m.start()
+                depth += 1
+            else:
+                depth -= 1
+                if in_array and depth == array_depth and token == b"}":
+                    ranges.append((start, m.end()))
+                elif in_array and depth == array_depth - 1:
+                    in_array = False
+            pending_key = False
+
+        return ranges
+
+    def add(self, segment_id: str, filename: str, start: int, end: int):
+        """登记一个Segment的偏移"""
+        self.offsets[segment_id] = (filename, start, end)
+        self._cache.pop(segment_id, None)
+
+    # ==================== Mapping接口 ====================
+
+    def __getitem__(self, segment_id: str) -> StandardSegment:
+        segment = self._cache.get(segment_id)
+        if segment is not None:
+            self._cache.move_to_end(segment_id)
+            self.hits += 1
+            return segment
+
+        location = self.offsets.get(segment_id)
+        if location is None:
+            raise KeyError(segment_id)
+
+        filename, start, end = location
+        segment = self.decode(json.loads(self._map(filename)[start:end]))
+        self.misses += 1
+
+        self._cache[segment_id] = segment
+        if len(self._cache) > self.capacity:
+            self._cache.popitem(last=False)
+        return segment
+
+    def __contains__(self, segment_id) -> bool:
+        return segment_id in self.offsets
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    # ==================== 文件映射 ====================
+
+    def _map(self, filename: str) -> mmap.mmap:
+        """按需打开并映射源文件（只读，整个生命周期复用）"""
+        entry = self._maps.get(filename)
+        if entry is None:
+            f = open(self.segments_dir / filename, 'rb')
+            entry = (f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+            self._maps[filename] = entry
+        return entry[1]
+
+    def close(self):
+        """释放所有文件映射与已解码缓存"""
+        for f, mm in self._maps.values():
+            mm.close()
+            f.close()
+        self._maps.clear()
+        self._cache.clear()
+
+    def get_cache_info(self) -> Dict:
+        """LRU缓存统计"""
+        return {
+            "cached": len(self._cache),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses
+        }
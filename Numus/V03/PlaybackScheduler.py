@@ -0,0 +1,233 @@
+"""
+播放调度器
+基于单调时钟的全局事件队列，替代各播放层级的time.sleep链
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+@dataclass(order=True)
+class ScheduledEvent:
+    """调度事件（按目标时刻排序，同一时刻按提交顺序）"""
+    time: float  # 目标时刻（time.monotonic秒）
+    seq: int
+    callback: Callable = field(compare=False)
+    args: Tuple[Any, ...] = field(default=(), compare=False)
+    tag: Optional[str] = field(default=None, compare=False)
+    cancelled: bool = field(default=False, compare=False)
+
+
+class PlaybackScheduler:
+    """
+    全局播放调度器
+    所有时间点都由同一个起点（origin）加上小节偏移直接算出，不做累加，
+    因此长时间播放不会产生漂移。单个分发线程按优先队列顺序执行事件，
+    每个事件提前lookahead秒发出，以抵消网络与Sonic Pi端的处理延迟。
+    """
+
+    # 最后这段时间内改用忙等，保证亚毫秒级抖动
+    SPIN_THRESHOLD = 0.002
+
+    def __init__(self, lookahead: float = 0.05, lead_in: float = 0.1):
+        """
+        初始化调度器
+
+        Args:
+            lookahead: 事件提前发送的固定时长（秒）
+            lead_in: set_origin默认预留的启动缓冲（秒）
+        """
+        self.lookahead = lookahead
+        self.lead_in = lead_in
+        self.origin: Optional[float] = None
+
+        self._queue: List[ScheduledEvent] = []
+        self._by_tag: Dict[str, List[ScheduledEvent]] = {}
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+    # ==================== 生命周期 ====================
+
+    def start(self):
+        """启动分发线程（重复调用无副作用）"""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+
+        self._thread = threading.Thread(target=self._dispatch_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止分发线程并丢弃所有待执行事件"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        self.clear()
+
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+        self._thread = None
+
+    def clear(self) -> int:
+        """取消所有待执行事件，返回取消数量"""
+        with self._cond:
+            count = sum(1 for e in self._queue if not e.cancelled)
+            for event in self._queue:
+                event.cancelled = True
+            self._queue.clear()
+            self._by_tag.clear()
+            self._cond.notify_all()
+        return count
+
+    @property
+    def is_running(self) -> bool:
+        return self._running
+
+    # ==================== 时间换算 ====================
+
+    @staticmethod
+    def now() -> float:
+        """当前单调时钟时刻"""
+        return time.monotonic()
+
+    @staticmethod
+    def bar_duration(bpm: float) -> float:
+        """一个小节的时长（秒），假设4/4拍"""
+        return (60.0 / bpm) * 4
+
+    def set_origin(self, origin: Optional[float] = None) -> float:
+        """
+        设置第0小节对应的时刻
+
+        Args:
+            origin: 单调时钟时刻，None表示当前时刻加上lead_in缓冲
+        """
+        self.origin = origin if origin is not None else self.now() + self.lookahead + self.lead_in
+        return self.origin
+
+    def bar_time(self, bar: float, bpm: float) -> float:
+        """将绝对小节位置换算为单调时钟时刻"""
+        if self.origin is None:
+            self.set_origin()
+        return self.origin + bar * self.bar_duration(bpm)
+
+    def time_to_bar(self, when: float, bpm: float) -> float:
+        """将单调时钟时刻换算为绝对小节位置"""
+        if self.origin is None:
+            return 0.0
+        return (when - self.origin) / self.bar_duration(bpm)
+
+    # ==================== 事件提交 ====================
+
+    def schedule_at(self, when: float, callback: Callable, *args,
+                    tag: Optional[str] = None) -> ScheduledEvent:
+        """
+        在指定时刻执行回调
+
+        Args:
+            when: 目标时刻（time.monotonic秒）
+            callback: 回调函数
+            *args: 回调参数
+            tag: 可选标签，用于批量取消
+
+        Returns:
+            ScheduledEvent句柄
+        """
+        event = ScheduledEvent(when, next(self._counter), callback, args, tag)
+
+        with self._cond:
+            heapq.heappush(self._queue, event)
+            if tag is not None:
+                self._by_tag.setdefault(tag, []).append(event)
+            # 只有新事件成为队首时才需要唤醒分发线程
+            if self._queue[0] is event:
+                self._cond.notify()
+
+        return event
+
+    def schedule_bar(self, bar: float, bpm: float, callback: Callable, *args,
+                     tag: Optional[str] = None) -> ScheduledEvent:
+        """在绝对小节位置执行回调"""
+        return self.schedule_at(self.bar_time(bar, bpm), callback, *args, tag=tag)
+
+    def cancel(self, event: ScheduledEvent):
+        """取消单个事件（惰性删除，出队时跳过）"""
+        with self._cond:
+            event.cancelled = True
+
+    def cancel_tag(self, tag: str) -> int:
+        """取消某个标签下的所有事件，返回取消数量"""
+        with self._cond:
+            events = self._by_tag.pop(tag, [])
+            count = 0
+            for event in events:
+                if not event.cancelled:
+                    event.cancelled = True
+                    count += 1
+        return count
+
+    def pending_count(self) -> int:
+        """待执行事件数量"""
+        with self._cond:
+            return sum(1 for e in self._queue if not e.cancelled)
+
+    # ==================== 分发线程 ====================
+
+    def _dispatch_loop(self):
+        """事件分发主循环"""
+        while True:
+            with self._cond:
+                event = None
+                while self._running:
+                    # 丢弃已取消的队首
+                    while self._queue and self._queue[0].cancelled:
+                        self._discard(heapq.heappop(self._queue))
+
+                    if not self._queue:
+                        self._cond.wait()
+                        continue
+
+                    due = self._queue[0].time - self.lookahead
+                    remaining = due - self.now()
+                    if remaining <= self.SPIN_THRESHOLD:
+                        event = heapq.heappop(self._queue)
+                        self._discard(event)
+                        break
+                    self._cond.wait(remaining - self.SPIN_THRESHOLD)
+
+                if not self._running:
+                    return
+
+            # 释放锁后忙等最后一小段，避免阻塞提交方
+            due = event.time - self.lookahead
+            while self.now() < due:
+                pass
+
+            if event.cancelled:
+                continue
+
+            try:
+                event.callback(*event.args)
+            except Exception as e:
+                print(f"调度事件执行错误: {e}")
+
+    def _discard(self, event: ScheduledEvent):
+        """从标签索引中移除已出队的事件"""
+        if event.tag is None:
+            return
+        events = self._by_tag.get(event.tag)
+        if events is None:
+            return
+        try:
+            events.remove(event)
+        except ValueError:
+            pass
+        if not events:
+            del self._by_tag[event.tag]
@@ -4,40 +4,45 @@ Section播放器
 """
 
 from typing import List, Dict, Optional
-import time
-import threading
 from CoreDataStructure import Section
 from SegmentPlayer import SegmentPlayer
 from SegmentLibraryManager import SegmentLibrary
+from PlaybackScheduler import PlaybackScheduler
+from TimerWheel import TimerWheel
 
 
 class SectionPlayer:
     """Section级别的播放控制器"""
     
-    def __init__(self, segment_player: SegmentPlayer, segment_library: SegmentLibrary):
+    def __init__(self, segment_player: SegmentPlayer, segment_library: SegmentLibrary,
+                 scheduler: Optional[PlaybackScheduler] = None):
         """
         初始化Section播放器
         
         Args:
             segment_player: SegmentPlayer实例
             segment_library: Segment素材库实例
+            scheduler: 共享的播放调度器（None则自建）
         """
         self.segment_player = segment_player
         self.segment_library = segment_library
+        self.scheduler = scheduler or PlaybackScheduler()
+        self.timer_wheel = TimerWheel(self.scheduler)
         self.current_section: Optional[Section] = None
         self.section_start_time: Optional[float] = None
+        self.current_bpm: Optional[int] = None
         self.active_track_names: List[str] = []
-        self.is_playing = False
-        self.playback_thread: Optional[threading.Thread] = None
     
     def play_section(self, 
                      section: Section,
                      track_id: str,
                      chapter_id: str,
                      bpm: int,
-                     override_params: Optional[Dict] = None) -> List[str]:
+                     override_params: Optional[Dict] = None,
+                     start_time: Optional[float] = None,
+                     offset_bars: float = 0.0) -> List[str]:
         """
-        播放一个Section
+        播放一个Section（将所有Segment启动事件提交到调度器）
         
         Args:
             section: Section对象
@@ -45,47 +50,35 @@ class SectionPlayer:
             chapter_id: Chapter标识
             bpm: 当前BPM
             override_params: 全局覆盖参数
+            start_time: Section起始时刻（单调时钟），None表示立即开始
+            offset_bars: 定位播放时从Section内第几小节开始：此前已结束的Segment跳过，
+                         正在播放的Segment在定位点带相位启动
         
         Returns:
-            启动的track名称列表
+            track名称列表（随Segment实际启动逐步填充）
         """
-        self.current_section = section
-        self.section_start_time = time.time()
-        self.is_playing = True
-        self.active_track_names.clear()
+        self.scheduler.start()
+        if start_time is None:
+            start_time = self.scheduler.now() + self.scheduler.lookahead
         
-        print(f"\n开始播放Section: {section.name}")
-        print(f"类型: {section.section_type.value}")
-        print(f"时长: {section.duration_bars} bars")
+        # 每次播放使用新的列表，避免影响调用方持有的旧列表
+        track_names: List[str] = []
         
         # 计算小节时长
-        bar_duration = (60.0 / bpm) * 4  # 假设4/4拍
+        bar_duration = PlaybackScheduler.bar_duration(bpm)
         
-        # 启动播放线程
-        self.playback_thread = threading.Thread(
-            target=self._playback_worker,
-            args=(section, track_id, chapter_id, bpm, bar_duration, override_params),
-            daemon=True
+        self.scheduler.schedule_at(
+            start_time + offset_bars * bar_duration, self._on_section_start,
+            section, bpm, start_time, track_names
         )
-        self.playback_thread.start()
         
-        return self.active_track_names
-    
-    def _playback_worker(self, 
-                        section: Section,
-                        track_id: str,
-                        chapter_id: str,
-                        bpm: int,
-                        bar_duration: float,
-                        override_params: Optional[Dict]):
-        """Section播放工作线程"""
         current_bar = 0
         
-        # 遍历segment_sequence
+        # 同一起始小节的Segment合并为一个事件（一个OSC Bundle），保证同拍对齐
+        groups: Dict[float, List[Dict]] = {}
+        
+        # 遍历segment_sequence，所有时刻都从start_time直接推算
         for seq_item in section.segment_sequence:
-            if not self.is_playing:
-                break
-            
             segment_id = seq_item.get("segment_id")
             start_bar = seq_item.get("start_bar", current_bar)
             duration_bars = seq_item.get("duration_bars")
@@ -97,13 +90,6 @@ class SectionPlayer:
                 print(f"警告: Segment {segment_id} 未找到，跳过")
                 continue
             
-            # 等待到start_bar
-            wait_bars = start_bar - current_bar
-            if wait_bars > 0:
-                wait_time = wait_bars * bar_duration
-                time.sleep(wait_time)
-                current_bar = start_bar
-            
             # 合并参数
             merged_params = {
                 "bpm": bpm,
@@ -111,39 +97,103 @@ class SectionPlayer:
                 **segment_params
             }
             
-            # 播放Segment
-            track_name = self.segment_player.play_segment(
-                segment=segment,
-                track_id=track_id,
-                chapter_id=chapter_id,
-                section_id=section.id,
-                override_params=merged_params
-            )
-            self.active_track_names.append(track_name)
-            
             # 如果指定了duration，在结束时自动停止
+            stop_time = None
             if duration_bars:
-                stop_time = duration_bars * bar_duration
-                threading.Timer(
-                    stop_time,
-                    lambda tn=track_name: self.segment_player.stop_segment(tn)
-                ).start()
-                current_bar += duration_bars
+                stop_time = start_time + (start_bar + duration_bars) * bar_duration
+            
+            # 定位播放：已结束的跳过，正在播放的在定位点带相位启动
+            launch_bar = start_bar
+            offset_beats = 0.0
+            if offset_bars > start_bar:
+                if duration_bars and start_bar + duration_bars <= offset_bars:
+                    current_bar = start_bar + duration_bars
+                    continue
+                launch_bar = offset_bars
+                offset_beats = (offset_bars - start_bar) * 4
+            
+            groups.setdefault(launch_bar, []).append({
+                "segment": segment,
+                "track_id": track_id,
+                "chapter_id": chapter_id,
+                "section_id": section.id,
+                "override_params": merged_params,
+                "stop_time": stop_time,
+                "offset_beats": offset_beats
+            })
+            
+            if duration_bars:
+                current_bar = start_bar + duration_bars
             else:
                 # 使用segment自身的duration
-                segment_duration = segment.playback_params.duration_bars
-                current_bar += segment_duration
+                current_bar = start_bar + segment.playback_params.duration_bars
+        
+        for start_bar, requests in groups.items():
+            self.scheduler.schedule_at(
+                start_time + start_bar * bar_duration,
+                self._start_segments,
+                requests, start_time + start_bar * bar_duration, bpm, track_names,
+                tag=self._section_tag(section.id)
+            )
+        
+        return track_names
+    
+    def _on_section_start(self, section: Section, bpm: int, start_time: float,
+                          track_names: List[str]):
+        """Section起始事件"""
+        self.current_section = section
+        self.section_start_time = start_time
+        self.current_bpm = bpm
+        self.active_track_names = track_names
+        
+        print(f"\n开始播放Section: {section.name}")
+        print(f"类型: {section.section_type.value}")
+        print(f"时长: {section.duration_bars} bars")
     
-    def stop_section(self):
-        """停止当前Section播放"""
-        self.is_playing = False
+    def _start_segments(self, requests: List[Dict], at: float, bpm: int,
+                        track_names: List[str]):
+        """同一时刻的Segment启动事件"""
+        started = self.segment_player.play_segments_batch(requests, at=at)
+        track_names.extend(started)
+        
+        # 到期停止交给定时器轮，线程数量不随Segment数量增长
+        for track_name, request in zip(started, requests):
+            if request["stop_time"] is not None:
+                self.timer_wheel.add(
+                    track_name, request["stop_time"], bpm,
+                    self.segment_player.stop_segments_batch,
+                    section_id=request["section_id"]
+                )
+    
+    @staticmethod
+    def _section_tag(section_id: str) -> str:
+        """Section内调度事件的标签"""
+        return f"section:{section_id}"
+    
+    def stop_section(self, track_names: Optional[List[str]] = None,
+                     at: Optional[float] = None):
+        """
+        停止Section播放
+        
+        Args:
+            track_names: play_section返回的track列表，None表示当前Section
+            at: 停止时刻（单调时钟），None表示立即停止
+        """
+        if track_names is None:
+            track_names = self.active_track_names
+            if self.current_section:
+                self.scheduler.cancel_tag(self._section_tag(self.current_section.id))
+                self.timer_wheel.cancel_section(self.current_section.id)
         
-        # 停止所有活跃的segment
-        for track_name in self.active_track_names:
-            self.segment_player.stop_segment(track_name)
+        # 撤回尚未到期的自动停止，并在同一个Bundle中停止所有活跃的segment
+        for track_name in track_names:
+            self.timer_wheel.cancel_track(track_name)
+        if track_names:
+            self.segment_player.stop_segments_batch(list(track_names), at=at)
         
-        self.active_track_names.clear()
-        self.current_section = None
+        track_names.clear()
+        if track_names is self.active_track_names:
+            self.current_section = None
         print("Section播放已停止")
     
     def get_section_progress(self) -> Dict:
@@ -151,9 +201,8 @@ class SectionPlayer:
         if not self.current_section or not self.section_start_time:
             return {"progress": 0.0, "elapsed_bars": 0}
         
-        elapsed = time.time() - self.section_start_time
-        # 简化：假设120 BPM
-        elapsed_bars = elapsed / 2.0
+        elapsed = max(0.0, self.scheduler.now() - self.section_start_time)
+        elapsed_bars = elapsed / PlaybackScheduler.bar_duration(self.current_bpm or 120)
         progress = min(elapsed_bars / self.current_section.duration_bars, 1.0)
         
         return {
@@ -0,0 +1,192 @@
+"""
+Segment列式索引
+将Segment库的检索字段展开为NumPy列，多条件组合查询以向量化掩码完成
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from StandardSegment import SegmentCategory, SegmentSubType
+
+
+# 构建索引所需的元数据行：
+# (id, category, sub_type, energy, complexity, density, 标签元组, 适用Section元组)
+ColumnRow = Tuple[str, SegmentCategory, SegmentSubType, float, float, float,
+                  Tuple[str, ...], Tuple[str, ...]]
+
+
+class SegmentColumnIndex:
+    """
+    Segment列式索引（只读快照）
+    - 数值列：energy / complexity / density（float64）
+    - 枚举列：category / sub_type（整数编码）
+    - 集合列：标签、适用Section（按uint64分块的位图，每块一行、每列一个Segment）
+    行顺序与构建时传入的元数据行顺序一致，查询结果保持该顺序。
+    索引只保存Segment ID，不持有Segment对象（惰性库由调用方按ID解码）。
+    """
+
+    # 与SegmentLibrary.by_energy的分档保持一致
+    ENERGY_RANGES = {
+        "low": (None, 0.3),
+        "medium": (0.3, 0.7),
+        "high": (0.7, None)
+    }
+
+    def __init__(self, rows: Iterable[ColumnRow]):
+        """
+        构建索引
+
+        Args:
+            rows: 元数据行序列（见ColumnRow，通常为SegmentLibrary.column_rows.values()）
+        """
+        rows = list(rows)
+        self.ids: List[str] = [row[0] for row in rows]
+        n = len(rows)
+
+        self.energy = np.fromiter((row[3] for row in rows), dtype=np.float64, count=n)
+        self.complexity = np.fromiter((row[4] for row in rows), dtype=np.float64, count=n)
+        self.density = np.fromiter((row[5] for row in rows), dtype=np.float64, count=n)
+
+        # 枚举编码直接取枚举定义顺序，未出现的取值也有固定编码
+        self.category_codes: Dict[SegmentCategory, int] = {c: i for i, c in enumerate(SegmentCategory)}
+        self.subtype_codes: Dict[SegmentSubType, int] = {t: i for i, t in enumerate(SegmentSubType)}
+        self.category = np.fromiter((self.category_codes[row[1]] for row in rows),
+                                    dtype=np.int16, count=n)
+        self.subtype = np.fromiter((self.subtype_codes[row[2]] for row in rows),
+                                   dtype=np.int16, count=n)
+
+        # 标签与Section位图
+        self.tag_bits: Dict[str, int] = {}
+        self.section_bits: Dict[str, int] = {}
+        tag_rows = [self._encode(self.tag_bits, row[6]) for row in rows]
+        section_rows = [self._encode(self.section_bits, row[7]) for row in rows]
+        self.tags = self._to_bitmap(tag_rows, len(self.tag_bits))
+        self.sections = self._to_bitmap(section_rows, len(self.section_bits))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    # ==================== 构建 ====================
+
+    @staticmethod
+    def _encode(vocabulary: Dict[str, int], values: Iterable[str]) -> List[int]:
+        """将字符串集合编码为位序号（新值自动加入词表）"""
+        bits = []
+        for value in values:
+            bit = vocabulary.get(value)
+            if bit is None:
+                bit = vocabulary[value] = len(vocabulary)
+            bits.append(bit)
+        return bits
+
+    @staticmethod
+    def _to_bitmap(rows: List[List[int]], bit_count: int) -> np.ndarray:
+        """
+        位序号列表 -> (块数, Segment数) 的uint64位图
+        按块连续存放，查询时只需扫描包含查询位的那几块
+        """
+        words = max(1, (bit_count + 63) // 64)
+        packed = [[0] * len(rows) for _ in range(words)]
+        for row, bits in enumerate(rows):
+            for bit in bits:
+                packed[bit >> 6][row] |= 1 << (bit & 63)
+        return np.array(packed, dtype=np.uint64).reshape(words, len(rows))
+
+    # ==================== 查询 ====================
+
+    @staticmethod
+    def _query_words(vocabulary: Dict[str, int],
+                     values: Iterable[str]) -> Optional[Dict[int, np.uint64]]:
+        """将查询值编码为 {块序号: 位掩码}，包含未知值时返回None"""
+        words: Dict[int, int] = {}
+        for value in values:
+            bit = vocabulary.get(value)
+            if bit is None:
+                return None
+            words[bit >> 6] = words.get(bit >> 6, 0) | (1 << (bit & 63))
+        return {w: np.uint64(m) for w, m in words.items()}
+
+    def _match_any(self, vocabulary: Dict[str, int], bitmap: np.ndarray,
+                   values: List[str]) -> np.ndarray:
+        """位图中包含任一查询值的Segment"""
+        mask = np.zeros(len(self.ids), dtype=bool)
+        words = self._query_words(vocabulary, [v for v in values if v in vocabulary])
+        for w, bits in words.items():
+            mask |= (bitmap[w] & bits) != 0
+        return mask
+
+    def _match_all(self, vocabulary: Dict[str, int], bitmap: np.ndarray,
+                   values: List[str]) -> np.ndarray:
+        """位图中包含全部查询值的Segment"""
+        words = self._query_words(vocabulary, values)
+        if words is None:
+            return np.zeros(len(self.ids), dtype=bool)
+        mask = np.ones(len(self.ids), dtype=bool)
+        for w, bits in words.items():
+            mask &= (bitmap[w] & bits) == bits
+        return mask
+
+    def query_mask(self,
+                   category: Optional[SegmentCategory] = None,
+                   subtype: Optional[SegmentSubType] = None,
+                   section_type: Optional[str] = None,
+                   energy_range: Optional[str] = None,
+                   tags: Optional[List[str]] = None,
+                   match_all_tags: bool = False,
+                   min_energy: Optional[float] = None,
+                   max_energy: Optional[float] = None,
+                   min_complexity: Optional[float] = None,
+                   max_complexity: Optional[float] = None,
+                   min_density: Optional[float] = None,
+                   max_density: Optional[float] = None) -> np.ndarray:
+        """
+        多条件组合查询，返回布尔掩码（条件之间为AND）
+
+        Args:
+            category: 类别
+            subtype: 子类型
+            section_type: 适用Section
+            energy_range: "low" / "medium" / "high"
+            tags: 标签列表
+            match_all_tags: True=匹配所有标签, False=匹配任一标签
+            min_energy / max_energy: 能量闭区间
+            min_complexity / max_complexity: 复杂度闭区间
+            min_density / max_density: 密度闭区间
+        """
+        mask = np.ones(len(self.ids), dtype=bool)
+
+        if category is not None:
+            mask &= self.category == self.category_codes[category]
+
+        if subtype is not None:
+            mask &= self.subtype == self.subtype_codes[subtype]
+
+        if section_type:
+            mask &= self._match_any(self.section_bits, self.sections, [section_type])
+
+        if energy_range:
+            low, high = self.ENERGY_RANGES.get(energy_range, (None, None))
+            if low is not None:
+                mask &= self.energy >= low
+            if high is not None:
+                mask &= self.energy < high
+
+        for column, low, high in ((self.energy, min_energy, max_energy),
+                                  (self.complexity, min_complexity, max_complexity),
+                                  (self.density, min_density, max_density)):
+            if low is not None:
+                mask &= column >= low
+            if high is not None:
+                mask &= column <= high
+
+        if tags:
+            if match_all_tags:
+                mask &= self._match_all(self.tag_bits, self.tags, tags)
+            else:
+                mask &= self._match_any(self.tag_bits, self.tags, tags)
+
+        return mask
+
+    def query_ids(self, **criteria) -> List[str]:
+        """多条件组合查询，返回匹配的Segment ID（参数同query_mask）"""
+        ids = self.ids
+        return [ids[i] for i in np.flatnonzero(self.query_mask(**criteria))]
@@ -3,25 +3,62 @@ Segment素材库管理器
 负责加载、索引和检索Segment素材
 """
 
+import hashlib
 import json
+import os
+import pickle
 from pathlib import Path
 from typing import Dict, List, Optional, Set
 from collections import defaultdict
-from StandardSegment import StandardSegment, SegmentCategory, SegmentSubType
+from StandardSegment import StandardSegment, FrozenSegment, SegmentCategory, SegmentSubType
+from LazySegmentStore import LazySegmentStore
+
+try:
+    from SegmentColumnIndex import SegmentColumnIndex
+except ImportError:  # 未安装numpy时退回逐条过滤
+    SegmentColumnIndex = None
 
 
 class SegmentLibrary:
     """Segment素材库管理器"""
     
-    def __init__(self, segments_dir: str = "../segments"):
+    SEGMENT_FILES = [
+        "rhythm.json",
+        "melody.json", 
+        "harmony.json",
+        "bass.json",
+        "fx.json",
+        "atmosphere.json",
+        "texture.json"
+    ]
+    
+    # 编译缓存格式版本（StandardSegment或索引结构变化时递增）
+    CACHE_VERSION = 2
+    
+    def __init__(self, segments_dir: str = "../segments", use_cache: bool = True,
+                 lazy: bool = False, lru_size: int = 256, compact: bool = False):
         """
         初始化Segment库
         
         Args:
             segments_dir: segments目录路径
+            use_cache: 是否使用编译缓存（segments目录旁的 <目录名>.cache）
+            lazy: 惰性模式，只常驻偏移索引与检索索引，Segment在首次访问时解码
+            lru_size: 惰性模式下已解码Segment的LRU容量
+            compact: 以FrozenSegment（slots、只读、预压缩OSC参数）存储Segment
         """
         self.segments_dir = Path(segments_dir)
-        self.segments: Dict[str, StandardSegment] = {}
+        self.lazy = lazy
+        self.compact = compact
+        suffix = ".lazy.cache" if lazy else ".cache"
+        self.cache_path = self.segments_dir.with_name(self.segments_dir.name + suffix)
+        self.lru_size = lru_size
+        
+        # 惰性模式下为LazySegmentStore（Mapping接口，按需解码）
+        self.segments: Dict[str, StandardSegment] = (
+            LazySegmentStore(self.segments_dir, self._build_segment, capacity=lru_size)
+            if lazy else {}
+        )
         
         # 索引结构 - 修复：by_energy 使用 defaultdict(set) 而非 list
         self.by_category: Dict[SegmentCategory, List[str]] = defaultdict(list)
@@ -30,33 +67,133 @@ class SegmentLibrary:
         self.by_energy: Dict[str, Set[str]] = defaultdict(set)
         self.by_tags: Dict[str, Set[str]] = defaultdict(set)
         
-        # 加载所有segments
-        self._load_all_segments()
+        # 列式索引的元数据行（id -> 行，不含播放参数，惰性模式下也常驻）
+        self.column_rows: Dict[str, tuple] = {}
+        
+        # 列式索引（供search_advanced使用，首次查询时构建，新增Segment后失效）
+        self._column_index: Optional["SegmentColumnIndex"] = None
+        
+        # 加载所有segments（缓存有效时直接恢复快照）
+        if not (use_cache and self._load_cache()):
+            self._load_all_segments()
+            if use_cache:
+                self._write_cache()
         
         print(f"SegmentLibrary 初始化完成")
         print(f"加载 {len(self.segments)} 个Segments")
     
     def _load_all_segments(self):
         """从JSON文件加载所有segments"""
-        json_files = [
-            "rhythm.json",
-            "melody.json", 
-            "harmony.json",
-            "bass.json",
-            "fx.json",
-            "atmosphere.json",
-            "texture.json"
-        ]
-        
-        for filename in json_files:
+        for filename in self.SEGMENT_FILES:
             filepath = self.segments_dir / filename
             if filepath.exists():
                 self._load_segment_file(filepath)
             else:
                 print(f"警告: 未找到文件 {filepath}")
     
+    # ==================== 编译缓存 ====================
+    
+    def _source_stats(self) -> List[tuple]:
+        """源文件的 (文件名, 大小, mtime_ns)，不存在的文件记为None"""
+        stats = []
+        for filename in self.SEGMENT_FILES:
+            try:
+                st = (self.segments_dir / filename).stat()
+                stats.append((filename, st.st_size, st.st_mtime_ns))
+            except OSError:
+                stats.append((filename, None, None))
+        return stats
+    
+    def _source_digest(self) -> str:
+        """源文件内容哈希（mtime变化但内容未变时用于复核）"""
+        digest = hashlib.sha1()
+        for filename in self.SEGMENT_FILES:
+            filepath = self.segments_dir / filename
+            digest.update(filename.encode("utf-8"))
+            if filepath.exists():
+                digest.update(filepath.read_bytes())
+            else:
+                digest.update(b"\0missing")
+        return digest.hexdigest()
+    
+    def _load_cache(self) -> bool:
+        """
+        从编译缓存恢复segments与全部索引
+        
+        Returns:
+            缓存有效且加载成功返回True
+        """
+        if not self.cache_path.exists():
+            return False
+        
+        try:
+            with open(self.cache_path, 'rb') as f:
+                snapshot = pickle.load(f)
+        except Exception as e:
+            print(f"读取缓存失败 {self.cache_path}: {e}")
+            return False
+        
+        if (snapshot.get("version") != self.CACHE_VERSION
+                or snapshot.get("lazy") != self.lazy
+                or snapshot.get("compact") != self.compact):
+            return False
+        
+        stats = self._source_stats()
+        if snapshot.get("stats") != stats:
+            # mtime/大小变化：内容哈希一致则仍可复用，并刷新记录的stat
+            if snapshot.get("digest") != self._source_digest():
+                print("Segment源文件已变化，重新编译缓存")
+                return False
+            snapshot["stats"] = stats
+            self._dump_cache(snapshot)
+        
+        if self.lazy:
+            self.segments = LazySegmentStore(
+                self.segments_dir, self._build_segment, snapshot["offsets"], self.lru_size
+            )
+        else:
+            self.segments = snapshot["segments"]
+        for name in ("by_category", "by_subtype", "by_section", "by_energy", "by_tags"):
+            getattr(self, name).update(snapshot[name])
+        self.column_rows = snapshot["column_rows"]
+        
+        print(f"从缓存加载: {self.cache_path}")
+        return True
+    
+    def _write_cache(self):
+        """将当前segments与索引写入编译缓存"""
+        self._dump_cache({
+            "version": self.CACHE_VERSION,
+            "lazy": self.lazy,
+            "compact": self.compact,
+            "stats": self._source_stats(),
+            "digest": self._source_digest(),
+            "segments": None if self.lazy else self.segments,
+            "offsets": self.segments.offsets if self.lazy else None,
+            "by_category": dict(self.by_category),
+            "by_subtype": dict(self.by_subtype),
+            "by_section": dict(self.by_section),
+            "by_energy": dict(self.by_energy),
+            "by_tags": dict(self.by_tags),
+            "column_rows": self.column_rows
+        })
+    
+    def _dump_cache(self, snapshot: dict):
+        """原子写入缓存文件（先写临时文件再替换）"""
+        tmp_path = self.cache_path.with_name(self.cache_path.name + ".tmp")
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.cache_path)
+        except Exception as e:
+            print(f"写入缓存失败 {self.cache_path}: {e}")
+    
     def _load_segment_file(self, filepath: Path):
         """加载单个JSON文件"""
+        if self.lazy:
+            self._scan_segment_file(filepath)
+            return
+        
         try:
             with open(filepath, 'r', encoding='utf-8') as f:
                 data = json.load(f)
@@ -72,31 +209,55 @@ class SegmentLibrary:
         except Exception as e:
             print(f"加载文件失败 {filepath}: {e}")
     
+    def _scan_segment_file(self, filepath: Path):
+        """惰性模式：记录每个Segment的字节区间并建立检索索引，不保留解码结果"""
+        try:
+            raw = filepath.read_bytes()
+            ranges = LazySegmentStore.scan_objects(raw)
+            
+            print(f"索引 {filepath.name}: {len(ranges)} 个segments")
+            
+            for start, end in ranges:
+                try:
+                    segment = self._build_segment(json.loads(raw[start:end]))
+                except Exception as e:
+                    print(f"加载Segment失败 {filepath.name}@{start}: {e}")
+                    continue
+                self.segments.add(segment.id, filepath.name, start, end)
+                self._index_segment(segment)
+                
+        except Exception as e:
+            print(f"加载文件失败 {filepath}: {e}")
+    
+    def _build_segment(self, data: dict) -> StandardSegment:
+        """将segments JSON中的原始字典转换为StandardSegment（compact模式下为FrozenSegment）"""
+        segment_dict = {
+            "id": data["id"],
+            "name": data["name"],
+            "category": data["category"],
+            "sub_type": data["sub_type"],
+            "playback_params": data.get("playback_params", {}),
+            "metadata": {
+                "source_file": f"{data['category']}.json",
+                "energy_level": data.get("metadata", {}).get("energy_level", 0.5),
+                "complexity": data.get("metadata", {}).get("complexity", 0.5),
+                "density": data.get("metadata", {}).get("density", 0.5),
+                "suitable_sections": data.get("metadata", {}).get("suitable_sections", []),
+                "suitable_moods": data.get("metadata", {}).get("suitable_moods", []),
+                "element_tags": data.get("metadata", {}).get("element_tags", []),
+                "style_tags": data.get("metadata", {}).get("style_tags", []),
+                "mood_tags": data.get("metadata", {}).get("mood_tags", []),
+                "description": data.get("metadata", {}).get("description", ""),
+            }
+        }
+        segment = StandardSegment.from_dict(segment_dict)
+        return segment.to_frozen() if self.compact else segment
+    
     def _load_segment_from_dict(self, data: dict):
         """从字典创建并索引Segment"""
         try:
             # 转换为StandardSegment格式
-            segment_dict = {
-                "id": data["id"],
-                "name": data["name"],
-                "category": data["category"],
-                "sub_type": data["sub_type"],
-                "playback_params": data.get("playback_params", {}),
-                "metadata": {
-                    "source_file": f"{data['category']}.json",
-                    "energy_level": data.get("metadata", {}).get("energy_level", 0.5),
-                    "complexity": data.get("metadata", {}).get("complexity", 0.5),
-                    "density": data.get("metadata", {}).get("density", 0.5),
-                    "suitable_sections": data.get("metadata", {}).get("suitable_sections", []),
-                    "suitable_moods": data.get("metadata", {}).get("suitable_moods", []),
-                    "element_tags": data.get("metadata", {}).get("element_tags", []),
-                    "style_tags": data.get("metadata", {}).get("style_tags", []),
-                    "mood_tags": data.get("metadata", {}).get("mood_tags", []),
-                    "description": data.get("metadata", {}).get("description", ""),
-                }
-            }
-            
-            segment = StandardSegment.from_dict(segment_dict)
+            segment = self._build_segment(data)
             
             # 存储segment
             self.segments[segment.id] = segment
@@ -110,6 +271,7 @@ class SegmentLibrary:
     def _index_segment(self, segment: StandardSegment):
         """为Segment建立多维度索引"""
         seg_id = segment.id
+        self._column_index = None
         
         # 按类别索引
         self.by_category[segment.category].append(seg_id)
@@ -136,6 +298,13 @@ class SegmentLibrary:
                    segment.metadata.mood_tags)
         for tag in all_tags:
             self.by_tags[tag].add(seg_id)
+        
+        # 列式索引的元数据行
+        self.column_rows[seg_id] = (
+            seg_id, segment.category, segment.sub_type,
+            segment.metadata.energy_level, segment.metadata.complexity, segment.metadata.density,
+            tuple(all_tags), tuple(segment.metadata.suitable_sections)
+        )
     
     def get_segment(self, segment_id: str) -> Optional[StandardSegment]:
         """根据ID获取Segment"""
@@ -204,10 +373,49 @@ class SegmentLibrary:
                        energy_range: Optional[str] = None,
                        tags: Optional[List[str]] = None,
                        min_energy: Optional[float] = None,
-                       max_energy: Optional[float] = None) -> List[StandardSegment]:
+                       max_energy: Optional[float] = None,
+                       match_all_tags: bool = False,
+                       min_complexity: Optional[float] = None,
+                       max_complexity: Optional[float] = None,
+                       min_density: Optional[float] = None,
+                       max_density: Optional[float] = None) -> List[StandardSegment]:
         """
-        高级搜索 - 多条件组合
+        高级搜索 - 多条件组合（条件之间为AND，结果保持加载顺序）
+        
+        Args:
+            energy_range: "low", "medium", "high"（与by_energy分档一致）
+            tags: 标签列表
+            match_all_tags: True=匹配所有标签, False=匹配任一标签
+            min_*/max_*: energy / complexity / density 的闭区间
         """
+        criteria = dict(
+            category=category, subtype=subtype, section_type=section_type,
+            energy_range=energy_range, tags=tags, match_all_tags=match_all_tags,
+            min_energy=min_energy, max_energy=max_energy,
+            min_complexity=min_complexity, max_complexity=max_complexity,
+            min_density=min_density, max_density=max_density
+        )
+        
+        index = self.get_column_index()
+        if index is not None:
+            # 索引只返回ID，惰性模式下只解码命中的Segment
+            return [self.segments[sid] for sid in index.query_ids(**criteria)]
+        return self._search_advanced_scan(**criteria)
+    
+    def get_column_index(self) -> Optional["SegmentColumnIndex"]:
+        """获取列式索引（按需构建；未安装numpy时返回None）"""
+        if SegmentColumnIndex is None:
+            return None
+        if self._column_index is None:
+            self._column_index = SegmentColumnIndex(self.column_rows.values())
+        return self._column_index
+    
+    def _search_advanced_scan(self, category=None, subtype=None, section_type=None,
+                              energy_range=None, tags=None, match_all_tags=False,
+                              min_energy=None, max_energy=None,
+                              min_complexity=None, max_complexity=None,
+                              min_density=None, max_density=None) -> List[StandardSegment]:
+        """逐条过滤的高级搜索（无numpy时的后备实现）"""
         candidates = list(self.segments.values())
         
         # 按类别过滤
@@ -223,22 +431,28 @@ class SegmentLibrary:
             candidates = [s for s in candidates 
                          if section_type in s.metadata.suitable_sections]
         
-        # 按能量等级过滤
-        if min_energy is not None:
-            candidates = [s for s in candidates 
-                         if s.metadata.energy_level >= min_energy]
+        # 按能量分档过滤
+        if energy_range:
+            level_ids = self.by_energy.get(energy_range, set())
+            candidates = [s for s in candidates if s.id in level_ids]
         
-        if max_energy is not None:
-            candidates = [s for s in candidates 
-                         if s.metadata.energy_level <= max_energy]
+        # 按数值区间过滤
+        for attr, low, high in (("energy_level", min_energy, max_energy),
+                                ("complexity", min_complexity, max_complexity),
+                                ("density", min_density, max_density)):
+            if low is not None:
+                candidates = [s for s in candidates if getattr(s.metadata, attr) >= low]
+            if high is not None:
+                candidates = [s for s in candidates if getattr(s.metadata, attr) <= high]
         
-        # 按标签过滤
+        # 按标签过滤（复用by_tags倒排索引，不再逐条拼接标签列表）
         if tags:
-            candidates = [s for s in candidates 
-                         if any(tag in (s.metadata.element_tags + 
-                                       s.metadata.style_tags + 
-                                       s.metadata.mood_tags) 
-                               for tag in tags)]
+            tag_sets = [self.by_tags.get(tag, set()) for tag in tags]
+            if match_all_tags:
+                matched = set.intersection(*tag_sets)
+            else:
+                matched = set().union(*tag_sets)
+            candidates = [s for s in candidates if s.id in matched]
         
         return candidates
     
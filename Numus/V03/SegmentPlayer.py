@@ -3,11 +3,21 @@ Segment播放器（V03修正版）
 将StandardSegment的参数解析为OSC命令发送到Sonic Pi
 """
 
-from pythonosc import udp_client
-from typing import Optional, Dict, Any
+from pythonosc import udp_client, osc_bundle_builder, osc_message_builder
+from typing import Optional, Dict, Any, List, Tuple
+from collections import OrderedDict
 import json
+import sys
 import time
-from StandardSegment import StandardSegment, SegmentSubType
+from pathlib import Path
+from StandardSegment import (StandardSegment, SegmentSubType, OSC_PARAM_NAMES,
+                             compress_osc_value, compress_osc_params)
+
+try:
+    from osc_output import OscOutput
+except ImportError:  # 未设置 PYTHONPATH=Numus 时回退（V03 中只在此处定位共用输出层）
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+    from osc_output import OscOutput
 
 
 class SegmentPlayer:
@@ -36,18 +46,37 @@ class SegmentPlayer:
         SegmentSubType.SYNTH_TEXTURE: "tex"
     }
     
-    def __init__(self, osc_ip: str = "127.0.0.1", osc_port: int = 4560):
+    # 自动化曲线（与sonic_universal_player.rb中rmp的插值保持一致）
+    RAMP_CURVES = {
+        "linear": lambda x: x,
+        "exp": lambda x: x * x,
+        "log": lambda x: x ** 0.5,
+        "scurve": lambda x: x * x * (3 - 2 * x)
+    }
+    
+    def __init__(self, osc_ip: str = "127.0.0.1", osc_port: int = 4560, client=None,
+                 payload_cache_size: int = 1024, output: Optional[OscOutput] = None):
         """
         初始化Segment播放器
         
         Args:
             osc_ip: Sonic Pi OSC服务器地址
             osc_port: Sonic Pi OSC端口（默认4560）
+            client: 自定义OSC客户端（需提供send_message），None则使用SimpleUDPClient
+            payload_cache_size: play参数负载缓存容量（0表示不缓存）
+            output: OSC输出层（set参数去重），None则基于client创建
         """
-        self.client = udp_client.SimpleUDPClient(osc_ip, osc_port)
+        self.client = client or udp_client.SimpleUDPClient(osc_ip, osc_port)
+        self.output = output or OscOutput(self.client)
         self.active_segments: Dict[str, Dict] = {}
         self.track_counter = 0
         
+        # (segment_id, 覆盖参数键) -> (压缩参数, 序列化后的JSON)
+        self.payload_cache_size = payload_cache_size
+        self._payload_cache: "OrderedDict[tuple, Tuple[Dict, str]]" = OrderedDict()
+        self.payload_hits = 0
+        self.payload_misses = 0
+        
         print(f"SegmentPlayer初始化: {osc_ip}:{osc_port}")
     
     def play_segment(self, 
@@ -69,11 +98,114 @@ class SegmentPlayer:
         Returns:
             生成的唯一track_name
         """
+        track_name, osc_message = self._prepare_play(
+            segment, track_id, chapter_id, section_id, override_params
+        )
+        
+        # 发送到Sonic Pi
+        self._send_osc_message(osc_message)
+        
+        print(f"播放Segment: {segment.name} -> {track_name}")
+        return track_name
+    
+    def play_segments_batch(self,
+                            requests: List[Dict[str, Any]],
+                            at: Optional[float] = None,
+                            stops: Optional[List[str]] = None,
+                            sets: Optional[List[Tuple[str, str, Any]]] = None) -> List[str]:
+        """
+        在同一时刻批量启动/停止/调整多个Segment，合并为一个带时间戳的OSC Bundle
+        
+        Args:
+            requests: 启动请求列表，每项包含 segment, track_id, chapter_id,
+                      section_id, override_params（可选）, offset_beats（可选，定位播放时的进入相位）
+            at: 目标时刻（time.monotonic秒），None表示立即执行
+            stops: 同一时刻需要停止的track名称
+            sets: 同一时刻的参数调整 [(track_name, param_name, value), ...]
+        
+        Returns:
+            按requests顺序生成的track名称列表
+        """
+        messages = []
+        
+        # 先停止再启动，避免同一时刻新旧层叠加
+        for track_name in stops or []:
+            messages.append(self._prepare_stop(track_name))
+        
+        track_names = []
+        for request in requests:
+            track_name, osc_message = self._prepare_play(
+                request["segment"],
+                request["track_id"],
+                request["chapter_id"],
+                request["section_id"],
+                request.get("override_params"),
+                request.get("offset_beats", 0.0)
+            )
+            track_names.append(track_name)
+            messages.append(osc_message)
+        
+        for track_name, param_name, value in sets or []:
+            message = self._prepare_set(track_name, param_name, value)
+            # Bundle中的set不经去重，但要同步输出层缓存
+            self.output.note_state("/numus/cmd", message, key=("set", track_name, message[2]))
+            messages.append(message)
+        
+        if messages:
+            self._send_osc_bundle(messages, at)
+            print(f"批量发送: {len(track_names)} play / {len(stops or [])} stop / "
+                  f"{len(sets or [])} set")
+        return track_names
+    
+    def stop_segments_batch(self, track_names: List[str], at: Optional[float] = None):
+        """在同一时刻停止多个Segment（单个OSC Bundle）"""
+        self.play_segments_batch([], at=at, stops=track_names)
+    
+    def set_segments_batch(self, sets: List[Tuple[str, str, Any]], at: Optional[float] = None):
+        """在同一时刻调整多个Segment参数（单个OSC Bundle）"""
+        self.play_segments_batch([], at=at, sets=sets)
+    
+    def ramp_segments_batch(self,
+                            ramps: List[Tuple[str, str, float, float]],
+                            duration_bars: float,
+                            bpm: float,
+                            curve: str = "linear",
+                            at: Optional[float] = None):
+        """
+        参数自动化：每条ramp只发送一次，由Sonic Pi端按1/16音符插值
+        
+        Args:
+            ramps: [(track_name, param_name, start_value, end_value), ...]
+            duration_bars: 渐变时长（小节数）
+            bpm: 渐变使用的BPM（Sonic Pi端据此换算小节）
+            curve: 插值曲线（linear / exp / log / scurve）
+            at: 起始时刻（time.monotonic秒），None表示立即开始
+        """
+        if curve not in self.RAMP_CURVES:
+            print(f"警告: 未知自动化曲线 {curve}, 使用linear")
+            curve = "linear"
+        
+        messages = [
+            self._prepare_ramp(track_name, param_name, start_value, end_value,
+                               duration_bars, bpm, curve)
+            for track_name, param_name, start_value, end_value in ramps
+        ]
+        if messages:
+            self._send_osc_bundle(messages, at)
+            print(f"自动化: {len(messages)} ramp / {duration_bars} bars ({curve})")
+    
+    def _prepare_play(self, segment: StandardSegment, track_id: str, chapter_id: str,
+                      section_id: str, override_params: Optional[Dict[str, Any]],
+                      offset_beats: float = 0.0) -> Tuple[str, list]:
+        """
+        生成play消息并登记活跃segment，返回 (track_name, OSC参数列表)
+        offset_beats > 0 时附加进入相位，播放端从pattern的该拍处开始
+        """
         # 生成唯一的track名称
         track_name = self._generate_track_name(track_id, chapter_id, section_id, segment.id)
         
-        # 合并参数并压缩
-        final_params = self._merge_and_compress_parameters(segment, override_params)
+        # 合并参数并压缩（相同segment与覆盖参数复用已序列化的负载）
+        final_params, payload = self._compile_payload(segment, override_params)
         
         # 获取Sonic Pi播放类型
         play_type = self.TYPE_MAPPING.get(segment.sub_type, "tex")
@@ -83,35 +215,74 @@ class SegmentPlayer:
             "play",
             track_name,
             play_type,
-            json.dumps(final_params, ensure_ascii=False)
+            payload
         ]
+        if offset_beats > 0:
+            osc_message.append(float(offset_beats))
         
-        # 发送到Sonic Pi
-        self._send_osc_message(osc_message)
-        
-        # 记录活跃segment
+        # 记录活跃segment（参数会被set/ramp修改，不能与缓存共享）
         self.active_segments[track_name] = {
             "segment_id": segment.id,
             "segment_type": segment.sub_type.value,
             "start_time": time.time(),
-            "params": final_params
+            "params": dict(final_params)
         }
-        
-        print(f"播放Segment: {segment.name} -> {track_name}")
-        return track_name
+        return track_name, osc_message
     
-    def stop_segment(self, track_name: str):
-        """停止指定的Segment"""
-        self.client.send_message("/numus/cmd", ["stop", track_name])
-        
+    def _prepare_stop(self, track_name: str) -> list:
+        """生成stop消息并注销活跃segment"""
         if track_name in self.active_segments:
             print(f"停止Segment: {track_name}")
             del self.active_segments[track_name]
+        self.output.reset(("set", track_name))
+        return ["stop", track_name]
+    
+    def _prepare_set(self, track_name: str, param_name: str, value: Any) -> list:
+        """生成set消息并更新本地记录"""
+        # 压缩参数名
+        compressed_name = self._compress_param_name(param_name)
+        
+        # 更新本地记录
+        if track_name in self.active_segments:
+            self.active_segments[track_name]["params"][compressed_name] = value
+        
+        return [
+            "set",
+            track_name,
+            compressed_name,
+            float(value) if isinstance(value, (int, float)) else str(value)
+        ]
+    
+    def _prepare_ramp(self, track_name: str, param_name: str, start_value: float,
+                      end_value: float, duration_bars: float, bpm: float, curve: str) -> list:
+        """生成ramp消息，本地记录直接更新为终点值"""
+        compressed_name = self._compress_param_name(param_name)
+        
+        if track_name in self.active_segments:
+            self.active_segments[track_name]["params"][compressed_name] = end_value
+        # 渐变期间实际值未知，清除该参数的去重缓存
+        self.output.reset(("set", track_name, compressed_name))
+        
+        return [
+            "ramp",
+            track_name,
+            compressed_name,
+            float(start_value),
+            float(end_value),
+            float(duration_bars),
+            curve,
+            float(bpm)
+        ]
+    
+    def stop_segment(self, track_name: str):
+        """停止指定的Segment"""
+        self.client.send_message("/numus/cmd", self._prepare_stop(track_name))
     
     def stop_all_segments(self):
         """停止所有Segment"""
         self.client.send_message("/numus/cmd", ["stop_all"])
         self.active_segments.clear()
+        self.output.reset()
         print("停止所有Segment")
     
     def set_segment_param(self, track_name: str, param_name: str, value: Any):
@@ -123,19 +294,9 @@ class SegmentPlayer:
             param_name: 参数名（vol, cut, amp等，使用压缩名称）
             value: 新值
         """
-        # 压缩参数名
-        compressed_name = self._compress_param_name(param_name)
-        
-        self.client.send_message("/numus/cmd", [
-            "set",
-            track_name,
-            compressed_name,
-            float(value) if isinstance(value, (int, float)) else str(value)
-        ])
-        
-        # 更新本地记录
-        if track_name in self.active_segments:
-            self.active_segments[track_name]["params"][compressed_name] = value
+        message = self._prepare_set(track_name, param_name, value)
+        # 同一track参数的同值设置不重发（stop/ramp会清除对应缓存）
+        self.output.send_state("/numus/cmd", message, key=("set", track_name, message[2]))
     
     def crossfade_segments(self, from_track: str, to_track: str, duration_bars: int):
         """
@@ -170,6 +331,51 @@ class SegmentPlayer:
         return (f"t{clean(track_id)}_c{clean(chapter_id)}_"
                 f"s{clean(section_id)}_{clean(segment_id)}_{self.track_counter}")
     
+    def _compile_payload(self, segment: StandardSegment,
+                         override_params: Optional[Dict]) -> Tuple[Dict, str]:
+        """
+        获取play消息的参数负载
+        
+        Returns:
+            (压缩后的参数字典, JSON字符串)，两者均来自缓存时只读
+        """
+        if self.payload_cache_size <= 0:
+            final_params = self._merge_and_compress_parameters(segment, override_params)
+            return final_params, json.dumps(final_params, ensure_ascii=False)
+        
+        key = (segment.id, self._override_key(override_params or None))
+        entry = self._payload_cache.get(key)
+        if entry is not None:
+            self._payload_cache.move_to_end(key)
+            self.payload_hits += 1
+            return entry
+        
+        final_params = self._merge_and_compress_parameters(segment, override_params)
+        entry = (final_params, json.dumps(final_params, ensure_ascii=False))
+        self._payload_cache[key] = entry
+        if len(self._payload_cache) > self.payload_cache_size:
+            self._payload_cache.popitem(last=False)
+        self.payload_misses += 1
+        return entry
+    
+    @classmethod
+    def _override_key(cls, value: Any) -> Any:
+        """
+        将覆盖参数转换为可哈希的缓存键（与键顺序无关）
+        容器（含空容器）转为带类型标记的元组，标量附带类型名，避免 1 / 1.0 / True 共用同一负载
+        """
+        if value is None:
+            return None
+        if isinstance(value, dict):
+            return ("dict",) + tuple(sorted((k, cls._override_key(v)) for k, v in value.items()))
+        if isinstance(value, (list, tuple)):
+            return (type(value).__name__,) + tuple(cls._override_key(v) for v in value)
+        return (type(value).__name__, value)
+    
+    def clear_payload_cache(self):
+        """清空参数负载缓存（Segment参数被修改后调用）"""
+        self._payload_cache.clear()
+    
     def _merge_and_compress_parameters(self, segment: StandardSegment, 
                                        override_params: Optional[Dict]) -> Dict:
         """
@@ -185,42 +391,25 @@ class SegmentPlayer:
         cutoff -> cut (Sonic Pi端会映射到cutoff)
         ...
         """
+        # FrozenSegment已预先压缩，只需叠加覆盖参数
+        precompiled = getattr(segment, "osc_params", None)
+        if precompiled is not None:
+            compressed = dict(precompiled)
+            if override_params:
+                compressed.update(compress_osc_params(override_params))
+            return compressed
+        
         base_params = segment.playback_params.to_dict()
         
         if override_params:
             base_params.update(override_params)
         
         # 压缩参数名
-        compressed = {}
-        for key, value in base_params.items():
-            compressed_key = self._compress_param_name(key)
-            compressed_value = self._compress_value(value)
-            compressed[compressed_key] = compressed_value
-        
-        return compressed
+        return compress_osc_params(base_params)
     
     def _compress_param_name(self, name: str) -> str:
         """压缩参数名"""
-        mapping = {
-            "duration_bars": "db",
-            "pattern": "pt",
-            "synth": "syn",
-            "notes": "ns",
-            "chords": "chs",
-            "attack": "atk",
-            "release": "rel",
-            "sustain": "sus",
-            "reverb": "rev",
-            "root_note": "rn",
-            "note_duration": "nd",
-            "speed": "spd",
-            "cutoff": "cut",
-            "volume": "vol",
-            "res": "res",
-            "bpm": "bpm",
-            "amp": "amp"
-        }
-        return mapping.get(name, name)
+        return OSC_PARAM_NAMES.get(name, name)
     
     def _compress_value(self, value: Any) -> Any:
         """
@@ -228,12 +417,7 @@ class SegmentPlayer:
         
         例如: ":bd_haus" -> "bd_haus"
         """
-        if isinstance(value, str) and value.startswith(":"):
-            return value[1:]  # 移除冒号
-        elif isinstance(value, list):
-            # 递归处理列表
-            return [self._compress_value(v) for v in value]
-        return value
+        return compress_osc_value(value)
     
     def _send_osc_message(self, message: list):
         """发送OSC消息到Sonic Pi"""
@@ -242,6 +426,32 @@ class SegmentPlayer:
         except Exception as e:
             print(f"OSC发送错误: {e}")
     
+    def _send_osc_bundle(self, messages: List[list], at: Optional[float] = None):
+        """
+        将多条命令打包为一个OSC Bundle发送（一次系统调用，Sonic Pi端按时间戳同时执行）
+        
+        Args:
+            messages: 命令参数列表
+            at: 目标时刻（time.monotonic秒），None表示立即执行
+        """
+        if at is None:
+            timetag = osc_bundle_builder.IMMEDIATELY
+        else:
+            # OSC时间戳基于墙上时钟，将单调时钟时刻平移过去
+            timetag = time.time() + (at - time.monotonic())
+        
+        bundle = osc_bundle_builder.OscBundleBuilder(timetag)
+        for message in messages:
+            builder = osc_message_builder.OscMessageBuilder(address="/numus/cmd")
+            for arg in message:
+                builder.add_arg(arg)
+            bundle.add_content(builder.build())
+        
+        try:
+            self.client.send(bundle.build())
+        except Exception as e:
+            print(f"OSC发送错误: {e}")
+    
     def get_active_segments_info(self) -> Dict:
         """获取当前活跃segment信息"""
         return {
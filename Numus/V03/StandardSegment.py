@@ -3,10 +3,11 @@ Segment素材标准结构定义（V03修正版）
 定义纯参数化的Segment结构，不包含Sonic Pi代码
 """
 
-from dataclasses import dataclass, field
-from typing import List, Dict, Optional, Any
+from dataclasses import dataclass, field, fields
+from typing import List, Dict, Optional, Any, Tuple
 from enum import Enum
 import json
+import sys
 
 
 class SegmentCategory(Enum):
@@ -56,6 +57,63 @@ class SegmentSubType(Enum):
     FIELD_RECORDING = "field_recording"
 
 
+# OSC参数名压缩映射（与sonic_universal_player.rb的参数名约定一致）
+OSC_PARAM_NAMES = {
+    "duration_bars": "db",
+    "pattern": "pt",
+    "synth": "syn",
+    "notes": "ns",
+    "chords": "chs",
+    "attack": "atk",
+    "release": "rel",
+    "sustain": "sus",
+    "reverb": "rev",
+    "root_note": "rn",
+    "note_duration": "nd",
+    "speed": "spd",
+    "cutoff": "cut",
+    "volume": "vol",
+    "res": "res",
+    "bpm": "bpm",
+    "amp": "amp"
+}
+
+
+def compress_osc_value(value: Any) -> Any:
+    """
+    压缩值（移除Sonic Pi符号的冒号前缀）
+    
+    例如: ":bd_haus" -> "bd_haus"
+    """
+    if isinstance(value, str) and value.startswith(":"):
+        return value[1:]  # 移除冒号
+    elif isinstance(value, (list, tuple)):
+        # 递归处理列表
+        return [compress_osc_value(v) for v in value]
+    return value
+
+
+def compress_osc_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    """将完整参数名字典压缩为Sonic Pi期望的简短格式"""
+    return {OSC_PARAM_NAMES.get(k, k): compress_osc_value(v) for k, v in params.items()}
+
+
+def _freeze(value: Any) -> Any:
+    """列表递归转为元组，字符串驻留"""
+    if isinstance(value, str):
+        return sys.intern(value)
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _thaw(value: Any) -> Any:
+    """元组递归转回列表（to_dict输出与可变版本一致）"""
+    if isinstance(value, tuple):
+        return [_thaw(v) for v in value]
+    return value
+
+
 @dataclass
 class PlaybackParameters:
     """
@@ -204,6 +262,10 @@ class StandardSegment:
             metadata=SegmentMetadata.from_dict(data["metadata"])
         )
     
+    def to_frozen(self) -> 'FrozenSegment':
+        """转换为紧凑的只读版本"""
+        return FrozenSegment.from_segment(self)
+    
     def save_to_file(self, filepath: str):
         """保存为JSON文件"""
         with open(filepath, 'w', encoding='utf-8') as f:
@@ -217,6 +279,130 @@ class StandardSegment:
         return cls.from_dict(data)
 
 
+# ==================== 紧凑只读版本 ====================
+
+@dataclass(frozen=True, slots=True)
+class FrozenPlaybackParameters:
+    """
+    PlaybackParameters的只读紧凑版本
+    字段与PlaybackParameters一致；列表存为元组，字符串驻留，实例不带__dict__
+    """
+    duration_bars: int = 4
+    bpm: Optional[int] = None
+    notes: Optional[Tuple[str, ...]] = None
+    scale: Optional[str] = None
+    root_note: Optional[str] = None
+    pattern: Optional[Tuple[int, ...]] = None
+    subdivisions: Optional[int] = None
+    swing: Optional[float] = None
+    synth: Optional[str] = None
+    sample: Optional[str] = None
+    amp: Optional[float] = 1.0
+    amp_range: Optional[tuple] = None
+    velocity_curve: Optional[str] = None
+    attack: Optional[float] = None
+    decay: Optional[float] = None
+    sustain: Optional[float] = None
+    release: Optional[float] = None
+    cutoff: Optional[int] = None
+    cutoff_min: Optional[int] = None
+    cutoff_max: Optional[int] = None
+    res: Optional[float] = None
+    reverb: Optional[float] = None
+    echo: Optional[float] = None
+    distortion: Optional[float] = None
+    pan: Optional[float] = None
+    detune: Optional[float] = None
+    wobble_rate: Optional[float] = None
+    filter_automation: Optional[str] = None
+    volume_automation: Optional[str] = None
+    
+    def to_dict(self) -> dict:
+        """转换为字典，过滤None值（元组还原为列表）"""
+        return {f.name: _thaw(getattr(self, f.name)) for f in fields(self)
+                if getattr(self, f.name) is not None}
+    
+    @classmethod
+    def from_params(cls, params: PlaybackParameters) -> 'FrozenPlaybackParameters':
+        """从可变版本创建"""
+        return cls(**{k: _freeze(v) for k, v in params.__dict__.items()})
+
+
+@dataclass(frozen=True, slots=True)
+class FrozenSegmentMetadata:
+    """SegmentMetadata的只读紧凑版本（五组标签存为驻留字符串元组）"""
+    source_file: str
+    author: Optional[str] = None
+    creation_date: Optional[str] = None
+    version: str = "1.0"
+    description: Optional[str] = None
+    suitable_sections: Tuple[str, ...] = ()
+    suitable_moods: Tuple[str, ...] = ()
+    energy_level: float = 0.5
+    complexity: float = 0.5
+    density: float = 0.5
+    element_tags: Tuple[str, ...] = ()
+    style_tags: Tuple[str, ...] = ()
+    mood_tags: Tuple[str, ...] = ()
+    
+    def to_dict(self) -> dict:
+        return {f.name: _thaw(getattr(self, f.name)) for f in fields(self)}
+    
+    @classmethod
+    def from_metadata(cls, metadata: SegmentMetadata) -> 'FrozenSegmentMetadata':
+        """从可变版本创建"""
+        return cls(**{k: _freeze(v) for k, v in metadata.to_dict().items()})
+
+
+@dataclass(frozen=True, slots=True)
+class FrozenSegment:
+    """
+    StandardSegment的只读紧凑版本
+    osc_params为预先压缩好的OSC参数字典，播放时直接复用（只读，勿修改）
+    """
+    id: str
+    name: str
+    category: SegmentCategory
+    sub_type: SegmentSubType
+    playback_params: FrozenPlaybackParameters
+    metadata: FrozenSegmentMetadata
+    osc_params: Dict[str, Any] = field(default=None, compare=False, repr=False)
+    
+    def __post_init__(self):
+        if self.osc_params is None:
+            object.__setattr__(self, "osc_params",
+                               compress_osc_params(self.playback_params.to_dict()))
+    
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "category": self.category.value,
+            "sub_type": self.sub_type.value,
+            "playback_params": self.playback_params.to_dict(),
+            "metadata": self.metadata.to_dict()
+        }
+    
+    def to_standard(self) -> StandardSegment:
+        """还原为可变的StandardSegment"""
+        return StandardSegment.from_dict(self.to_dict())
+    
+    @classmethod
+    def from_segment(cls, segment: StandardSegment) -> 'FrozenSegment':
+        return cls(
+            id=sys.intern(segment.id),
+            name=segment.name,
+            category=segment.category,
+            sub_type=segment.sub_type,
+            playback_params=FrozenPlaybackParameters.from_params(segment.playback_params),
+            metadata=FrozenSegmentMetadata.from_metadata(segment.metadata)
+        )
+    
+    @classmethod
+    def from_dict(cls, data: dict) -> 'FrozenSegment':
+        return cls.from_segment(StandardSegment.from_dict(data))
+
+
 # ==================== Segment示例 ====================
 
 def create_example_kick_pattern() -> StandardSegment:
@@ -0,0 +1,154 @@
+"""
+定时器轮
+按小节量化的槽位管理Segment到期停止，替代每个Segment一个threading.Timer
+"""
+
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from PlaybackScheduler import PlaybackScheduler, ScheduledEvent
+
+
+@dataclass
+class TimerEntry:
+    """单个定时项"""
+    track_name: str
+    section_id: Optional[str]
+    callback: Callable[[List[str], float], None]
+    slot_key: Tuple[float, int]
+
+
+@dataclass
+class TimerSlot:
+    """同一量化时刻的所有定时项共享一个调度事件"""
+    fire_time: float
+    event: Optional[ScheduledEvent]
+    track_names: Set[str]
+
+
+class TimerWheel:
+    """
+    小节量化定时器
+    到期时刻按 ticks_per_bar 量化到槽位，每个非空槽位只占用调度器中的一个事件，
+    不额外创建线程；支持按track名称取消和按Section批量取消。
+    """
+
+    def __init__(self, scheduler: PlaybackScheduler, ticks_per_bar: int = 4):
+        """
+        初始化定时器轮
+
+        Args:
+            scheduler: 驱动槽位到期的播放调度器
+            ticks_per_bar: 每小节的量化槽位数（4 = 以拍为单位）
+        """
+        self.scheduler = scheduler
+        self.ticks_per_bar = ticks_per_bar
+
+        self._slots: Dict[Tuple[float, int], TimerSlot] = {}
+        self._by_track: Dict[str, TimerEntry] = {}
+        self._by_section: Dict[str, Set[str]] = {}
+        self._lock = threading.RLock()
+
+    def add(self,
+            track_name: str,
+            when: float,
+            bpm: float,
+            callback: Callable[[List[str], float], None],
+            section_id: Optional[str] = None):
+        """
+        注册一个到期回调（同一track名称重复注册会覆盖旧的）
+
+        Args:
+            track_name: track名称，到期时作为回调参数
+            （同一槽位、同一回调的track合并为一次调用：callback(track_names, fire_time)）
+            when: 到期时刻（单调时钟）
+            bpm: 用于量化的BPM
+            callback: 到期回调
+            section_id: 所属Section，用于批量取消
+        """
+        if self.scheduler.origin is None:
+            self.scheduler.set_origin()
+
+        tick_duration = PlaybackScheduler.bar_duration(bpm) / self.ticks_per_bar
+        tick = round((when - self.scheduler.origin) / tick_duration)
+        slot_key = (float(bpm), tick)
+
+        with self._lock:
+            self.cancel_track(track_name)
+
+            slot = self._slots.get(slot_key)
+            if slot is None:
+                fire_time = self.scheduler.origin + tick * tick_duration
+                slot = TimerSlot(fire_time, None, set())
+                slot.event = self.scheduler.schedule_at(fire_time, self._fire_slot, slot_key)
+                self._slots[slot_key] = slot
+            slot.track_names.add(track_name)
+
+            self._by_track[track_name] = TimerEntry(track_name, section_id, callback, slot_key)
+            if section_id is not None:
+                self._by_section.setdefault(section_id, set()).add(track_name)
+
+    def cancel_track(self, track_name: str) -> bool:
+        """取消某个track的定时项"""
+        with self._lock:
+            entry = self._by_track.pop(track_name, None)
+            if entry is None:
+                return False
+
+            slot = self._slots.get(entry.slot_key)
+            if slot is not None:
+                slot.track_names.discard(track_name)
+                if not slot.track_names:
+                    # 槽位已空，撤回对应的调度事件
+                    self.scheduler.cancel(slot.event)
+                    del self._slots[entry.slot_key]
+
+            if entry.section_id is not None:
+                names = self._by_section.get(entry.section_id)
+                if names is not None:
+                    names.discard(track_name)
+                    if not names:
+                        del self._by_section[entry.section_id]
+            return True
+
+    def cancel_section(self, section_id: str) -> int:
+        """批量取消某个Section下的所有定时项，返回取消数量"""
+        with self._lock:
+            names = self._by_section.pop(section_id, set())
+            count = 0
+            for track_name in list(names):
+                if self.cancel_track(track_name):
+                    count += 1
+            return count
+
+    def clear(self):
+        """取消全部定时项"""
+        with self._lock:
+            for slot in self._slots.values():
+                self.scheduler.cancel(slot.event)
+            self._slots.clear()
+            self._by_track.clear()
+            self._by_section.clear()
+
+    def pending_count(self) -> int:
+        """待到期的定时项数量"""
+        return len(self._by_track)
+
+    def _fire_slot(self, slot_key: Tuple[float, int]):
+        """槽位到期：依次执行其中所有定时项"""
+        due: Dict[Callable, List[str]] = {}
+        with self._lock:
+            slot = self._slots.pop(slot_key, None)
+            if slot is None:
+                return
+
+            for track_name in sorted(slot.track_names):
+                entry = self._by_track.get(track_name)
+                if entry is None or entry.slot_key != slot_key:
+                    continue
+                self.cancel_track(track_name)
+                due.setdefault(entry.callback, []).append(track_name)
+
+        # 回调在锁外执行，允许回调中再次注册或取消
+        for callback, track_names in due.items():
+            callback(track_names, slot.fire_time)
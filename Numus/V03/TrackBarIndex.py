@@ -0,0 +1,84 @@
+"""
+Track小节索引
+预先计算每个Chapter / Section的绝对起止小节（与TrackConductor的排布规则一致），
+定位播放时以二分查找找到所在Chapter与Section
+"""
+
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+from CoreDataStructure import Track, ChapterTransition
+
+
+@dataclass(frozen=True)
+class SectionSpan:
+    """一个Section在Track中的绝对位置"""
+    start_bar: float
+    end_bar: float
+    chapter_index: int
+    section_index: int
+    overlap: bool  # 是否为Chapter过渡期间的overlap播放（时长由过渡决定）
+
+
+class TrackBarIndex:
+    """
+    Track小节索引（只读快照）
+    - 有过渡的Chapter：第一个Section在过渡期间overlap播放（过渡小节数），其余Section从过渡结束处依次排布
+    - 其他Chapter：所有Section依次排布
+    """
+
+    def __init__(self, track: Track):
+        """
+        构建索引
+
+        Args:
+            track: Track对象
+        """
+        self.chapter_starts: List[float] = []
+        self.transition_ends: List[Optional[float]] = []
+        self.spans: List[SectionSpan] = []
+
+        transitions = {(t.from_chapter_id, t.to_chapter_id): t for t in track.chapter_transitions}
+
+        bar = 0.0
+        for i, chapter in enumerate(track.chapters):
+            self.chapter_starts.append(bar)
+
+            transition: Optional[ChapterTransition] = None
+            if i > 0:
+                transition = transitions.get((track.chapters[i-1].id, chapter.id))
+
+            first_section = 0
+            if transition and chapter.sections:
+                end = bar + transition.duration_bars
+                self.spans.append(SectionSpan(bar, end, i, 0, True))
+                self.transition_ends.append(end)
+                bar = end
+                first_section = 1
+            else:
+                self.transition_ends.append(None)
+
+            for j in range(first_section, len(chapter.sections)):
+                end = bar + chapter.sections[j].duration_bars
+                self.spans.append(SectionSpan(bar, end, i, j, False))
+                bar = end
+
+        self.total_bars = bar
+        self._span_starts = [span.start_bar for span in self.spans]
+
+    def chapter_at(self, bar: float) -> int:
+        """给定小节位置所在的Chapter序号"""
+        return max(0, bisect_right(self.chapter_starts, bar) - 1)
+
+    def span_at(self, bar: float) -> Optional[SectionSpan]:
+        """给定小节位置正在播放的Section（超出Track范围返回None）"""
+        if not self.spans or bar >= self.total_bars:
+            return None
+        return self.spans[max(0, bisect_right(self._span_starts, bar) - 1)]
+
+    def locate(self, bar: float) -> Tuple[int, Optional[SectionSpan]]:
+        """(Chapter序号, 所在Section位置)"""
+        span = self.span_at(bar)
+        if span is not None:
+            return span.chapter_index, span
+        return self.chapter_at(bar), None
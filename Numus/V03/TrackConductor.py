@@ -4,142 +4,233 @@ Track指挥器（修正版）
 """
 
 from typing import Optional, Dict, List
-import time
-import threading
-from CoreDataStructure import Track, ChapterTransition
+from CoreDataStructure import Track, Chapter, ChapterTransition
 from ChapterPlayer import ChapterPlayer
 from DJTransitionManager import DJTransitionManager
 from SegmentPlayer import SegmentPlayer
 from SegmentLibraryManager import SegmentLibrary
+from PlaybackScheduler import PlaybackScheduler
+from TrackBarIndex import TrackBarIndex
 
 
 class TrackConductor:
     """Track级别的总指挥"""
     
-    def __init__(self, segment_player: SegmentPlayer, segment_library: SegmentLibrary):
-        self.chapter_player = ChapterPlayer(segment_player, segment_library)
-        self.dj_transition = DJTransitionManager(segment_player)
+    def __init__(self, segment_player: SegmentPlayer, segment_library: SegmentLibrary,
+                 scheduler: Optional[PlaybackScheduler] = None):
+        self.scheduler = scheduler or PlaybackScheduler()
+        self.chapter_player = ChapterPlayer(segment_player, segment_library, self.scheduler)
+        self.dj_transition = DJTransitionManager(segment_player, self.scheduler)
         self.segment_player = segment_player
         
         self.current_track: Optional[Track] = None
+        self.bar_index: Optional[TrackBarIndex] = None
         self.is_playing = False
-        self.playback_thread: Optional[threading.Thread] = None
     
-    def play_track(self, track: Track):
-        """播放一个Track"""
+    def play_track(self, track: Track, start_bar: float = 0.0,
+                   start_seconds: Optional[float] = None):
+        """
+        播放一个Track（整首Track按小节网格一次性提交到调度器）
+        
+        Args:
+            track: Track对象
+            start_bar: 从第几小节开始（定位/恢复播放）
+            start_seconds: 以秒指定起始位置（优先于start_bar）
+        """
         self.current_track = track
+        self.bar_index = TrackBarIndex(track)
         self.is_playing = True
         
+        bpm = track.core_dna.tempo
+        if start_seconds is not None:
+            start_bar = start_seconds / PlaybackScheduler.bar_duration(bpm)
+        start_bar = max(0.0, start_bar)
+        
         print(f"\n{'#'*80}")
         print(f"# 开始播放Track: {track.name}")
         print(f"# 场景: {track.theme_scene} | BPM: {track.core_dna.tempo}")
         print(f"# 时长: {track.duration_minutes:.1f}分钟 | Chapters: {len(track.chapters)}")
+        if start_bar > 0:
+            print(f"# 定位: 第 {start_bar:.2f} 小节")
         print(f"{'#'*80}\n")
         
-        self.playback_thread = threading.Thread(
-            target=self._playback_worker,
-            args=(track,),
-            daemon=True
-        )
-        self.playback_thread.start()
+        self.scheduler.start()
+        # 让start_bar对应到启动缓冲之后的时刻，之前的小节全部落在过去
+        origin = self.scheduler.set_origin()
+        self.scheduler.set_origin(origin - start_bar * PlaybackScheduler.bar_duration(bpm))
+        self._schedule_track(track, start_bar)
     
-    def _playback_worker(self, track: Track):
-        """Track播放工作线程"""
-        prev_tracks = []
+    def _schedule_track(self, track: Track, start_bar: float = 0.0):
+        """
+        按绝对小节位置排布所有Chapter与过渡
+        定位播放时由小节索引直接找到所在Chapter与Section，之前的部分不提交
+        """
+        bpm = track.core_dna.tempo
+        
+        first_chapter, seek_span = 0, None
+        if start_bar > 0:
+            if start_bar >= self.bar_index.total_bars:
+                self.scheduler.schedule_bar(start_bar, bpm, self._finish_track, track)
+                return
+            first_chapter, seek_span = self.bar_index.locate(start_bar)
+        bar = self.bar_index.chapter_starts[first_chapter] if track.chapters else 0.0
         
-        for i, chapter in enumerate(track.chapters):
-            if not self.is_playing:
-                break
+        for i in range(first_chapter, len(track.chapters)):
+            chapter = track.chapters[i]
+            seeking = seek_span is not None and i == first_chapter
+            self.scheduler.schedule_bar(max(bar, start_bar) if seeking else bar, bpm,
+                                        self._announce_chapter, track, i)
             
-            print(f"\n{'='*80}")
-            print(f"Chapter {i+1}/{len(track.chapters)}: {chapter.name}")
-            print(f"{'='*80}")
+            # 下一个Chapter有过渡时，保留本Chapter最后一个Section给过渡淡出
+            next_transition = None
+            if i + 1 < len(track.chapters):
+                next_transition = self._find_transition(
+                    track, chapter.id, track.chapters[i+1].id
+                )
             
             # Chapter间过渡处理
+            transition = None
             if i > 0:
                 transition = self._find_transition(track, track.chapters[i-1].id, chapter.id)
+            
+            keep_last_section = next_transition is not None
+            
+            if seeking and not seek_span.overlap:
+                # 定位点在普通Section内：从该Section带相位开始，之前的Section与过渡都不提交
+                bar = self.chapter_player.play_chapter(
+                    chapter=chapter,
+                    track_id=track.id,
+                    core_bpm=bpm,
+                    pattern_dna=track.pattern_dna,
+                    start_bar=seek_span.start_bar,
+                    first_section=seek_span.section_index,
+                    keep_last_section=keep_last_section,
+                    seek_bar=start_bar
+                )
+            elif transition and chapter.sections:
+                # 启动新Chapter的第一个Section（用于overlap）并执行DJ过渡
+                bar = self._schedule_chapter_overlap(
+                    chapter, track, transition, bar, seek_bar=start_bar if seeking else None
+                )
                 
-                if transition:
-                    # 启动新Chapter的前几个Section（用于overlap）
-                    new_tracks = self._start_chapter_overlap(
-                        chapter, track, initial_volume=0.0
-                    )
-                    
-                    # 执行DJ过渡
-                    self.dj_transition.execute_transition(
-                        transition=transition,
-                        from_chapter_tracks=prev_tracks,
-                        to_chapter_tracks=new_tracks,
-                        bpm=track.core_dna.tempo
-                    )
-                    
-                    # 等待过渡完成
-                    trans_duration = self.dj_transition.get_transition_duration(
-                        transition, track.core_dna.tempo
-                    )
-                    time.sleep(trans_duration)
-                    
-                    # 继续播放新Chapter剩余部分
-                    remaining_tracks = self._play_chapter_remaining(chapter, track)
-                    prev_tracks = new_tracks + remaining_tracks
-                else:
-                    # 无过渡配置，直接播放
-                    prev_tracks = self._play_chapter_full(chapter, track)
+                # 过渡结束后继续播放新Chapter剩余部分
+                bar = self._play_chapter_remaining(
+                    chapter, track, bar, keep_last_section=keep_last_section
+                )
             else:
-                # 第一个Chapter，直接播放
-                prev_tracks = self._play_chapter_full(chapter, track)
+                # 第一个Chapter或无过渡配置，直接播放
+                bar = self._play_chapter_full(
+                    chapter, track, bar, keep_last_section=keep_last_section
+                )
         
+        self.scheduler.schedule_bar(bar, bpm, self._finish_track, track)
+    
+    def _announce_chapter(self, track: Track, index: int):
+        """Chapter起始事件"""
+        if not self.is_playing:
+            return
+        print(f"\n{'='*80}")
+        print(f"Chapter {index+1}/{len(track.chapters)}: {track.chapters[index].name}")
+        print(f"{'='*80}")
+    
+    def _finish_track(self, track: Track):
+        """Track结束事件"""
         print(f"\n{'#'*80}")
         print(f"# Track播放完成: {track.name}")
         print(f"{'#'*80}\n")
         
         self.is_playing = False
     
-    def _play_chapter_full(self, chapter, track) -> List[str]:
-        """完整播放Chapter"""
+    def _play_chapter_full(self, chapter, track, start_bar: float,
+                           keep_last_section: bool = False) -> float:
+        """完整播放Chapter，返回结束位置（绝对小节）"""
         return self.chapter_player.play_chapter(
             chapter=chapter,
             track_id=track.id,
             core_bpm=track.core_dna.tempo,
-            pattern_dna=track.pattern_dna
+            pattern_dna=track.pattern_dna,
+            start_bar=start_bar,
+            keep_last_section=keep_last_section
         )
     
-    def _start_chapter_overlap(self, chapter, track, initial_volume=0.0) -> List[str]:
-        """启动Chapter的前几个Section（用于DJ过渡overlap）"""
-        # 简化：启动第一个Section，音量设为0等待淡入
-        first_section = chapter.sections[0] if chapter.sections else None
-        if not first_section:
-            return []
+    def _schedule_chapter_overlap(self, chapter: Chapter, track: Track,
+                                  transition: ChapterTransition, start_bar: float,
+                                  seek_bar: Optional[float] = None) -> float:
+        """
+        启动Chapter的第一个Section（用于DJ过渡overlap），
+        并在同一时刻执行过渡，返回过渡结束位置（绝对小节）
         
-        tracks = self.chapter_player.section_player.play_section(
-            section=first_section,
-            track_id=track.id,
-            chapter_id=chapter.id,
-            bpm=track.core_dna.tempo,
-            override_params={"volume": initial_volume}
-        )
-        return tracks
-    
-    def _play_chapter_remaining(self, chapter, track) -> List[str]:
-        """播放Chapter的剩余Section"""
-        remaining = []
-        for section in chapter.sections[1:]:  # 跳过第一个已播放的Section
-            tracks = self.chapter_player.section_player.play_section(
-                section=section,
+        定位点落在过渡期间时（seek_bar），前一个Chapter不再播放，
+        跳过过渡自动化，直接以正常音量带相位启动该Section
+        """
+        bpm = track.core_dna.tempo
+        first_section = chapter.sections[0]
+        end_bar = start_bar + transition.duration_bars
+        
+        if seek_bar is not None and seek_bar > start_bar:
+            new_tracks = self.chapter_player.section_player.play_section(
+                section=first_section,
                 track_id=track.id,
                 chapter_id=chapter.id,
-                bpm=track.core_dna.tempo
+                bpm=bpm,
+                override_params=None,
+                start_time=self.scheduler.bar_time(start_bar, bpm),
+                offset_bars=seek_bar - start_bar
             )
-            remaining.extend(tracks)
-            
-            # 等待Section完成
-            duration = self.chapter_player._calculate_section_duration(
-                section, track.core_dna.tempo
+            self.scheduler.schedule_bar(seek_bar, bpm, self._adopt_section_tracks, new_tracks)
+        else:
+            # 简化：启动第一个Section，音量设为0等待淡入
+            new_tracks = self.chapter_player.section_player.play_section(
+                section=first_section,
+                track_id=track.id,
+                chapter_id=chapter.id,
+                bpm=bpm,
+                override_params={"volume": 0.0},
+                start_time=self.scheduler.bar_time(start_bar, bpm)
+            )
+            self.scheduler.schedule_bar(
+                start_bar, bpm, self._begin_transition, transition, new_tracks, bpm, start_bar
             )
-            time.sleep(duration)
-            self.chapter_player.section_player.stop_section()
         
-        return remaining
+        self.scheduler.schedule_bar(
+            end_bar, bpm, self.chapter_player.section_player.stop_section, new_tracks,
+            self.scheduler.bar_time(end_bar, bpm)
+        )
+        return end_bar
+    
+    def _begin_transition(self, transition: ChapterTransition, new_tracks: List[str],
+                          bpm: int, start_bar: float):
+        """过渡起始事件：此时前一个Chapter的最后一个Section仍在播放"""
+        prev_tracks = self.chapter_player.get_current_section_tracks()
+        self.chapter_player.current_section_tracks = new_tracks
+        
+        # 执行DJ过渡
+        self.dj_transition.execute_transition(
+            transition=transition,
+            from_chapter_tracks=prev_tracks,
+            to_chapter_tracks=new_tracks,
+            bpm=bpm,
+            start_time=self.scheduler.bar_time(start_bar, bpm)
+        )
+    
+    def _adopt_section_tracks(self, new_tracks: List[str]):
+        """定位到过渡期间时，overlap Section直接成为当前Section"""
+        self.chapter_player.current_section_tracks = new_tracks
+    
+    def _play_chapter_remaining(self, chapter, track, start_bar: float,
+                                keep_last_section: bool = False) -> float:
+        """播放Chapter的剩余Section（跳过第一个已播放的Section）"""
+        if len(chapter.sections) < 2:
+            return start_bar
+        return self.chapter_player.play_chapter(
+            chapter=chapter,
+            track_id=track.id,
+            core_bpm=track.core_dna.tempo,
+            pattern_dna=track.pattern_dna,
+            start_bar=start_bar,
+            first_section=1,
+            keep_last_section=keep_last_section
+        )
     
     def _find_transition(self, track, from_id, to_id) -> Optional[ChapterTransition]:
         """查找Chapter间的过渡配置"""
@@ -151,6 +242,7 @@ class TrackConductor:
     def stop_track(self):
         """停止Track播放"""
         self.is_playing = False
+        self.scheduler.clear()
         self.chapter_player.stop_chapter()
         self.segment_player.stop_all_segments()
         self.current_track = None
@@ -160,8 +252,13 @@ class TrackConductor:
         if not self.current_track:
             return {"progress": 0.0}
         
+        bpm = self.current_track.core_dna.tempo
+        position_bar = max(0.0, self.scheduler.time_to_bar(self.scheduler.now(), bpm))
+        
         return {
             "track_id": self.current_track.id,
             "track_name": self.current_track.name,
+            "position_bar": position_bar,
+            "chapter_index": self.bar_index.chapter_at(position_bar) if self.bar_index else 0,
             "chapter_progress": self.chapter_player.get_chapter_progress()
         }
\ No newline at end of file
@@ -15,6 +15,7 @@ live_loop :osc do
   when "play"; psg(c)
   when "stop"; stg(c[1])
   when "set"; stp(c[1], c[2], c[3])
+  when "ramp"; rmp(c[1], c[2], c[3].to_f, c[4].to_f, c[5].to_f, c[6], c[7].to_f)
   when "stop_all"; set :tk, []
   end
 end
@@ -23,43 +24,73 @@ define :psg do |c|
   tn = c[1]
   st = c[2]
   pm = JSON.parse(c[3], symbolize_names: true)
+  ph = (c[4] || 0).to_f
   
-  stg(tn)
-  sleep 0.05
+  set :lc, get(:lc) + 1
+  ln = "l#{get(:lc)}".to_sym
   
+  # 同名track直接替换，不在OSC处理中等待（同一Bundle的多层同时启动）；旧线程按编号发现被替换后退出
+  set "v_#{tn}".to_sym, (pm[:vol] || 1.0).to_f
+  set "c_#{tn}".to_sym, (pm[:cut] || 130).to_f
+  set "p_#{tn}".to_sym, {}
   tks = get(:tk)
   tks = tks.reject { |t| t[:n] == tn }
-  tks << {n: tn, t: st, p: pm, v: pm[:vol] || 1.0, c: pm[:cut] || 130, a: true}
+  tks << {n: tn, t: st, p: pm, a: true, id: ln}
   set :tk, tks
   
-  set :lc, get(:lc) + 1
-  ln = "l#{get(:lc)}".to_sym
-  
   in_thread name: ln do
+    Thread.current[:o] = ph
     loop do
       tks = get(:tk)
-      trk = tks.find { |t| t[:n] == tn && t[:a] }
+      trk = tks.find { |t| t[:n] == tn && t[:id] == ln && t[:a] }
       break unless trk
+      p = trk[:p].merge(get("p_#{tn}".to_sym) || {})
       
       case trk[:t]
-      when "kick"; pk(trk[:p], trk)
-      when "snare"; ps(trk[:p], trk)
-      when "hat"; ph(trk[:p], trk)
-      when "bass"; pb(trk[:p], trk)
-      when "chord"; pch(trk[:p], trk)
-      when "lead"; pl(trk[:p], trk)
-      when "arp"; par(trk[:p], trk)
-      when "pad"; ppad(trk[:p], trk)
-      when "rise"; pr(trk[:p], trk)
-      when "amb"; pam(trk[:p], trk)
-      when "tex"; ptx(trk[:p], trk)
+      when "kick"; pk(p, trk)
+      when "snare"; ps(p, trk)
+      when "hat"; ph(p, trk)
+      when "bass"; pb(p, trk)
+      when "chord"; pch(p, trk)
+      when "lead"; pl(p, trk)
+      when "arp"; par(p, trk)
+      when "pad"; ppad(p, trk)
+      when "rise"; pr(p, trk)
+      when "amb"; pam(p, trk)
+      when "tex"; ptx(p, trk)
       end
       
-      sleep trk[:p][:db] || 4
+      ws p[:db] || 4
     end
   end
 end
 
+# 定位播放：线程从 o 拍处进入（不发声、不等待地跳过此前的步，跨步时只等剩余部分）
+define :ws do |d|
+  o = Thread.current[:o] || 0
+  if o <= 0
+    sleep d
+  elsif o < d
+    sleep d - o
+    Thread.current[:o] = 0
+  else
+    Thread.current[:o] = o - d
+  end
+end
+
+define :lv do
+  (Thread.current[:o] || 0) <= 0
+end
+
+# 音量/截止频率按track单独存放，播放时逐音读取；ramp/set只写这些键，不改写 :tk 列表
+define :tv do |s|
+  get("v_#{s[:n]}".to_sym) || 1.0
+end
+
+define :tc do |s|
+  get("c_#{s[:n]}".to_sym) || 130
+end
+
 define :s2sym do |v|
   return v unless v.is_a?(String)
   v.start_with?(":") ? v[1..-1].to_sym : v.to_sym
@@ -70,8 +101,8 @@ define :pk do |p, s|
   pt = p[:pt] || [1,0,0,0,1,0,0,0,1,0,0,0,1,0,0,0]
   sy = s2sym(p[:syn] || :bd_haus)
   pt.each do |h|
-    sample sy, amp: (p[:amp] || 1.0) * s[:v] * get(:mv), cutoff: s[:c], release: p[:rel] || 0.3 if h == 1
-    sleep 0.25
+    sample sy, amp: (p[:amp] || 1.0) * tv(s) * get(:mv), cutoff: tc(s), release: p[:rel] || 0.3 if h == 1 && lv
+    ws 0.25
   end
 end
 
@@ -80,8 +111,8 @@ define :ps do |p, s|
   pt = p[:pt] || [0,0,0,0,1,0,0,0,0,0,0,0,1,0,0,0]
   sy = s2sym(p[:syn] || :drum_snare_hard)
   pt.each do |h|
-    sample sy, amp: (p[:amp] || 0.8) * s[:v] * get(:mv), cutoff: s[:c] if h == 1
-    sleep 0.25
+    sample sy, amp: (p[:amp] || 0.8) * tv(s) * get(:mv), cutoff: tc(s) if h == 1 && lv
+    ws 0.25
   end
 end
 
@@ -90,8 +121,8 @@ define :ph do |p, s|
   pt = p[:pt] || [1,0,1,0,1,0,1,0,1,0,1,0,1,0,1,0]
   sy = s2sym(p[:syn] || :drum_cymbal_closed)
   pt.each do |h|
-    sample sy, amp: (p[:amp] || 0.5) * s[:v] * get(:mv), cutoff: s[:c] if h == 1
-    sleep 0.25
+    sample sy, amp: (p[:amp] || 0.5) * tv(s) * get(:mv), cutoff: tc(s) if h == 1 && lv
+    ws 0.25
   end
 end
 
@@ -100,9 +131,11 @@ define :pb do |p, s|
   use_synth s2sym(p[:syn] || :bass_foundation)
   ns = (p[:ns] || [:c2, :c2, :as1, :as1]).map { |n| s2sym(n) }
   ns.each do |n|
-    play n, amp: (p[:amp] || 0.8) * s[:v] * get(:mv), cutoff: s[:c], 
-         res: p[:res] || 0.3, release: p[:rel] || 0.5
-    sleep 1
+    if lv
+      play n, amp: (p[:amp] || 0.8) * tv(s) * get(:mv), cutoff: tc(s), 
+           res: p[:res] || 0.3, release: p[:rel] || 0.5
+    end
+    ws 1
   end
 end
 
@@ -112,9 +145,11 @@ define :pch do |p, s|
   chs = p[:chs] || [[:c4, :e4, :g4], [:a3, :c4, :e4]]
   chs = chs.map { |ch| ch.map { |n| s2sym(n) } }
   chs.each do |ch|
-    play ch, amp: (p[:amp] || 0.6) * s[:v] * get(:mv), cutoff: s[:c],
-         attack: p[:atk] || 0.1, release: p[:rel] || 1.0
-    sleep 2
+    if lv
+      play ch, amp: (p[:amp] || 0.6) * tv(s) * get(:mv), cutoff: tc(s),
+           attack: p[:atk] || 0.1, release: p[:rel] || 1.0
+    end
+    ws 2
   end
 end
 
@@ -123,9 +158,11 @@ define :pl do |p, s|
   use_synth s2sym(p[:syn] || :blade)
   ns = (p[:ns] || [:c4, :e4, :g4, :a4]).map { |n| s2sym(n) }
   ns.each do |n|
-    play n, amp: (p[:amp] || 0.6) * s[:v] * get(:mv), cutoff: s[:c],
-         attack: p[:atk] || 0.01, release: p[:rel] || 0.3
-    sleep p[:nd] || 0.5
+    if lv
+      play n, amp: (p[:amp] || 0.6) * tv(s) * get(:mv), cutoff: tc(s),
+           attack: p[:atk] || 0.01, release: p[:rel] || 0.3
+    end
+    ws p[:nd] || 0.5
   end
 end
 
@@ -135,8 +172,10 @@ define :par do |p, s|
   ns = (p[:ns] || [:c4, :e4, :g4, :c5]).map { |n| s2sym(n) }
   sp = p[:spd] || 0.25
   ns.each do |n|
-    play n, amp: (p[:amp] || 0.5) * s[:v] * get(:mv), cutoff: s[:c], release: p[:rel] || 0.2
-    sleep sp
+    if lv
+      play n, amp: (p[:amp] || 0.5) * tv(s) * get(:mv), cutoff: tc(s), release: p[:rel] || 0.2
+    end
+    ws sp
   end
 end
 
@@ -145,9 +184,11 @@ define :ppad do |p, s|
   use_synth s2sym(p[:syn] || :hollow)
   ns = (p[:ns] || [:c3, :e3, :g3]).map { |n| s2sym(n) }
   with_fx :reverb, room: p[:rev] || 0.7 do
-    play ns, amp: (p[:amp] || 0.4) * s[:v] * get(:mv), cutoff: s[:c],
-         attack: p[:atk] || 1.0, sustain: p[:sus] || 2.0, release: p[:rel] || 2.0
-    sleep p[:db] || 4
+    if lv
+      play ns, amp: (p[:amp] || 0.4) * tv(s) * get(:mv), cutoff: tc(s),
+           attack: p[:atk] || 1.0, sustain: p[:sus] || 2.0, release: p[:rel] || 2.0
+    end
+    ws p[:db] || 4
   end
 end
 
@@ -159,8 +200,10 @@ define :pr do |p, s|
   st.times do |i|
     pg = i.to_f / st
     ct = 60 + (70 * pg)
-    play 60, amp: (p[:amp] || 0.5) * pg * s[:v] * get(:mv), cutoff: ct
-    sleep db.to_f / st
+    if lv
+      play 60, amp: (p[:amp] || 0.5) * pg * tv(s) * get(:mv), cutoff: ct
+    end
+    ws db.to_f / st
   end
 end
 
@@ -169,9 +212,11 @@ define :pam do |p, s|
   use_synth s2sym(p[:syn] || :dark_ambience)
   rn = s2sym(p[:rn] || :c2)
   with_fx :reverb, room: p[:rev] || 0.9 do
-    play rn, amp: (p[:amp] || 0.3) * s[:v] * get(:mv),
-         cutoff: s[:c], attack: 2, sustain: p[:db] || 4, release: 2
-    sleep p[:db] || 4
+    if lv
+      play rn, amp: (p[:amp] || 0.3) * tv(s) * get(:mv),
+           cutoff: tc(s), attack: 2, sustain: p[:db] || 4, release: 2
+    end
+    ws p[:db] || 4
   end
 end
 
@@ -180,10 +225,12 @@ define :ptx do |p, s|
   use_synth s2sym(p[:syn] || :blade)
   ns = p[:ns] ? (p[:ns].is_a?(Array) ? p[:ns].map { |n| s2sym(n) } : s2sym(p[:ns])) : :c3
   with_fx :reverb, room: p[:rev] || 0.7 do
-    with_fx :lpf, cutoff: s[:c] do
-      play ns, amp: (p[:amp] || 0.4) * s[:v] * get(:mv),
-           attack: p[:atk] || 0.5, sustain: p[:sus] || 3.0, release: p[:rel] || 1.0
-      sleep p[:db] || 8
+    with_fx :lpf, cutoff: tc(s) do
+      if lv
+        play ns, amp: (p[:amp] || 0.4) * tv(s) * get(:mv),
+             attack: p[:atk] || 0.5, sustain: p[:sus] || 3.0, release: p[:rel] || 1.0
+      end
+      ws p[:db] || 8
     end
   end
 end
@@ -193,7 +240,7 @@ define :stg do |tn|
   new_tks = []
   tks.each do |t|
     if t[:n] == tn
-      new_tks << {n: t[:n], t: t[:t], p: t[:p], v: t[:v], c: t[:c], a: false}
+      new_tks << {n: t[:n], t: t[:t], p: t[:p], a: false, id: t[:id]}
     else
       new_tks << t
     end
@@ -201,29 +248,38 @@ define :stg do |tn|
   set :tk, new_tks
 end
 
+# :tk 只由OSC处理线程（psg/stg）改写；参数写入各track自己的键，并发ramp之间互不覆盖
 define :stp do |tn, pn, pv|
-  tks = get(:tk)
-  new_tks = []
-  tks.each do |t|
-    if t[:n] == tn
-      new_v = t[:v]
-      new_c = t[:c]
-      new_p = t[:p]
-      
-      case pn
-      when "vol"; new_v = pv.to_f
-      when "cut"; new_c = pv.to_f
-      else
-        new_p = t[:p].dup
-        new_p[pn.to_sym] = pv
-      end
-      
-      new_tks << {n: t[:n], t: t[:t], p: new_p, v: new_v, c: new_c, a: t[:a]}
-    else
-      new_tks << t
+  case pn
+  when "vol"; set "v_#{tn}".to_sym, pv.to_f
+  when "cut"; set "c_#{tn}".to_sym, pv.to_f
+  else
+    op = get("p_#{tn}".to_sym) || {}
+    set "p_#{tn}".to_sym, op.merge(pn.to_sym => pv)
+  end
+end
+
+define :rmp do |tn, pn, sv, ev, bs, cv, b|
+  rk = "rmp_#{tn}_#{pn}".to_sym
+  rid = (get(rk) || 0) + 1
+  set rk, rid
+  
+  in_thread do
+    use_bpm b
+    n = [(bs * 16).to_i, 1].max
+    (n + 1).times do |i|
+      break unless get(rk) == rid
+      x = i.to_f / n
+      y = case cv
+          when "exp"; x * x
+          when "log"; Math.sqrt(x)
+          when "scurve"; x * x * (3 - 2 * x)
+          else x
+          end
+      stp(tn, pn, sv + (ev - sv) * y)
+      sleep 0.25 if i < n
     end
   end
-  set :tk, new_tks
 end
 
 # 变量名压缩
@@ -233,6 +289,11 @@ end
 # tn = track_name
 # st = segment_type
 # pm = params
+# ph = 进入相位（拍），o = 剩余待跳过拍数
+# ln = 启动编号（线程名，同名track被替换时区分新旧线程）
+# v_/c_/p_<tn> = track的音量 / 截止频率 / 其他参数覆盖
+# rk = ramp_key, rid = ramp_id（同一track参数的新ramp覆盖旧ramp）
+# sv/ev = start/end value, bs = bars, cv = curve, b = bpm
 # s = state
 # p = params
 
@@ -264,6 +325,11 @@ end
 # pr = play_riser
 # pam = play_ambient
 # ptex = play_texture
+# stg = stop_segment
+# stp = set_param
+# rmp = ramp_param
+# ws = wait_step（相位跳过的sleep）
+# lv = is_live（当前步是否发声）
 
 # 类型名压缩
 # "kick_pattern" -> "kick"
@@ -0,0 +1,92 @@
+"""
+AsyncTrackConductor DJ过渡测试
+overlap Section的track在过渡开始后才由Segment协程登记，新tracks也必须收到ramp/设置
+"""
+
+import asyncio
+from AsyncTrackConductor import AsyncTrackConductor
+from CoreDataStructure import ChapterTransition, TransitionType
+
+
+# 高BPM缩短测试时长：每小节0.125秒
+BPM = 1920
+
+
+class RecordingPlayer:
+    """记录ramp/set/stop命令的SegmentPlayer替身（不联网）"""
+
+    def __init__(self):
+        self.ramps = []
+        self.sets = []
+
+    def ramp_segments_batch(self, ramps, duration_bars, bpm, curve="linear", at=None):
+        self.ramps.extend((track, param, start, end, duration_bars) for track, param, start, end in ramps)
+
+    def set_segments_batch(self, sets, at=None):
+        self.sets.extend(sets)
+
+    def stop_segments_batch(self, names, at=None):
+        pass
+
+
+def _run(kind: TransitionType, launches):
+    """执行一次4小节过渡，launches为 [(相对小节, track名), ...]，模拟Segment协程逐个登记"""
+    conductor = AsyncTrackConductor(segment_library=None, lookahead=0.0)
+    player = RecordingPlayer()
+    conductor.segment_player = player
+    transition = ChapterTransition("c1", "c2", kind, 4)
+
+    async def launch(to_tracks):
+        for bar, name in launches:
+            await conductor._sleep_until(conductor._bar_time(bar, BPM))
+            to_tracks.append(name)
+
+    async def main():
+        conductor._origin = asyncio.get_running_loop().time()
+        to_tracks = []
+        await asyncio.gather(
+            conductor._run_transition(transition, ["old"], to_tracks, BPM, 0.0),
+            launch(to_tracks)
+        )
+
+    asyncio.run(main())
+    return player
+
+
+def test_crossfade_ramps_late_tracks():
+    """crossfade：过渡开始时与过渡中启动的新tracks都收到淡入ramp"""
+    player = _run(TransitionType.ENERGY_CROSSFADE, [(0, "new1"), (2, "new2")])
+    ramps = {track: (start, end, bars) for track, param, start, end, bars in player.ramps}
+
+    assert ramps["old"] == (1.0, 0.0, 4)
+    assert ramps["new1"] == (0.0, 1.0, 4)
+    start, end, bars = ramps["new2"]
+    assert end == 1.0 and 0.45 <= start <= 0.55 and 1.9 <= bars <= 2.1
+    print("✅ crossfade 新tracks淡入")
+
+
+def test_sweep_and_build_ramp_incoming_tracks():
+    """filter sweep / breakdown-build：新tracks收到ramp"""
+    sweep = _run(TransitionType.FILTER_SWEEP, [(0, "new1")])
+    assert ("new1", "cutoff", 40.0, 130.0, 4) in sweep.ramps
+
+    build = _run(TransitionType.BREAKDOWN_BUILD, [(0, "new1")])
+    assert [(t, p, s, e) for t, p, s, e, _ in build.ramps if t == "new1"] == [("new1", "volume", 0.0, 1.0)]
+    print("✅ sweep / build 新tracks")
+
+
+def test_impact_drop_sets_late_tracks():
+    """impact drop：落点之后才启动的tracks也设为满音量"""
+    player = _run(TransitionType.IMPACT_DROP, [(0, "new1"), (3, "new2")])
+    assert ("new1", "volume", 1.0) in player.sets
+    assert ("new2", "volume", 1.0) in player.sets
+    assert not player.ramps
+    print("✅ impact drop 新tracks")
+
+
+if __name__ == "__main__":
+    test_crossfade_ramps_late_tracks()
+    test_sweep_and_build_ramp_incoming_tracks()
+    test_impact_drop_sets_late_tracks()
+
+    print("\n所有测试完成！")
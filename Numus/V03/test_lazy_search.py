@@ -0,0 +1,53 @@
+"""
+惰性Segment库组合检索测试
+列式索引只能由元数据行构建，search_advanced只解码命中的Segment，LRU保持有界
+"""
+
+from SegmentLibraryManager import SegmentLibrary, SegmentColumnIndex
+from StandardSegment import SegmentCategory
+
+
+CRITERIA = [
+    dict(category=SegmentCategory.RHYTHM),
+    dict(energy_range="high"),
+    dict(min_energy=0.4, max_energy=0.6, min_density=0.3),
+    dict(tags=["kick", "bass"]),
+]
+
+
+def test_lazy_search_matches_eager():
+    """惰性与常驻模式的组合检索结果一致"""
+    eager = SegmentLibrary("../segments", use_cache=False)
+    lazy = SegmentLibrary("../segments", use_cache=False, lazy=True, lru_size=4)
+
+    for criteria in CRITERIA:
+        expected = [s.id for s in eager.search_advanced(**criteria)]
+        assert [s.id for s in lazy.search_advanced(**criteria)] == expected, criteria
+    print("✅ 惰性检索结果一致")
+
+
+def test_lazy_search_decodes_only_hits():
+    """构建索引不解码Segment，索引不持有Segment，LRU不超过容量"""
+    if SegmentColumnIndex is None:
+        print("未安装numpy，跳过")
+        return
+
+    lazy = SegmentLibrary("../segments", use_cache=False, lazy=True, lru_size=4)
+    store = lazy.segments
+
+    index = lazy.get_column_index()
+    assert len(index) == len(store)
+    assert not hasattr(index, "segments")
+    assert store.misses == 0, "构建列式索引不应解码Segment"
+
+    results = lazy.search_advanced(energy_range="high")
+    assert store.misses == len(results)
+    assert store.get_cache_info()["cached"] <= 4
+    print(f"✅ 命中 {len(results)} 个，解码 {store.misses} 次，共 {len(store)} 个Segment")
+
+
+if __name__ == "__main__":
+    test_lazy_search_matches_eager()
+    test_lazy_search_decodes_only_hits()
+
+    print("\n所有测试完成！")
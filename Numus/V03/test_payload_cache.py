@@ -0,0 +1,60 @@
+"""
+SegmentPlayer 参数负载缓存测试
+覆盖参数中的空容器与不同类型的同值标量必须得到各自正确的负载
+"""
+
+import json
+from SegmentPlayer import SegmentPlayer
+from StandardSegment import create_example_kick_pattern
+
+
+class RecordingClient:
+    """记录发送内容的OSC客户端（不联网）"""
+
+    def __init__(self):
+        self.sent = []
+
+    def send_message(self, address, value):
+        self.sent.append((address, value))
+
+
+def _payload(player: SegmentPlayer, segment, override_params) -> dict:
+    """播放一次并取出play消息中的参数负载"""
+    player.play_segment(segment, "t", "c", "s", override_params)
+    address, message = player.client.sent[-1]
+    assert address == "/numus/cmd" and message[0] == "play"
+    return json.loads(message[3])
+
+
+def test_empty_container_overrides():
+    """空列表/空字典覆盖参数可作为缓存键"""
+    player = SegmentPlayer(client=RecordingClient())
+    segment = create_example_kick_pattern()
+
+    for override in ({"notes": []}, {"notes": ()}, {"fx": {}}, {}, None):
+        _payload(player, segment, override)
+
+    # 空列表与空元组、空字典是不同的键
+    assert (player._override_key({"notes": []}) != player._override_key({"notes": ()})
+            != player._override_key({"notes": {}}))
+    print("✅ 空容器覆盖参数")
+
+
+def test_scalar_types_not_shared():
+    """1 / 1.0 / True 各自缓存，负载中的JSON类型与输入一致"""
+    player = SegmentPlayer(client=RecordingClient())
+    segment = create_example_kick_pattern()
+
+    for value in (1, 1.0, True, 1, 1.0, True):
+        payload = _payload(player, segment, {"amp": value})
+        assert type(payload["amp"]) is type(value), (value, payload["amp"])
+
+    assert player.payload_misses == 3 and player.payload_hits == 3
+    print("✅ 标量类型区分")
+
+
+if __name__ == "__main__":
+    test_empty_container_overrides()
+    test_scalar_types_not_shared()
+
+    print("\n所有测试完成！")
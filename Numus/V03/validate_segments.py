@@ -2,11 +2,22 @@
 Segment 验证工具
 检查 segments 中的合成器和样本名称是否有效
 基于 Sonic Pi 3.4 官方文档
+
+按文件内容哈希缓存验证结果（只重新验证变化的文件），待验证文件多时分发到进程池，
+结果可导出为 JSON / JUnit 报告供 CI 使用
 """
 
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from pathlib import Path
+import argparse
+import hashlib
 import json
-from typing import Set, List, Dict
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+from typing import Set, List, Dict, Optional, Tuple
 
 # Sonic Pi 3.4 实际可用的合成器列表（来自官方文档）
 VALID_SYNTHS = {
@@ -109,122 +120,358 @@ SYNTH_ALTERNATIVES = {
     "sub_bass": "bass_foundation",
 }
 
-def validate_synth_name(synth_name: str, segment_id: str, sub_type: str) -> bool:
-    """验证合成器名称"""
-    clean_name = synth_name.lstrip(":")
-    
-    # 判断应该是 synth 还是 sample
-    expected_type = SUBTYPE_TO_PLAYBACK.get(sub_type, "synth")
+# 验证规则版本（检查逻辑变化时递增；名称表的变化由规则摘要自动反映）
+RULES_VERSION = 2
+
+
+def rules_digest() -> str:
+    """规则摘要：名称表或规则版本变化时，缓存的验证结果全部失效"""
+    payload = json.dumps([
+        RULES_VERSION,
+        sorted(VALID_SYNTHS),
+        sorted(VALID_SAMPLES),
+        sorted(SUBTYPE_TO_PLAYBACK.items()),
+        sorted(SYNTH_ALTERNATIVES.items())
+    ])
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+@lru_cache(maxsize=None)
+def check_synth_name(clean_name: str, expected_type: str) -> Optional[Tuple[str, str]]:
+    """
+    名称校验（按 (名称, 期望类型) 记忆化，同名只判定一次）
     
+    Returns:
+        通过返回None，否则返回 (级别 error/warning, 说明)
+    """
     if expected_type == "sample":
         # 应该是样本
         if clean_name in VALID_SAMPLES:
-            return True
-        elif clean_name in VALID_SYNTHS:
-            print(f"⚠️  {segment_id}: '{synth_name}' 是合成器，但 sub_type '{sub_type}' 应使用样本")
-            return False
-        else:
-            # 检查是否有推荐替代
-            if clean_name in SYNTH_ALTERNATIVES:
-                alt = SYNTH_ALTERNATIVES[clean_name]
-                print(f"❌ {segment_id}: 未知样本 '{synth_name}' -> 建议使用 ':{alt}'")
-            else:
-                print(f"❌ {segment_id}: 未知样本 '{synth_name}'")
-            return False
-    else:
-        # 应该是合成器
+            return None
         if clean_name in VALID_SYNTHS:
-            return True
-        elif clean_name in VALID_SAMPLES:
-            print(f"⚠️  {segment_id}: '{synth_name}' 是样本，但 sub_type '{sub_type}' 应使用合成器")
-            print(f"   提示：如果要使用样本，请用 sample :{clean_name} 而非 use_synth")
-            return False
-        else:
-            # 检查是否有推荐替代
-            if clean_name in SYNTH_ALTERNATIVES:
-                alt = SYNTH_ALTERNATIVES[clean_name]
-                print(f"❌ {segment_id}: 未知合成器 '{synth_name}' -> 建议使用 ':{alt}'")
-            else:
-                print(f"❌ {segment_id}: 未知合成器 '{synth_name}'")
-                print(f"   可用的低音合成器: bass_foundation, bass_highend, tb303, prophet, fm")
-            return False
+            return "warning", f"'{clean_name}' 是合成器，但应使用样本"
+        if clean_name in SYNTH_ALTERNATIVES:
+            return "error", f"未知样本 '{clean_name}' -> 建议使用 ':{SYNTH_ALTERNATIVES[clean_name]}'"
+        return "error", f"未知样本 '{clean_name}'"
+    
+    # 应该是合成器
+    if clean_name in VALID_SYNTHS:
+        return None
+    if clean_name in VALID_SAMPLES:
+        return "warning", (f"'{clean_name}' 是样本，但应使用合成器"
+                           f"（如果要使用样本，请用 sample :{clean_name} 而非 use_synth）")
+    if clean_name in SYNTH_ALTERNATIVES:
+        return "error", f"未知合成器 '{clean_name}' -> 建议使用 ':{SYNTH_ALTERNATIVES[clean_name]}'"
+    return "error", (f"未知合成器 '{clean_name}'"
+                     f"（可用的低音合成器: bass_foundation, bass_highend, tb303, prophet, fm）")
 
-def validate_segment_file(filepath: Path) -> Dict[str, List[str]]:
-    """验证单个 segment 文件"""
-    issues = {"synth_errors": [], "sample_warnings": [], "type_mismatches": []}
+
+def validate_synth_name(synth_name: str, segment_id: str, sub_type: str) -> bool:
+    """验证合成器名称"""
+    expected_type = SUBTYPE_TO_PLAYBACK.get(sub_type, "synth")
+    result = check_synth_name(synth_name.lstrip(":"), expected_type)
+    if result is None:
+        return True
     
+    severity, message = result
+    print(f"{'⚠️ ' if severity == 'warning' else '❌'} {segment_id}: {message} (sub_type '{sub_type}')")
+    return False
+
+
+def check_segment(segment: Dict) -> List[Dict]:
+    """检查单个 segment，返回问题列表（不打印）"""
+    segment_id = segment.get("id", "unknown")
+    sub_type = segment.get("sub_type", "unknown")
+    params = segment.get("playback_params", {})
+    issues = []
+    
+    def add(category: str, field: str, value: str, severity: str, message: str):
+        issues.append({
+            "category": category,
+            "segment": segment_id,
+            "field": field,
+            "value": value,
+            "severity": severity,
+            "message": message
+        })
+    
+    # 检查 synth 参数
+    if "synth" in params:
+        synth = params["synth"]
+        result = check_synth_name(synth.lstrip(":"), SUBTYPE_TO_PLAYBACK.get(sub_type, "synth"))
+        if result:
+            add("synth_errors", "synth", synth, result[0], f"{result[1]} (sub_type '{sub_type}')")
+    
+    # 检查 open_synth（hi-hat 特有）与 breakbeat 的多个 synth 字段
+    for field in ["open_synth", "kick_synth", "snare_synth", "hihat_synth"]:
+        if field in params:
+            sample_name = params[field]
+            if sample_name.lstrip(":") not in VALID_SAMPLES:
+                add("sample_warnings", field, sample_name, "error", f"未知 {field} 样本 '{sample_name}'")
+    
+    return issues
+
+
+def _validate_file(filepath: str) -> Dict:
+    """验证单个文件（进程池工作函数，结果可 JSON 序列化）"""
+    result = {"segments": [], "issues": [], "error": None}
     try:
         with open(filepath, 'r', encoding='utf-8') as f:
             data = json.load(f)
         
         for segment in data.get("segments", []):
-            segment_id = segment.get("id", "unknown")
-            sub_type = segment.get("sub_type", "unknown")
-            params = segment.get("playback_params", {})
-            
-            # 检查 synth 参数
-            if "synth" in params:
-                synth = params["synth"]
-                if not validate_synth_name(synth, segment_id, sub_type):
-                    issues["synth_errors"].append(f"{segment_id}: {synth}")
+            result["segments"].append(segment.get("id", "unknown"))
+            result["issues"].extend(check_segment(segment))
+    except Exception as e:
+        result["error"] = f"读取文件失败: {e}"
+    return result
+
+
+def _issue_lists(issues: List[Dict]) -> Dict[str, List[str]]:
+    """按类别汇总为 "segment_id: 名称" 列表"""
+    lists = {"synth_errors": [], "sample_warnings": [], "type_mismatches": []}
+    for issue in issues:
+        lists[issue["category"]].append(f"{issue['segment']}: {issue['value']}")
+    return lists
+
+
+def validate_segment_file(filepath: Path) -> Dict[str, List[str]]:
+    """验证单个 segment 文件"""
+    result = _validate_file(str(filepath))
+    if result["error"]:
+        print(f"❌ {filepath}: {result['error']}")
+    return _issue_lists(result["issues"])
+
+
+class SegmentValidator:
+    """
+    Segment 批量验证引擎
+    - 以 (大小, mtime) 快速判断文件未变，变化时再以内容哈希复核
+    - 只有变化的文件需要重新验证，数量较多时分发到进程池
+    - 结果汇总为报告，可导出 JSON / JUnit
+    """
+    
+    CACHE_VERSION = 1
+    
+    # 待验证文件少于该数量时在当前进程内验证（进程池启动开销更大）
+    PARALLEL_MIN_FILES = 8
+    
+    def __init__(self, segments_dir: str = "../segments", workers: Optional[int] = None,
+                 use_cache: bool = True):
+        """
+        初始化验证引擎
+        
+        Args:
+            segments_dir: segments 目录
+            workers: 进程数（None 为 CPU 核数，1 表示不使用进程池）
+            use_cache: 是否使用增量验证缓存
+        """
+        self.segments_dir = Path(segments_dir)
+        self.workers = workers or os.cpu_count() or 1
+        self.use_cache = use_cache
+        self.cache_path = self.segments_dir.with_name(self.segments_dir.name + ".validation.cache")
+        self.rules = rules_digest()
+    
+    def run(self) -> Dict:
+        """验证全部文件并返回报告"""
+        started = time.perf_counter()
+        cache = self._load_cache()
+        entries = {}
+        pending = []
+        
+        for json_file in sorted(self.segments_dir.glob("*.json")):
+            st = json_file.stat()
+            stat = [st.st_size, st.st_mtime_ns]
+            cached = cache.get(json_file.name)
             
-            # 检查 open_synth（hi-hat 特有）
-            if "open_synth" in params:
-                open_synth = params["open_synth"]
-                clean_name = open_synth.lstrip(":")
-                if clean_name not in VALID_SAMPLES:
-                    print(f"❌ {segment_id}: 未知 open_synth 样本 '{open_synth}'")
-                    issues["sample_warnings"].append(f"{segment_id}: {open_synth}")
+            if cached and cached["stat"] == stat:
+                entries[json_file.name] = dict(cached, cached=True)
+                continue
             
-            # 检查 breakbeat 的多个 synth 字段
-            for field in ["kick_synth", "snare_synth", "hihat_synth"]:
-                if field in params:
-                    sample_name = params[field]
-                    clean_name = sample_name.lstrip(":")
-                    if clean_name not in VALID_SAMPLES:
-                        print(f"❌ {segment_id}: 未知 {field} 样本 '{sample_name}'")
-                        issues["sample_warnings"].append(f"{segment_id}: {sample_name}")
+            digest = hashlib.sha1(json_file.read_bytes()).hexdigest()
+            if cached and cached["digest"] == digest:
+                # 内容未变（仅 mtime 变化），刷新记录的 stat
+                entries[json_file.name] = dict(cached, stat=stat, cached=True)
+            else:
+                entries[json_file.name] = {"stat": stat, "digest": digest, "cached": False}
+                pending.append(json_file)
         
-    except Exception as e:
-        print(f"❌ 读取文件失败 {filepath}: {e}")
+        for json_file, result in zip(pending, self._validate_files(pending)):
+            entries[json_file.name].update(result)
+        
+        if self.use_cache:
+            self._save_cache(entries)
+        
+        return self._build_report(entries, time.perf_counter() - started)
     
-    return issues
-
-def validate_all_segments(segments_dir: str = "../segments"):
-    """验证所有 segment 文件"""
-    segments_path = Path(segments_dir)
+    def _validate_files(self, files: List[Path]) -> List[Dict]:
+        """验证变化的文件（按输入顺序返回结果）"""
+        paths = [str(f) for f in files]
+        if self.workers <= 1 or len(paths) < self.PARALLEL_MIN_FILES:
+            return [_validate_file(p) for p in paths]
+        
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(paths))) as pool:
+            return list(pool.map(_validate_file, paths, chunksize=max(1, len(paths) // (self.workers * 4))))
+    
+    # ==================== 缓存 ====================
+    
+    def _load_cache(self) -> Dict[str, Dict]:
+        """读取缓存（版本或规则摘要不一致时视为空）"""
+        if not self.use_cache or not self.cache_path.exists():
+            return {}
+        
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+        except Exception as e:
+            print(f"读取验证缓存失败 {self.cache_path}: {e}")
+            return {}
+        
+        if snapshot.get("version") != self.CACHE_VERSION or snapshot.get("rules") != self.rules:
+            return {}
+        return snapshot.get("files", {})
     
+    def _save_cache(self, entries: Dict[str, Dict]):
+        """写入缓存（读取失败的文件不缓存，下次重新验证）"""
+        files = {
+            name: {k: v for k, v in entry.items() if k != "cached"}
+            for name, entry in entries.items() if not entry.get("error")
+        }
+        snapshot = {"version": self.CACHE_VERSION, "rules": self.rules, "files": files}
+        
+        tmp_path = self.cache_path.with_name(self.cache_path.name + ".tmp")
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f, ensure_ascii=False)
+            os.replace(tmp_path, self.cache_path)
+        except Exception as e:
+            print(f"写入验证缓存失败 {self.cache_path}: {e}")
+    
+    # ==================== 报告 ====================
+    
+    def _build_report(self, entries: Dict[str, Dict], seconds: float) -> Dict:
+        files = []
+        for name, entry in entries.items():
+            files.append({
+                "file": name,
+                "digest": entry["digest"],
+                "cached": entry["cached"],
+                "segments": entry["segments"],
+                "issues": entry["issues"],
+                "error": entry.get("error")
+            })
+        
+        issues = [issue for f in files for issue in f["issues"]]
+        return {
+            "tool": "validate_segments",
+            "rules": self.rules,
+            "segments_dir": str(self.segments_dir),
+            "files": files,
+            "summary": {
+                "files": len(files),
+                "validated": sum(1 for f in files if not f["cached"]),
+                "cached": sum(1 for f in files if f["cached"]),
+                "segments": sum(len(f["segments"]) for f in files),
+                "errors": sum(1 for i in issues if i["severity"] == "error"),
+                "warnings": sum(1 for i in issues if i["severity"] == "warning"),
+                "file_errors": sum(1 for f in files if f["error"]),
+                "seconds": round(seconds, 4)
+            }
+        }
+    
+    @staticmethod
+    def write_json(report: Dict, path: str):
+        """导出 JSON 报告"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    
+    @staticmethod
+    def write_junit(report: Dict, path: str):
+        """导出 JUnit XML 报告：每个文件一个 testsuite，每个 segment 一个 testcase"""
+        root = ET.Element("testsuites", name="validate_segments")
+        total_tests = total_failures = total_errors = 0
+        
+        for f in report["files"]:
+            suite = ET.SubElement(root, "testsuite", name=f["file"])
+            by_segment: Dict[str, List[Dict]] = {}
+            for issue in f["issues"]:
+                by_segment.setdefault(issue["segment"], []).append(issue)
+            
+            failures = 0
+            for segment_id in f["segments"]:
+                case = ET.SubElement(suite, "testcase", classname=Path(f["file"]).stem, name=segment_id)
+                # 同一 id 重复出现时问题只挂在第一个 testcase 上
+                segment_issues = by_segment.pop(segment_id, [])
+                for issue in segment_issues:
+                    failure = ET.SubElement(case, "failure", type=issue["category"],
+                                            message=f"{issue['field']}: {issue['message']}")
+                    failure.text = json.dumps(issue, ensure_ascii=False)
+                failures += bool(segment_issues)
+            
+            errors = 0
+            if f["error"]:
+                case = ET.SubElement(suite, "testcase", classname=Path(f["file"]).stem, name="<file>")
+                ET.SubElement(case, "error", message=f["error"])
+                errors = 1
+            
+            tests = len(f["segments"]) + errors
+            suite.set("tests", str(tests))
+            suite.set("failures", str(failures))
+            suite.set("errors", str(errors))
+            total_tests += tests
+            total_failures += failures
+            total_errors += errors
+        
+        root.set("tests", str(total_tests))
+        root.set("failures", str(total_failures))
+        root.set("errors", str(total_errors))
+        root.set("time", str(report["summary"]["seconds"]))
+        ET.ElementTree(root).write(path, encoding="utf-8", xml_declaration=True)
+
+
+def validate_all_segments(segments_dir: str = "../segments", workers: Optional[int] = None,
+                          use_cache: bool = True, json_report: Optional[str] = None,
+                          junit_report: Optional[str] = None) -> bool:
+    """验证所有 segment 文件，返回是否全部通过"""
     print("="*80)
-    print("Segment 验证工具 v2.1 - 基于 Sonic Pi 3.4 官方文档")
+    print("Segment 验证工具 v2.2 - 基于 Sonic Pi 3.4 官方文档")
     print("="*80)
     
-    all_issues = {
-        "synth_errors": [],
-        "sample_warnings": [],
-        "type_mismatches": []
-    }
+    validator = SegmentValidator(segments_dir, workers=workers, use_cache=use_cache)
+    report = validator.run()
+    summary = report["summary"]
     
-    json_files = list(segments_path.glob("*.json"))
+    print(f"\n文件: {summary['files']} (验证 {summary['validated']} / 缓存 {summary['cached']}), "
+          f"Segments: {summary['segments']}, 用时 {summary['seconds']:.3f}s")
     
-    for json_file in json_files:
-        print(f"\n检查: {json_file.name}")
-        issues = validate_segment_file(json_file)
-        all_issues["synth_errors"].extend(issues["synth_errors"])
-        all_issues["sample_warnings"].extend(issues["sample_warnings"])
-        all_issues["type_mismatches"].extend(issues.get("type_mismatches", []))
+    if json_report:
+        validator.write_json(report, json_report)
+        print(f"JSON 报告: {json_report}")
+    if junit_report:
+        validator.write_junit(report, junit_report)
+        print(f"JUnit 报告: {junit_report}")
     
     # 汇总报告
     print("\n" + "="*80)
     print("验证报告")
     print("="*80)
     
+    all_issues = _issue_lists([issue for f in report["files"] for issue in f["issues"]])
+    file_errors = [f"{f['file']}: {f['error']}" for f in report["files"] if f["error"]]
+    
     total_errors = (len(all_issues["synth_errors"]) + 
                    len(all_issues["sample_warnings"]) + 
-                   len(all_issues["type_mismatches"]))
+                   len(all_issues["type_mismatches"]) +
+                   len(file_errors))
     
     if total_errors == 0:
         print("\n✅ 所有 Segments 验证通过！")
     else:
+        if file_errors:
+            print(f"\n🔴 {len(file_errors)} 个文件无法读取:")
+            for error in file_errors:
+                print(f"  - {error}")
+        
         if all_issues["synth_errors"]:
             print(f"\n🔴 发现 {len(all_issues['synth_errors'])} 个合成器错误:")
             for error in all_issues["synth_errors"]:
@@ -248,6 +495,18 @@ def validate_all_segments(segments_dir: str = "../segments"):
     print("  - :prophet          (模拟合成器)")
     print("  - :fm               (FM 合成低音)")
     print("="*80)
+    
+    return total_errors == 0
 
 if __name__ == "__main__":
-    validate_all_segments()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Segment 验证工具")
+    parser.add_argument("--dir", default="../segments", help="segments 目录")
+    parser.add_argument("--workers", type=int, default=None, help="进程数（默认 CPU 核数，1 为单进程）")
+    parser.add_argument("--no-cache", action="store_true", help="忽略缓存，全部重新验证")
+    parser.add_argument("--json", help="导出 JSON 报告")
+    parser.add_argument("--junit", help="导出 JUnit XML 报告")
+    args = parser.parse_args()
+    
+    ok = validate_all_segments(args.dir, workers=args.workers, use_cache=not args.no_cache,
+                               json_report=args.json, junit_report=args.junit)
+    sys.exit(0 if ok else 1)
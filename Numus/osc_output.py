@@ -0,0 +1,176 @@
+"""
+OSC输出层（V01 / V02 / V03 共用）
+状态类消息按地址（或自定义键）缓存最后发送值：
+- 与上次发送值相同（浮点在epsilon以内）的消息不再发送
+- 同一键的发送间隔可限速，限速期间只保留最新值，由flush补发
+- 可选关键帧间隔：超过该时间未发送的状态会被重发，丢包后状态也能恢复一致
+事件类消息（触发、启停等）经send_message原样发送
+
+导入：Numus/ 在 sys.path 上时直接 from osc_output import OscOutput（如 PYTHONPATH=Numus）；
+未设置时，每个版本只由一个模块回退定位本文件：V01 NE-EDM-OSC.py、V02 engine/dj_transitions.py、
+V03 SegmentPlayer.py，同版本的其他模块经这些模块导入
+"""
+
+import time
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class OscOutput:
+    """
+    带状态缓存的OSC输出
+    send_message与SimpleUDPClient接口一致，可直接替代客户端；状态消息使用send_state
+    """
+
+    def __init__(self, client, epsilon: float = 0.0, min_interval: float = 0.0,
+                 keyframe_interval: float = 0.0, clock: Callable[[], float] = time.monotonic):
+        """
+        初始化输出层
+
+        Args:
+            client: OSC客户端（需提供send_message）
+            epsilon: 浮点值变化小于等于该阈值时视为重复
+            min_interval: 同一键两次发送的最小间隔（秒，0表示不限速）
+            keyframe_interval: 关键帧间隔（秒，0表示关闭），状态超过该时间未发送时重发
+            clock: 时钟函数（虚拟时钟回放时传入对应的now）
+        """
+        self.client = client
+        self.epsilon = epsilon
+        self.min_interval = min_interval
+        self.keyframe_interval = keyframe_interval
+        self.clock = clock
+
+        # 键 -> (地址, 最后发送值, 发送时刻)
+        self._sent: Dict[Hashable, Tuple[str, Any, float]] = {}
+        # 键 -> (地址, 最新值)：因限速推迟、等待flush的状态
+        self._pending: Dict[Hashable, Tuple[str, Any]] = {}
+
+        self.sent_count = 0
+        self.suppressed_count = 0
+        self.keyframe_count = 0
+
+    # ==================== 发送 ====================
+
+    def send_message(self, address: str, value: Any):
+        """事件类消息：原样发送"""
+        self.client.send_message(address, value)
+        self.sent_count += 1
+
+    def send_state(self, address: str, value: Any, key: Optional[Hashable] = None) -> bool:
+        """
+        状态类消息：去重、限速后发送
+
+        Args:
+            address: OSC地址
+            value: 消息参数
+            key: 缓存键（同一地址承载多个状态时区分，默认为地址本身）
+
+        Returns:
+            是否立即发送
+        """
+        key = address if key is None else key
+        now = self.clock()
+
+        last = self._sent.get(key)
+        if last is not None:
+            _, last_value, last_time = last
+            if self._same(last_value, value) and not self._keyframe_due(last_time, now):
+                # 回到已发送的值，之前推迟的变化作废
+                self._pending.pop(key, None)
+                self.suppressed_count += 1
+                return False
+            if now - last_time < self.min_interval:
+                self._pending[key] = (address, value)
+                self.suppressed_count += 1
+                return False
+
+        self._pending.pop(key, None)
+        self._send(key, address, value, now)
+        return True
+
+    def flush(self, force: bool = False) -> int:
+        """
+        补发到期的推迟状态，并重发超过关键帧间隔的状态
+
+        Args:
+            force: 忽略限速，立即发送全部推迟状态（播放结束、跳转前调用）
+
+        Returns:
+            本次发送的消息数
+        """
+        now = self.clock()
+        count = 0
+
+        for key, (address, value) in list(self._pending.items()):
+            if force or now - self._sent[key][2] >= self.min_interval:
+                del self._pending[key]
+                self._send(key, address, value, now)
+                count += 1
+
+        if self.keyframe_interval > 0:
+            for key, (address, value, last_time) in list(self._sent.items()):
+                if key not in self._pending and self._keyframe_due(last_time, now):
+                    self._send(key, address, value, now)
+                    self.keyframe_count += 1
+                    count += 1
+
+        return count
+
+    def note_state(self, address: str, value: Any, key: Optional[Hashable] = None):
+        """记录经其他途径（如OSC Bundle）已发送的状态，使缓存与接收端保持一致"""
+        key = address if key is None else key
+        self._pending.pop(key, None)
+        self._sent[key] = (address, value, self.clock())
+
+    def reset(self, prefix: Optional[Hashable] = None):
+        """
+        清除状态缓存（接收端状态被重置时调用）
+
+        Args:
+            prefix: 只清除以此开头的键（字符串或元组），None表示全部
+        """
+        if prefix is None:
+            self._sent.clear()
+            self._pending.clear()
+            return
+
+        for cache in (self._sent, self._pending):
+            for key in [k for k in cache if self._has_prefix(k, prefix)]:
+                del cache[key]
+
+    def get_statistics(self) -> Dict[str, int]:
+        """发送统计"""
+        return {
+            "sent": self.sent_count,
+            "suppressed": self.suppressed_count,
+            "keyframes": self.keyframe_count,
+            "pending": len(self._pending),
+            "cached_states": len(self._sent)
+        }
+
+    # ==================== 内部 ====================
+
+    def _send(self, key: Hashable, address: str, value: Any, now: float):
+        self.client.send_message(address, value)
+        self._sent[key] = (address, value, now)
+        self.sent_count += 1
+
+    def _keyframe_due(self, last_time: float, now: float) -> bool:
+        return self.keyframe_interval > 0 and now - last_time >= self.keyframe_interval
+
+    def _same(self, a: Any, b: Any) -> bool:
+        """比较两个消息参数（列表逐项比较，含浮点时按epsilon）"""
+        if isinstance(a, (list, tuple)) and isinstance(b, (list, tuple)):
+            return len(a) == len(b) and all(self._same(x, y) for x, y in zip(a, b))
+        if isinstance(a, float) or isinstance(b, float):
+            if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+                return abs(a - b) <= self.epsilon
+            return False
+        return a == b
+
+    @staticmethod
+    def _has_prefix(key: Hashable, prefix: Hashable) -> bool:
+        if isinstance(key, tuple) and isinstance(prefix, tuple):
+            return key[:len(prefix)] == prefix
+        if isinstance(key, str) and isinstance(prefix, str):
+            return key.startswith(prefix)
+        return key == prefix